@@ -0,0 +1,357 @@
+import numpy as np
+
+# Columns emitted by the array-based backtest, in order
+HISTORY_COLUMNS = ['time', 'product_id', 'price', 'decision', 'trade_amount', 'cash', 'position']
+
+
+def concat_histories(first, second):
+    if first is None or len(first['cash']) == 0:
+        return second
+    return {column: np.concatenate([first[column], second[column]]) for column in HISTORY_COLUMNS}
+
+
+# Cash/position state machine of Backtester.backtest run over plain arrays.
+# `positions` is updated in place and the final (cash, max_portfolio_value)
+# is returned along with the history columns of every attempted trade.
+def run_single_asset(times, prices, scores, product_id, cash, positions, max_portfolio_value,
+                     take_profit_threshold, portion=0.3, max_precision=8, start=26):
+    # Trades are recorded as bar indices; time and price are gathered at the end
+    trades = ([], [], [], [], [], [])
+    price_list = prices.tolist()
+    score_list = scores.tolist()
+    args = (price_list, score_list, product_id, cash, positions, max_portfolio_value,
+            1 - take_profit_threshold, portion, max_precision, start, trades)
+    if any(product != product_id for product in positions):
+        cash, max_portfolio_value = _run_with_other_positions(*args)
+    else:
+        cash, max_portfolio_value = _run_product_only(*args)
+
+    rows, products, buys, amounts, cash_after, position_after = trades
+    rows = np.asarray(rows, dtype=np.int64)
+    history = {
+        'time': np.asarray(times)[rows],
+        'product_id': np.asarray(products, dtype=object),
+        'price': np.asarray(prices, dtype=np.float64)[rows],
+        'decision': np.where(np.asarray(buys, dtype=bool), 'buy', 'sell').astype(object),
+        'trade_amount': np.asarray(amounts, dtype=np.float64),
+        'cash': np.asarray(cash_after, dtype=np.float64),
+        'position': np.asarray(position_after, dtype=np.float64),
+    }
+    return cash, max_portfolio_value, history
+
+
+# Fast path when the traded product is the only position: holdings live in
+# local variables and are written back to `positions` at the end
+def _run_product_only(price_list, score_list, product_id, cash, positions, max_portfolio_value,
+                      drawdown_floor, portion, max_precision, start, trades):
+    rows, products, buys, amounts, cash_after, position_after = trades
+    holding = product_id in positions
+    held = positions.get(product_id, 0)
+
+    for i in range(start, len(price_list)):
+        price = price_list[i]
+        performance_score = score_list[i]
+        current_portfolio_value = cash + held * price if holding else cash
+
+        if current_portfolio_value > max_portfolio_value:
+            max_portfolio_value = current_portfolio_value
+
+        # Take profit: liquidate everything on a drawdown from the peak
+        if holding and current_portfolio_value < max_portfolio_value * drawdown_floor:
+            amount = held
+            cash += amount * price
+            held -= amount
+            holding = held != 0
+            rows.append(i)
+            products.append(product_id)
+            buys.append(False)
+            amounts.append(amount)
+            cash_after.append(cash)
+            position_after.append(held if holding else 0.0)
+
+        if performance_score > 0.5:
+            trade_amount = round(cash * portion * performance_score / cash, max_precision)
+            if trade_amount > 0:
+                if cash >= trade_amount * price:
+                    cash -= trade_amount * price
+                    if not holding:
+                        held = 0
+                        holding = True
+                    held += trade_amount
+                rows.append(i)
+                products.append(product_id)
+                buys.append(True)
+                amounts.append(trade_amount)
+                cash_after.append(cash)
+                position_after.append(held if holding else 0.0)
+        elif performance_score < 0.5 and holding:
+            trade_amount = round(cash * portion * performance_score / cash, max_precision)
+            if trade_amount > 0:
+                if held >= trade_amount:
+                    cash += trade_amount * price
+                    held -= trade_amount
+                    holding = held != 0
+                rows.append(i)
+                products.append(product_id)
+                buys.append(False)
+                amounts.append(trade_amount)
+                cash_after.append(cash)
+                position_after.append(held if holding else 0.0)
+
+    if holding:
+        positions[product_id] = held
+    else:
+        positions.pop(product_id, None)
+    return cash, max_portfolio_value
+
+
+# General path when positions carried over from other products must be
+# valued and liquidated alongside the traded one
+def _run_with_other_positions(price_list, score_list, product_id, cash, positions, max_portfolio_value,
+                              drawdown_floor, portion, max_precision, start, trades):
+    rows, products, buys, amounts, cash_after, position_after = trades
+
+    for i in range(start, len(price_list)):
+        price = price_list[i]
+        performance_score = score_list[i]
+        current_portfolio_value = cash + sum([amount * price for amount in positions.values()])
+
+        if current_portfolio_value > max_portfolio_value:
+            max_portfolio_value = current_portfolio_value
+
+        # Take profit: liquidate everything on a drawdown from the peak
+        if current_portfolio_value < max_portfolio_value * drawdown_floor:
+            for product in list(positions.keys()):
+                amount = positions[product]
+                cash += amount * price
+                positions[product] -= amount
+                if positions[product] == 0:
+                    del positions[product]
+                rows.append(i)
+                products.append(product)
+                buys.append(False)
+                amounts.append(amount)
+                cash_after.append(cash)
+                position_after.append(positions.get(product, 0.0))
+
+        if performance_score > 0.5:
+            trade_amount = round(cash * portion * performance_score / cash, max_precision)
+            if trade_amount > 0:
+                if cash >= trade_amount * price:
+                    cash -= trade_amount * price
+                    if product_id not in positions:
+                        positions[product_id] = 0
+                    positions[product_id] += trade_amount
+                rows.append(i)
+                products.append(product_id)
+                buys.append(True)
+                amounts.append(trade_amount)
+                cash_after.append(cash)
+                position_after.append(positions.get(product_id, 0.0))
+        elif performance_score < 0.5 and product_id in positions:
+            trade_amount = round(cash * portion * performance_score / cash, max_precision)
+            if trade_amount > 0:
+                if positions[product_id] >= trade_amount:
+                    cash += trade_amount * price
+                    positions[product_id] -= trade_amount
+                    if positions[product_id] == 0:
+                        del positions[product_id]
+                rows.append(i)
+                products.append(product_id)
+                buys.append(False)
+                amounts.append(trade_amount)
+                cash_after.append(cash)
+                position_after.append(positions.get(product_id, 0.0))
+
+    return cash, max_portfolio_value
+
+
+# Equity curve of the single-asset rules with tunable score thresholds and
+# optional entry-based stop-loss / take-profit exits, for parameter sweeps.
+# Returns per-bar curves (portfolio value, value held in the asset and value
+# traded) and the number of executed trades.
+def simulate_equity(prices, scores, cash, take_profit_threshold=0.1, portion=0.3, max_precision=8,
+                    buy_threshold=0.5, sell_threshold=0.5, stop_loss=None, take_profit=None, start=26):
+    price_list = np.asarray(prices, dtype=np.float64).tolist()
+    score_list = np.asarray(scores, dtype=np.float64).tolist()
+    equity = np.full(len(price_list), float(cash))
+    invested = np.zeros(len(price_list))
+    traded = np.zeros(len(price_list))
+    drawdown_floor = 1 - take_profit_threshold
+    max_portfolio_value = cash
+    held = 0.0
+    entry_price = None
+    trades = 0
+
+    for i in range(start, len(price_list)):
+        price = price_list[i]
+        performance_score = score_list[i]
+        current_portfolio_value = cash + held * price
+        if current_portfolio_value > max_portfolio_value:
+            max_portfolio_value = current_portfolio_value
+
+        if held:
+            exit_position = current_portfolio_value < max_portfolio_value * drawdown_floor
+            if entry_price is not None:
+                if stop_loss is not None and price <= entry_price * (1 - stop_loss):
+                    exit_position = True
+                elif take_profit is not None and price >= entry_price * (1 + take_profit):
+                    exit_position = True
+            if exit_position:
+                cash += held * price
+                traded[i] += held * price
+                held = 0.0
+                entry_price = None
+                trades += 1
+
+        if performance_score > buy_threshold:
+            trade_amount = round(portion * performance_score, max_precision)
+            if trade_amount > 0 and cash >= trade_amount * price:
+                cash -= trade_amount * price
+                held += trade_amount
+                traded[i] += trade_amount * price
+                entry_price = price
+                trades += 1
+        elif performance_score < sell_threshold and held:
+            trade_amount = round(portion * performance_score, max_precision)
+            if trade_amount > 0 and held >= trade_amount:
+                cash += trade_amount * price
+                held -= trade_amount
+                traded[i] += trade_amount * price
+                trades += 1
+                if held == 0:
+                    entry_price = None
+
+        invested[i] = held * price
+        equity[i] = cash + invested[i]
+
+    return {'equity': equity, 'invested': invested, 'traded': traded}, trades
+
+
+# Align per-product frames onto the union of their timestamps. Returns the
+# shared time axis and a (bars x products) matrix of `column`, NaN wherever a
+# product has no bar.
+def align_frames(frames, column='price'):
+    product_ids = list(frames)
+    index = None
+    for product_id in product_ids:
+        index = frames[product_id].index if index is None else index.union(frames[product_id].index)
+    matrix = np.column_stack([frames[product_id][column].reindex(index).to_numpy(dtype=np.float64)
+                              for product_id in product_ids])
+    return index.to_numpy(), product_ids, matrix
+
+
+# Last known price of every product at every bar (0 before its first bar),
+# used to mark positions to market on bars where a product did not trade
+def _forward_fill(matrix):
+    valid = ~np.isnan(matrix)
+    last = np.where(valid, np.arange(len(matrix))[:, None], 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    filled = matrix[last, np.arange(matrix.shape[1])]
+    return np.where(np.maximum.accumulate(valid, axis=0), filled, 0.0)
+
+
+# Multi-asset version of the single-asset rules on an aligned time axis. All
+# products step together each bar against one cash ledger: positions are
+# valued at their own last price, the take-profit drawdown liquidates every
+# position, then sells are filled and buys are funded in product order from
+# the cash left, skipping any that no longer fit. Each product starts trading
+# `start` bars into its own series. `positions` is updated in place; returns
+# (cash, max_portfolio_value, per-bar curves as in simulate_equity, history
+# columns of every attempted trade).
+def run_portfolio(times, product_ids, prices, scores, cash, positions, max_portfolio_value,
+                  take_profit_threshold, portion=0.3, max_precision=8, start=26):
+    prices = np.asarray(prices, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    n_bars, n_products = prices.shape
+    has_bar = ~np.isnan(prices)
+    tradable = has_bar & (np.cumsum(has_bar, axis=0) > start) & ~np.isnan(scores)
+    marks = _forward_fill(prices)
+    precisions = np.broadcast_to(np.asarray(max_precision), (n_products,))
+    amounts = np.column_stack([np.round(portion * scores[:, j], int(precisions[j])) for j in range(n_products)])
+    amounts = np.where(tradable, amounts, 0.0)
+    buy_signal = tradable & (scores > 0.5) & (amounts > 0)
+    sell_signal = tradable & (scores < 0.5) & (amounts > 0)
+
+    held = np.array([positions.get(product_id, 0.0) for product_id in product_ids], dtype=np.float64)
+    drawdown_floor = 1 - take_profit_threshold
+    equity = np.empty(n_bars)
+    invested = np.empty(n_bars)
+    traded = np.zeros(n_bars)
+    trades = []
+
+    for i in range(n_bars):
+        mark = marks[i]
+        current_portfolio_value = cash + held @ mark
+        if current_portfolio_value > max_portfolio_value:
+            max_portfolio_value = current_portfolio_value
+
+        # Take profit: liquidate everything on a drawdown from the peak
+        if current_portfolio_value < max_portfolio_value * drawdown_floor and held.any():
+            slots = np.flatnonzero(held)
+            proceeds = held[slots] * mark[slots]
+            cash_after = cash + np.cumsum(proceeds)
+            trades.append((i, slots, False, held[slots], cash_after, np.zeros(len(slots))))
+            traded[i] += proceeds.sum()
+            cash = cash_after[-1]
+            held[slots] = 0.0
+
+        sells = sell_signal[i] & (held != 0)
+        if sells.any():
+            slots = np.flatnonzero(sells)
+            amount = amounts[i, slots]
+            filled = held[slots] >= amount
+            proceeds = np.where(filled, amount * prices[i, slots], 0.0)
+            cash_after = cash + np.cumsum(proceeds)
+            held[slots] -= np.where(filled, amount, 0.0)
+            trades.append((i, slots, False, amount, cash_after, held[slots].copy()))
+            traded[i] += proceeds.sum()
+            cash = cash_after[-1]
+
+        if buy_signal[i].any():
+            slots = np.flatnonzero(buy_signal[i])
+            amount = amounts[i, slots]
+            cost = (amount * prices[i, slots]).tolist()
+            # In priority order, each buy fills if the cash left after the
+            # buys before it covers it; one that can't doesn't block the rest
+            filled = np.zeros(len(slots), dtype=bool)
+            cash_after = np.empty(len(slots))
+            remaining = cash
+            for k, buy_cost in enumerate(cost):
+                if buy_cost <= remaining:
+                    remaining -= buy_cost
+                    filled[k] = True
+                cash_after[k] = remaining
+            held[slots] += np.where(filled, amount, 0.0)
+            trades.append((i, slots, True, amount, cash_after, held[slots].copy()))
+            traded[i] += cash - cash_after[-1]
+            cash = cash_after[-1]
+
+        invested[i] = held @ mark
+        equity[i] = cash + invested[i]
+
+    for product_id, amount in zip(product_ids, held.tolist()):
+        if amount:
+            positions[product_id] = amount
+        else:
+            positions.pop(product_id, None)
+
+    if trades:
+        rows = np.concatenate([np.full(len(t[1]), t[0]) for t in trades])
+        slots = np.concatenate([t[1] for t in trades])
+        history = {
+            'time': np.asarray(times)[rows],
+            'product_id': np.asarray(product_ids, dtype=object)[slots],
+            'price': marks[rows, slots],
+            'decision': np.concatenate([np.full(len(t[1]), 'buy' if t[2] else 'sell', dtype=object)
+                                        for t in trades]),
+            'trade_amount': np.concatenate([t[3] for t in trades]),
+            'cash': np.concatenate([t[4] for t in trades]),
+            'position': np.concatenate([t[5] for t in trades]),
+        }
+    else:
+        history = {column: np.empty(0, dtype=object if column in ('product_id', 'decision') else np.float64)
+                   for column in HISTORY_COLUMNS}
+        history['time'] = np.asarray(times)[:0]
+    curves = {'equity': equity, 'invested': invested, 'traded': traded}
+    return cash, max_portfolio_value, curves, history
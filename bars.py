@@ -0,0 +1,204 @@
+import numpy as np
+
+# Bar lengths the aggregator understands, in nanoseconds
+INTERVALS = {
+    '1s': 1_000_000_000,
+    '1m': 60_000_000_000,
+    '5m': 300_000_000_000,
+    '1h': 3_600_000_000_000,
+    '1d': 86_400_000_000_000,
+}
+DEFAULT_INTERVALS = ('1s', '1m', '5m', '1h')
+
+# Default number of closed bars kept per product and interval
+DEFAULT_CAPACITY = 1024
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+# OHLCV candles of one product at one interval, aligned to epoch boundaries.
+# Closed bars live in fixed-size NumPy arrays written twice (like TickBuffer)
+# so the latest N bars are always a contiguous view. A bar closes when a tick
+# or roll() reaches the next boundary; intervals without ticks close as flat
+# bars at the previous close with zero volume. The ticker feed carries no
+# trade size, so volume is the tick count, as in load_tick_bars.
+class CandleSeries:
+    def __init__(self, interval, capacity=DEFAULT_CAPACITY, on_close=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.interval = interval
+        self.interval_ns = INTERVALS[interval]
+        self.capacity = capacity
+        self.on_close = on_close
+        self._times = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros((len(COLUMNS), 2 * capacity), dtype=np.float64)
+        self._count = 0
+        self.late_ticks = 0
+        # Bar in progress: start time and open, high, low, close, volume
+        self.start = None
+        self.open = self.high = self.low = self.close = 0.0
+        self.volume = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        # Number of bars ever closed, including overwritten ones
+        return self._count
+
+    @property
+    def next_close(self):
+        return None if self.start is None else self.start + self.interval_ns
+
+    def _write(self, start, open_, high, low, close, volume):
+        slot = self._count % self.capacity
+        for offset in (slot, slot + self.capacity):
+            self._times[offset] = start
+            self._values[0, offset] = open_
+            self._values[1, offset] = high
+            self._values[2, offset] = low
+            self._values[3, offset] = close
+            self._values[4, offset] = volume
+        self._count += 1
+        if self.on_close is not None:
+            self.on_close(self, start, open_, high, low, close, volume)
+
+    # Empty intervals: flat bars at the last close. Without a listener only
+    # the bars that fit in the buffer are written, in one block.
+    def _write_flat(self, start, close, count):
+        if self.on_close is not None:
+            for i in range(count):
+                self._write(start + i * self.interval_ns, close, close, close, close, 0)
+            return
+        skipped = max(0, count - self.capacity)
+        self._count += skipped
+        start += skipped * self.interval_ns
+        count -= skipped
+        slots = (self._count + np.arange(count)) % self.capacity
+        times = start + np.arange(count, dtype=np.int64) * self.interval_ns
+        for offsets in (slots, slots + self.capacity):
+            self._times[offsets] = times
+            self._values[:4, offsets] = close
+            self._values[4, offsets] = 0
+        self._count += count
+
+    # Close every bar that ends at or before time_ns
+    def roll(self, time_ns):
+        if self.start is None or time_ns < self.start + self.interval_ns:
+            return 0
+        self._write(self.start, self.open, self.high, self.low, self.close, self.volume)
+        start = self.start + self.interval_ns
+        close = self.close
+        empty = (time_ns - start) // self.interval_ns
+        if empty:
+            self._write_flat(start, close, empty)
+        self.start = start + empty * self.interval_ns
+        self.open = self.high = self.low = close
+        self.volume = 0
+        return 1 + empty
+
+    # Add a tick; returns the number of bars it closed
+    def update(self, time_ns, price):
+        if self.start is None:
+            self.start = time_ns - time_ns % self.interval_ns
+            self.open = self.high = self.low = self.close = price
+            self.volume = 1
+            return 0
+        if time_ns < self.start:
+            self.late_ticks += 1
+            return 0
+        closed = self.roll(time_ns)
+        if not self.volume:
+            # First tick of the bar, which may have been opened by roll()
+            self.open = self.high = self.low = price
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += 1
+        return closed
+
+    def _bounds(self, n):
+        size = len(self)
+        if n is None or n > size:
+            n = size
+        if n <= 0:
+            return 0, 0
+        end = (self._count - 1) % self.capacity + self.capacity + 1
+        return end - n, end
+
+    # Zero-copy views of the latest n closed bars
+    def times(self, n=None):
+        start, end = self._bounds(n)
+        return self._times[start:end]
+
+    def column(self, name, n=None):
+        start, end = self._bounds(n)
+        return self._values[COLUMNS.index(name), start:end]
+
+    def closes(self, n=None):
+        return self.column('close', n)
+
+    # Closed bars shaped like load_tick_bars / the historical CSVs, with the
+    # close repeated as 'price' for the indicator code
+    def to_frame(self, n=None):
+        import pandas as pd
+
+        start, end = self._bounds(n)
+        frame = pd.DataFrame({name: self._values[i, start:end] for i, name in enumerate(COLUMNS)},
+                             index=pd.to_datetime(self._times[start:end], utc=True))
+        frame.index.name = 'date'
+        frame['price'] = frame['close']
+        return frame
+
+
+# Candle series for every product (by slot) and interval. Ticks go through
+# update(); every series is rolled forward on the market clock whenever any
+# product's tick passes the earliest pending boundary, so quiet products
+# still close their bars on time. on_bar(product_id, interval, series, start,
+# open, high, low, close, volume) is called for each closed bar of the
+# `notify` intervals (all of them by default).
+class BarAggregator:
+    def __init__(self, product_ids, intervals=DEFAULT_INTERVALS, capacity=DEFAULT_CAPACITY, on_bar=None,
+                 notify=None):
+        self.product_ids = list(product_ids)
+        self.intervals = tuple(intervals)
+        self.on_bar = on_bar
+        notify = self.intervals if notify is None else tuple(notify)
+        self.series = []
+        for slot, product_id in enumerate(self.product_ids):
+            self.series.append({interval: CandleSeries(interval, capacity,
+                                                       self._closer(slot) if interval in notify else None)
+                                for interval in self.intervals})
+        self._flat = [series for by_interval in self.series for series in by_interval.values()]
+        self._next_close = None
+
+    def _closer(self, slot):
+        if self.on_bar is None:
+            return None
+        product_id = self.product_ids[slot]
+        return lambda series, *bar: self.on_bar(product_id, series.interval, series, *bar)
+
+    def get(self, slot, interval):
+        return self.series[slot][interval]
+
+    def update(self, slot, time_ns, price):
+        if self._next_close is not None and time_ns >= self._next_close:
+            self.roll(time_ns)
+        for series in self.series[slot].values():
+            series.update(time_ns, price)
+            next_close = series.next_close
+            if self._next_close is None or next_close < self._next_close:
+                self._next_close = next_close
+
+    # Close due bars of every product up to time_ns
+    def roll(self, time_ns):
+        next_close = None
+        for series in self._flat:
+            series.roll(time_ns)
+            pending = series.next_close
+            if pending is not None and (next_close is None or pending < next_close):
+                next_close = pending
+        self._next_close = next_close
@@ -12,6 +12,7 @@ import signal
 import ta.momentum
 import ta.trend
 from dotenv import load_dotenv
+from tick_buffer import TickBuffer, to_epoch_ns
 
 # Load environment variables from .env file
 load_dotenv()
@@ -41,7 +42,7 @@ available_wallets = [
 ]
 
 # Dictionary to hold real-time data
-real_time_data = {wallet: pd.DataFrame(columns=['time', 'price']) for wallet in available_wallets}
+real_time_data = {wallet: TickBuffer() for wallet in available_wallets}
 
 # Function to print balances of each wallet
 def print_wallet_balances():
@@ -65,15 +66,9 @@ def on_message(msg):
                         print(f"Skipping ticker without time: {ticker}")
                         continue
                     
-                    timestamp = pd.to_datetime(time_str)
+                    timestamp = to_epoch_ns(time_str)
                     price = float(ticker.get('price', 0))
-                    new_row = pd.DataFrame({'time': [timestamp], 'price': [price]})
-                    if not real_time_data[product_id].empty:
-                        real_time_data[product_id] = pd.concat([real_time_data[product_id], new_row], ignore_index=True)
-                    else:
-                        real_time_data[product_id] = new_row
-                    #print(f"Appended data for {product_id}: {new_row}")
-                    #print(f"Updated DataFrame for {product_id}: {real_time_data[product_id].tail()}")
+                    real_time_data[product_id].append(timestamp, price)
 
 # Function to apply technical indicators
 def apply_indicators(df):
@@ -136,7 +131,7 @@ def check_and_trade():
         if currency != 'GBP':
             product_id = f"{currency}-GBP"
             if product_id in available_wallets:
-                df = real_time_data[product_id].copy()
+                df = real_time_data[product_id].to_frame()
                 print(f"Data for {product_id}: {df.tail()}")  # Debugging: show the last few rows of data
                 if len(df) >= 26:  # Ensure we have enough data points for MACD and RSI
                     df = apply_indicators(df)
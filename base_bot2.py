@@ -1,84 +1,53 @@
 import os
 import threading
-from coinbase.rest import RESTClient
 import time
-import pandas as pd
-import ta
+import numpy as np
 import asyncio
-from coinbase.websocket import WSClient
 import json
-from json import dumps, loads
+import logging
+import math
 import signal
-import ta.momentum
-import ta.trend
-import ta.volatility
+import sys
 import uuid
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
-
-api_key = os.getenv("api_key")
-api_secret = os.getenv("api_secret")
-
-client = RESTClient(api_key=api_key, api_secret=api_secret)
-
-available_wallets = [
-    'BTC-GBP', 'ETH-GBP', 'LTC-GBP', 'BCH-GBP',
-    'ADA-GBP', 'LINK-GBP', 'DOT-GBP', 'DOGE-GBP',
-    'UNI-GBP', 'SOL-GBP', 'SHIB-GBP', 'AAVE-GBP', 'ALGO-GBP',
-    'ATOM-GBP', 'FIL-GBP', 'XTZ-GBP'
-]
-
-# Dictionary to hold real-time data
-real_time_data = {wallet: pd.DataFrame(columns=['time', 'price']) for wallet in available_wallets}
-trade_counters = {wallet: 0 for wallet in available_wallets}
-
-# Generate a unique session identifier
-session_id = str(uuid.uuid4())
-
-# Record entry prices for positions
-entry_prices = {wallet: None for wallet in available_wallets}
+from tick_buffer import TickBuffer
+from decoder import MessageDecoder, ProductIndex
+from bars import BarAggregator, DEFAULT_INTERVALS, INTERVALS
+from strategies import SignalGraph, create_strategies
+from columnar_store import ColumnarStore, TickRecorder
+from feed import FeedGroup, MarketFeed, PRODUCTS_PER_CONNECTION
+from market_bus import BusFeed
+from dispatcher import POLL_INTERVAL, DecisionDebouncer, TradeDispatcher
+from handoff import SnapshotBoard
+from scoring import EXTRA_MEAN_WINDOW, score_frame
+from portfolio_cache import MAX_TRACKED_ORDERS, PortfolioCache
+from order_executor import OrderExecutor
+from exchange import create_exchange
+from instrumentation import Instrumentation, setup_queue_logging
+from journal import StateJournal
+from products import ProductCatalog, partition, shard
+from workers import WORKER_INDEX_VARIABLE, run_workers
+
+log = logging.getLogger("bot")
 
 # Stop-loss and take-profit thresholds
 STOP_LOSS_PERCENTAGE = 0.05  # 5%
 TAKE_PROFIT_PERCENTAGE = 0.1  # 10%
 
-# Function to print balances of each wallet
-def print_wallet_balances():
-    accounts = client.get_accounts()
-    print("Current Wallet Balances:")
-    for account in accounts['accounts']:
-        currency = account['currency']
-        balance = float(account['available_balance']['value'])
-        print(f"{currency} Wallet: {balance} {currency}")
-
-# Define the callback function for WebSocket messages
-def on_message(msg):
-    data = json.loads(msg)
-    if 'events' in data:
-        for event in data['events']:
-            for ticker in event.get('tickers', []):
-                product_id = ticker.get('product_id')
-                if product_id in available_wallets:
-                    time_str = ticker.get('time') or data.get('timestamp')
-                    if not time_str:
-                        print(f"Skipping ticker without time: {ticker}")
-                        continue
-                    
-                    timestamp = pd.to_datetime(time_str)
-                    price = float(ticker.get('price', 0))
-                    new_row = pd.DataFrame({'time': [timestamp], 'price': [price]})
-                    if not real_time_data[product_id].empty:
-                        real_time_data[product_id] = pd.concat([real_time_data[product_id], new_row], ignore_index=True)
-                    else:
-                        real_time_data[product_id] = new_row
+# Re-score products as their bars close instead of in one scheduled batch
+EVENT_DRIVEN = True
+
+# Seconds between scheduled evaluations (or balance reports in event-driven mode)
+EVALUATION_INTERVAL = 10
 
 # Function to apply technical indicators
 def apply_technical_indicators(df):
+    import ta.momentum
+    import ta.trend
+    import ta.volatility
+
     try:
         if len(df) < 20:
-            print("Not enough data to apply technical indicators")
+            log.info("Not enough data to apply technical indicators")
             return df
         
         df['SMA'] = ta.trend.SMAIndicator(df['price'], window=20).sma_indicator()
@@ -101,246 +70,692 @@ def apply_technical_indicators(df):
         #print("Applied technical indicators: SMA, RSI, MACD, Bollinger Bands")
         return df
     except Exception as e:
-        print(f"Error applying indicators: {e}")
+        log.error(f"Error applying indicators: {e}")
         return df
 
+# Score of the latest row of an indicator frame, with the same kernel as the
+# streaming path and the backtests
 def calculate_performance_score(df):
     if df.empty or len(df) < 26:
-        print(f"Not enough data to calculate performance score.")
+        log.debug("Not enough data to calculate performance score.")
         return 0
 
-    latest_data = df.iloc[-1]
-    score = 0
-
-    # RSI signal
-    if latest_data['RSI'] < 30:
-        score += 1
-    elif latest_data['RSI'] > 70:
-        score -= 1
-
-    # MACD signal
-    if latest_data['MACD_Diff'] > 0:
-        score += 1
-    elif latest_data['MACD_Diff'] < 0:
-        score -= 1
-
-    # Bollinger Bands signal
-    if latest_data['price'] < latest_data['Bollinger_Low']:
-        score += 1
-    elif latest_data['price'] > latest_data['Bollinger_High']:
-        score -= 1
-
-    # SMA signal
-    if latest_data['price'] > latest_data['SMA']:
-        score += 1
-    elif latest_data['price'] < latest_data['SMA']:
-        score -= 1
-
-    # Additional indicators
-    if 'ATR' in df.columns and latest_data['ATR'] < latest_data['ATR'].mean():
-        score += 0.5
-    if 'OBV' in df.columns and latest_data['OBV'] > latest_data['OBV'].mean():
-        score += 0.5
-
-    normalized_score = (score + 4) / 8
-    print(f"Calculated performance score: {normalized_score} for data: {latest_data}")
+    normalized_score = float(score_frame(df.iloc[-EXTRA_MEAN_WINDOW:])[-1])
+    log.debug("Calculated performance score: %s for data: %s", normalized_score, df.iloc[-1])
     return normalized_score
 
-buy_max_precisions = {
-    'BTC': 2,'ETH': 2,'LTC': 2,'BCH': 2,'ADA': 2,
-    'LINK': 2,'DOT': 2,'DOGE': 2,'UNI': 2,'SOL': 2,
-    'SHIB': 2,'AAVE': 2,'ALGO': 2,'ATOM': 2,'FIL': 2,
-    'XTZ': 2
-}
-
-sell_max_precisions = {
-    'BTC': 4,'ETH': 6,'LTC': 2,'BCH': 2,'ADA': 6,
-    'LINK': 1,'DOT': 1,'DOGE': 6,'UNI': 1,'SOL': 3,
-    'SHIB': 6,'AAVE': 2,'ALGO': 6,'ATOM': 6,'FIL': 1,
-    'XTZ': 6
-}
-
-def determine_buy_trade_amount(performance_score, gbp_balance, product_id, portion=0.3):
-    allocated_balance = gbp_balance * portion
-    trade_amount = allocated_balance * performance_score
-    
-    base_currency = product_id.split('-')[0]
-    max_precision = buy_max_precisions.get(base_currency, 6)
-    min_trade_amount = min_trade_amounts.get(base_currency, 0.0001)
-    
-    trade_amount = round(trade_amount, max_precision)
-    if trade_amount < 1:
-        trade_amount = 1  # Ensure trade amount respects the minimum
-    
-    # Ensure trade amount is not zero
-    if trade_amount == 0:
-        trade_amount = min_trade_amount
-    
-    print(f"Determined buy trade amount for {product_id}: {trade_amount:.{max_precision}f} for performance score: {performance_score:.2f} and GBP balance: {gbp_balance:.8f}")
-    return trade_amount
-
-
-def determine_sell_trade_amount(performance_score, coin_balance, product_id, portion=0.3):
-    allocated_balance = coin_balance * portion
-    trade_amount = allocated_balance * performance_score
-    
-    base_currency = product_id.split('-')[0]
-    max_precision = sell_max_precisions.get(base_currency, 6)
-    min_trade_amount = min_trade_amounts.get(base_currency, 0.0001)
-    
-    trade_amount = round(trade_amount, max_precision)
-    if trade_amount < min_trade_amount:
-        trade_amount = min_trade_amount  # Ensure trade amount respects the minimum
-    
-    print(f"Determined sell trade amount for {product_id}: {trade_amount:.{max_precision}f} for performance score: {performance_score:.2f} and coin balance: {coin_balance:.8f}")
-    return trade_amount
-
-
-# Function to execute trades
-def execute_trade(decision, product_id, trade_amount):
-    base_currency = product_id.split('-')[0]
-    min_trade_amount = min_trade_amounts.get(base_currency, 0.0001)
-    
-    if trade_amount >= min_trade_amount and trade_amount > 0:
-        try:
-            trade_counters[product_id] += 1  # Increment the counter for each trade
-            client_order_id = f"{session_id}_{product_id}_{trade_counters[product_id]}"
-            
-            if decision == 'buy':
-                order = client.market_order_buy(client_order_id=f"order_buy_{client_order_id}", product_id=product_id, quote_size=str(trade_amount))
-                print(f"Executed buy order: {order}")
-                if order.get('success'):
-                    entry_prices[product_id] = order['price']  # Store the entry price
-            elif decision == 'sell':
-                order = client.market_order_sell(client_order_id=f"order_sell_{client_order_id}", product_id=product_id, base_size=str(trade_amount))
-                print(f"Executed sell order: {order}")
-                if order.get('success'):
-                    entry_prices[product_id] = None  # Reset the entry price
-                
-                if not order.get('success'):
-                    print(f"Failed to execute order: {order.get('failure_reason', 'Unknown reason')}")
+# One worker's trading bot: the exchange client, product state, feeds,
+# indicators and dispatcher built from the environment, and the callbacks
+# the feeds and dispatcher drive. Nothing is constructed at import, so the
+# scoring helpers can be imported into backtests cheaply.
+class TradingBot:
+    def __init__(self, worker_count=1, worker_index=0):
+        # Workers share one account and size buys from their share of the cash
+        self.worker_count = worker_count
+
+        # Latency histograms, counters and gauges for the hot paths; served as
+        # Prometheus text on metrics_port and/or written to metrics_snapshot as JSON.
+        # Workers serve on consecutive ports and suffix the snapshot with their index.
+        self.telemetry = Instrumentation()
+        self.metrics_port = os.getenv("metrics_port")
+        self.metrics_snapshot = os.getenv("metrics_snapshot")
+        if worker_count > 1:
+            self.metrics_port = self.metrics_port and str(int(self.metrics_port) + worker_index)
+            self.metrics_snapshot = self.metrics_snapshot and f"{self.metrics_snapshot}.{worker_index}"
+
+        self.api_key = os.getenv("api_key")
+        self.api_secret = os.getenv("api_secret")
+
+        # Exchange backend: 'coinbase' for live trading, 'sim' to replay history offline
+        self.exchange_name = os.getenv("exchange", "coinbase")
+        self.exchange = create_exchange(self.exchange_name, self.api_key, self.api_secret)
+        # Every REST call is timed into the rest_call histogram
+        self.client = self.telemetry.wrap_client(self.exchange.rest_client)
+
+        # Markets to trade, by quote currency; the first one is the reporting currency
+        self.quote_currencies = os.getenv("quote_currencies", "GBP").split(',')
+
+        # Balances loaded once and then kept current from order responses and fills
+        self.portfolio_cache = PortfolioCache(self.client, quote_currency=self.quote_currencies[0])
+
+        # Concurrent, rate-limited order submission with per-product ordering
+        self.order_executor = OrderExecutor()
+
+        # Increments and minimum sizes of every product, cached on disk for a day
+        self.product_catalog = ProductCatalog.load(
+            self.client, path=os.path.join('data', f'products-{self.exchange_name}.json'))
+
+        # Every tradable product of the quote currencies, or the comma-separated
+        # 'products' among them, then this worker's share
+        self.available_wallets = self.product_catalog.product_ids(self.quote_currencies)
+        if os.getenv("products"):
+            selected = set(os.getenv("products").split(','))
+            self.available_wallets = [wallet for wallet in self.available_wallets if wallet in selected]
+        self.available_wallets = partition(self.available_wallets, worker_count, worker_index)
+
+        # Name of the shared-memory bus of a running market_bus.py feed handler to
+        # read ticks from instead of subscribing to the ticker channel, so any
+        # number of bots and workers on the host share one set of connections
+        self.market_bus = os.getenv("market_bus")
+
+        # Products per WebSocket connection. Each connection delivers its ticks from
+        # its own thread, so everything the message path writes is split the same
+        # way: connection `i` owns slots [i * size, (i + 1) * size).
+        self.connection_size = int(os.getenv("products_per_connection", PRODUCTS_PER_CONNECTION))
+        self.feed_shards = shard(self.available_wallets, self.connection_size)
+        log.info(f"Trading {len(self.available_wallets)} products over {len(self.feed_shards)} connections")
+
+        # Interned product id -> slot, replacing linear scans of available_wallets
+        self.product_index = ProductIndex(self.available_wallets)
+        self.message_decoder = MessageDecoder(self.product_index)
+
+        # Dictionary to hold real-time data
+        self.real_time_data = {wallet: TickBuffer() for wallet in self.available_wallets}
+        # Strategies scored side by side on the same bars; the first one trades and
+        # the others only count the signals they would have acted on
+        self.strategies = create_strategies(os.getenv("strategies", "classic").split(','))
+        self.trading_strategy = self.strategies[0].name
+        # Every indicator any strategy needs, deduplicated so each is computed once
+        self.signal_graph = SignalGraph(self.strategies)
+        # Streaming indicator state, updated on every closed bar of SIGNAL_INTERVAL
+        self.indicator_engines = {wallet: self.signal_graph.stream() for wallet in self.available_wallets}
+        # The same buffers by slot, for the message hot path
+        self.tick_buffers = [self.real_time_data[wallet] for wallet in self.product_index.product_ids]
+        self.tick_counters = [self.telemetry.counter('ticks', product=wallet)
+                              for wallet in self.product_index.product_ids]
+
+        # The feed thread owns the tick buffers, candles and indicator engines; the
+        # trading loop only reads these seqlock boards, which the feed thread
+        # republishes after every tick and every closed signal bar
+        self.indicator_fields = ('count', 'price') + tuple(self.signal_graph.names)
+        self.indicator_board = SnapshotBoard(len(self.product_index.product_ids), self.indicator_fields)
+        self.quote_board = SnapshotBoard(len(self.product_index.product_ids), ('time', 'price'))
+
+        self.decode_latency = self.telemetry.histogram('decode')
+        # Would-be buy/sell signals of the strategies that don't trade, for A/B comparison
+        self.shadow_signals = {strategy.name: {side: self.telemetry.counter('strategy_signals', strategy=strategy.name,
+                                                                            side=side)
+                                               for side in ('buy', 'sell')}
+                               for strategy in self.strategies[1:]}
+        self.append_latency = self.telemetry.histogram('buffer_append')
+        self.bar_latency = self.telemetry.histogram('bar_update')
+        self.indicator_latency = self.telemetry.histogram('indicator_update')
+        self.score_latency = self.telemetry.histogram('score')
+        self.submit_latency = self.telemetry.histogram('order_submit')
+        self.ack_latency = self.telemetry.histogram('order_ack')
+
+        # Indicators run on candles of this interval so live signals have the same
+        # shape as the backtests; use 1d when replaying the daily CSVs in the simulator
+        self.signal_interval = os.getenv("bar_interval", "1m")
+
+        # Orders, fills, entry prices, trade counters and indicator snapshots are
+        # journaled to SQLite so a restart resumes where it left off. On by default
+        # for live trading; set state_path to enable it for the simulator.
+        self.state_path = os.getenv("state_path",
+                                    os.path.join('data', 'state.db') if self.exchange_name == 'coinbase' else '')
+        self.state_journal = StateJournal(self.state_path) if self.state_path else None
+        # Indicator snapshots older than this are not restored, as bars were missed
+        self.snapshot_max_age = float(os.getenv("snapshot_max_age", 5 * INTERVALS[self.signal_interval] / 1e9))
+        # Latest engine state per product, captured by the feed thread on each bar and
+        # written to the journal by the main loop
+        self.pending_snapshots = {}
+
+        # OHLCV candles per product, closed on time boundaries from the ticker feed;
+        # one aggregator per connection so each is only touched by its feed thread
+        intervals = DEFAULT_INTERVALS + ((self.signal_interval,) if self.signal_interval not in DEFAULT_INTERVALS else ())
+        self.bar_aggregators = [BarAggregator(products, intervals=intervals, on_bar=self.on_bar,
+                                              notify=(self.signal_interval,))
+                                for products in self.feed_shards]
+        # Aggregator and its slot for each product slot
+        self.bar_slots = [(self.bar_aggregators[slot // self.connection_size], slot % self.connection_size)
+                          for slot in range(len(self.available_wallets))]
+        # Persist every tick to the on-disk store so backtests can replay it; with a
+        # market bus its feed handler records them instead
+        self.tick_recorder = TickRecorder(ColumnarStore())
+        self.record_ticks = self.exchange_name == 'coinbase' and not self.market_bus
+        self.trade_counters = {wallet: 0 for wallet in self.available_wallets}
+
+        # Generate a unique session identifier
+        self.session_id = str(uuid.uuid4())
+
+        # Record entry prices for positions
+        self.entry_prices = {wallet: None for wallet in self.available_wallets}
+        # Order responses carry no price, so a buy's entry price is the last
+        # traded price until its fill reports the average price. The fill may
+        # arrive on the user channel before or after the response: fill_prices
+        # holds fills not yet matched to a response, provisional_entries the
+        # buys (order_id -> product) still waiting for their fill.
+        self.entry_lock = threading.Lock()
+        self.fill_prices = {}
+        self.provisional_entries = {}
+
+        if self.state_journal:
+            self.restore_state()
+
+        # Persistent WebSocket feeds keeping the tick buffers and indicators current,
+        # one per shard of the products; the first also carries the account's fills.
+        # With a market bus the ticks come from shared memory and only the account's
+        # fills need a connection.
+        if self.market_bus:
+            self.feed = FeedGroup([
+                BusFeed(self.available_wallets, self.on_ticks, name=self.market_bus),
+                MarketFeed(self.api_key, self.api_secret, [], self.on_message, channels=('heartbeats', 'user'),
+                           client_factory=self.exchange.ws_client_factory)])
+        else:
+            self.feed = FeedGroup(
+                MarketFeed(self.api_key, self.api_secret, products, self.on_message,
+                           channels=('ticker', 'heartbeats', 'user') if i == 0 else ('ticker', 'heartbeats'),
+                           client_factory=self.exchange.ws_client_factory)
+                for i, products in enumerate(self.feed_shards))
+
+        # A simulator replaying at full speed waits for each tick to be evaluated
+        # before sending the next, so every replayed bar is scored and traded;
+        # the debouncer then times decisions on the replayed clock
+        self.paced = EVENT_DRIVEN and getattr(self.exchange, 'speed', None) == 0
+        self.clock = self.exchange.replay_clock if self.paced else time.monotonic
+        if self.paced:
+            self.exchange.pace = self.wait_for_dispatch
+
+        # Scoring runs on the dispatcher as bars close, with repeated decisions debounced
+        self.dispatcher = TradeDispatcher(self.evaluate_dirty_products, cadence=0 if self.paced else 0.25,
+                                          poll_interval=0.001 if self.paced else POLL_INTERVAL,
+                                          producers=len(self.feed_shards))
+        self.decision_debouncer = DecisionDebouncer(cooldown=60, min_interval=5)
+
+        # Counters kept by the components themselves, read when metrics are exported
+        self.telemetry.gauge('feed_messages', lambda: self.feed.messages)
+        self.telemetry.gauge('feed_sequence_gaps', lambda: self.feed.gaps)
+        self.telemetry.gauge('feed_missed_messages', lambda: self.feed.missed_messages)
+        self.telemetry.gauge('feed_reconnects', lambda: self.feed.reconnects)
+        self.telemetry.gauge('feed_stale', lambda: int(self.feed.stale))
+        self.telemetry.gauge('heartbeats_dropped', lambda: self.message_decoder.dropped)
+        self.telemetry.gauge('unknown_product_tickers', lambda: self.message_decoder.unknown_products)
+        self.telemetry.gauge('late_ticks', lambda: sum(series.late_ticks for aggregator in self.bar_aggregators
+                                                       for series in aggregator._flat))
+        self.telemetry.gauge('evaluations', lambda: self.dispatcher.evaluations)
+        self.telemetry.gauge('dispatch_queue_dropped', lambda: self.dispatcher.dropped)
+        self.telemetry.gauge('dispatch_queue_high_water', lambda: self.dispatcher.high_water)
+        self.telemetry.gauge('dispatch_queue_fill', lambda: self.dispatcher.fill)
+        self.telemetry.gauge('snapshot_read_retries', lambda: self.indicator_board.retries + self.quote_board.retries)
+        self.telemetry.gauge('decisions_suppressed', lambda: self.decision_debouncer.suppressed)
+        self.telemetry.gauge('orders_submitted', lambda: self.order_executor.submitted)
+        self.telemetry.gauge('order_retries', lambda: self.order_executor.retried)
+        self.telemetry.gauge('balance_refreshes', lambda: self.portfolio_cache.refreshes)
+        if self.state_journal:
+            self.telemetry.gauge('journal_records', lambda: self.state_journal.records)
+
+        # Event to signal stopping the bot
+        self.stop_event = threading.Event()
+
+    def publish_indicators(self, product_id, engine):
+        self.indicator_board.write(self.product_index.get(product_id), [engine.count, engine.price] + engine.values())
+
+    # Feed each closed signal bar to the indicators and queue the product for scoring
+    def on_bar(self, product_id, interval, series, start, open_, high, low, close, volume):
+        started = time.perf_counter_ns()
+        engine = self.indicator_engines[product_id]
+        engine.update(close)
+        self.publish_indicators(product_id, engine)
+        self.indicator_latency.record(time.perf_counter_ns() - started)
+        if self.state_journal:
+            self.pending_snapshots[product_id] = (interval, start + series.interval_ns, engine.state())
+        if EVENT_DRIVEN:
+            self.dispatcher.mark_dirty(product_id, self.product_index.get(product_id) // self.connection_size)
+
+    # Resume from the journal: protective exit anchors, order counters and, when
+    # recent enough, the indicator state so trading needs no warm-up. Stop-loss
+    # and take-profit only need the anchors, so restored positions are
+    # protected from the first tick even while the indicators warm up again.
+    def restore_state(self):
+        started = time.perf_counter()
+        state = self.state_journal.replay()
+        for product_id, price in state['entry_prices'].items():
+            if product_id in self.entry_prices:
+                self.entry_prices[product_id] = price
+        for product_id, count in state['trade_counters'].items():
+            if product_id in self.trade_counters:
+                self.trade_counters[product_id] = count
+        restored = 0
+        for product_id, (interval, bar_time, engine_state) in state['snapshots'].items():
+            if product_id not in self.indicator_engines or interval != self.signal_interval:
+                continue
+            age = time.time() - bar_time / 1e9
+            if age > self.snapshot_max_age:
+                log.info(f"Indicator snapshot for {product_id} is {age:.0f}s old, warming up instead "
+                         f"(protective exits stay active)")
+                continue
+            try:
+                self.indicator_engines[product_id].restore(engine_state)
+            except (KeyError, ValueError) as e:
+                log.info(f"Indicator snapshot for {product_id} does not match the strategies ({e}), warming up instead")
+                continue
+            self.publish_indicators(product_id, self.indicator_engines[product_id])
+            restored += 1
+        for client_order_id, (product_id, order) in state['unresolved_orders'].items():
+            # Sent before a crash with no response recorded; balances are reloaded
+            # from REST, so only report it and mark it as seen
+            log.warning(f"Order {client_order_id} ({order['side']} {order['size']} {product_id}) "
+                        f"has no recorded result from the previous run")
+            self.state_journal.order_result(client_order_id, product_id, {'success': None, 'failure_reason': 'UNKNOWN'})
+        anchors = sum(1 for price in self.entry_prices.values() if price)
+        log.info(f"Restored {anchors} entry prices and {restored} indicator snapshots from {self.state_path} "
+                 f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    # Write the indicator states captured since the last call
+    def save_snapshots(self):
+        snapshots = []
+        for product_id in list(self.pending_snapshots):
+            interval, bar_time, engine_state = self.pending_snapshots.pop(product_id)
+            snapshots.append((product_id, interval, bar_time, engine_state))
+        self.state_journal.save_snapshots(snapshots)
+
+    # Function to print balances of each wallet
+    def print_wallet_balances(self):
+        portfolio, _ = self.portfolio_cache.snapshot()
+        log.info("Current Wallet Balances:")
+        for currency, balance in portfolio.items():
+            log.info(f"{currency} Wallet: {balance} {currency}")
+
+    # Define the callback function for WebSocket messages
+    def on_message(self, msg):
+        started = time.perf_counter_ns()
+        decoded = self.message_decoder.decode(msg)
+        if decoded is None:
+            # Heartbeats are dropped unparsed; the feed has already noted them
+            return
+        channel, data = decoded
+        if channel == 'user':
+            events = data.get('events', [])
+            self.portfolio_cache.apply_user_events(events)
+            for event in events:
+                if event.get('type') != 'snapshot':
+                    for update in event.get('orders', []):
+                        self.apply_fill_price(update)
+                        if self.state_journal:
+                            self.state_journal.fill(update)
+            return
+        ticks = self.message_decoder.tickers(data)
+        self.decode_latency.record(time.perf_counter_ns() - started)
+        self.on_ticks(ticks)
+
+    # Tick hot path, fed (slot, product_id, time_ns, price) tuples by the ticker
+    # connections or by the market bus
+    def on_ticks(self, ticks):
+        for slot, product_id, timestamp, price in ticks:
+            self.tick_counters[slot].inc()
+            started = time.perf_counter_ns()
+            self.tick_buffers[slot].append(timestamp, price)
+            mark = time.perf_counter_ns()
+            self.quote_board.write(slot, (timestamp, price))
+            self.append_latency.record(mark - started)
+            aggregator, bar_slot = self.bar_slots[slot]
+            aggregator.update(bar_slot, timestamp, price)
+            self.bar_latency.record(time.perf_counter_ns() - mark)
+            if self.record_ticks:
+                self.tick_recorder.record(product_id, timestamp, price)
+            if EVENT_DRIVEN:
+                self.check_protective_exit(product_id, price)
+
+    # Closed candles of a product with indicators applied, the bar-based input
+    # for calculate_performance_score
+    def get_bar_frame(self, product_id, interval=None):
+        aggregator, bar_slot = self.bar_slots[self.product_index.get(product_id)]
+        series = aggregator.get(bar_slot, interval or self.signal_interval)
+        return apply_technical_indicators(series.to_frame())
+
+    # Latest traded price; indicators only see bar closes
+    def last_price(self, product_id):
+        slot = self.product_index.get(product_id)
+        if self.quote_board.version(slot):
+            return float(self.quote_board.read(slot)[1])
+        return float(self.indicator_board.read(slot)[1])
+
+    # Score a product from its streaming indicator state instead of a full frame
+    def calculate_streaming_performance_score(self, product_id):
+        normalized_score = self.score_products([product_id])[0]
+        if normalized_score is None:
+            log.debug("Not enough data to calculate performance score.")
+            return 0
+        log.debug("Calculated performance score: %s for %s", normalized_score, product_id)
+        return normalized_score
+
+    # Trading strategy's scores of several products from their streaming
+    # indicator state, every strategy in one vectorized call each; None for
+    # products still warming up
+    def score_products(self, product_ids):
+        started = time.perf_counter_ns()
+        rows = self.indicator_board.read_many([self.product_index.get(product_id) for product_id in product_ids])
+        scores = self.signal_graph.score_rows(rows[:, 2:])
+        ready = rows[:, 0] >= self.signal_graph.warmup
+        self.score_latency.record(time.perf_counter_ns() - started)
+        for name, counters in self.shadow_signals.items():
+            counters['buy'].inc(int(np.count_nonzero(ready & (scores[name] > 0.5))))
+            counters['sell'].inc(int(np.count_nonzero(ready & (scores[name] < 0.5))))
+        return [score if ok else None for score, ok in zip(scores[self.trading_strategy].tolist(), ready.tolist())]
+
+    # Smallest order size: quote currency for buys, base currency for sells
+    def min_trade_amount(self, product_id, decision):
+        if decision == 'buy':
+            return self.product_catalog.min_quote_size(product_id)
+        return self.product_catalog.min_base_size(product_id)
+
+    def determine_buy_trade_amount(self, performance_score, quote_balance, product_id, portion=0.3):
+        allocated_balance = quote_balance * portion
+        trade_amount = allocated_balance * performance_score
+
+        quote_currency = product_id.split('-')[1]
+        max_precision = self.product_catalog.buy_precision(product_id)
+        min_amount = self.min_trade_amount(product_id, 'buy')
+
+        if quote_balance < min_amount:
+            log.debug("Not enough %s to buy %s (%.8f available)", quote_currency, product_id, quote_balance)
+            return 0
+
+        trade_amount = round(trade_amount, max_precision)
+        if trade_amount < min_amount:
+            trade_amount = min_amount  # Ensure trade amount respects the minimum
+
+        log.info(f"Determined buy trade amount for {product_id}: {trade_amount:.{max_precision}f} for performance score: {performance_score:.2f} and {quote_currency} balance: {quote_balance:.8f}")
+        return trade_amount
+
+    def determine_sell_trade_amount(self, performance_score, coin_balance, product_id, portion=0.3):
+        allocated_balance = coin_balance * portion
+        trade_amount = allocated_balance * performance_score
+
+        max_precision = self.product_catalog.sell_precision(product_id)
+        min_amount = self.min_trade_amount(product_id, 'sell')
+
+        if coin_balance < min_amount:
+            # Nothing (or less than one order) held: skip rather than send an
+            # order the exchange would reject
+            log.debug("No %s balance to sell (%.8f held)", product_id, coin_balance)
+            return 0
+
+        trade_amount = round(trade_amount, max_precision)
+        if trade_amount < min_amount:
+            trade_amount = min_amount  # Ensure trade amount respects the minimum
+
+        log.info(f"Determined sell trade amount for {product_id}: {trade_amount:.{max_precision}f} for performance score: {performance_score:.2f} and coin balance: {coin_balance:.8f}")
+        return trade_amount
+
+    # Protective exits sell the whole held balance, rounded down to the base
+    # increment, and need no score
+    def determine_exit_trade_amount(self, coin_balance, product_id):
+        max_precision = self.product_catalog.sell_precision(product_id)
+        trade_amount = math.floor(coin_balance * 10 ** max_precision) / 10 ** max_precision
+        log.info(f"Determined exit trade amount for {product_id}: {trade_amount:.{max_precision}f} for coin balance: {coin_balance:.8f}")
+        return trade_amount
+
+    # Function to handle an order response once the executor returns it
+    def handle_order_result(self, decision, product_id, trade_amount, order, client_order_id=None):
+        log.info(f"Executed {decision} order: {order}")
+        if self.state_journal and client_order_id:
+            self.state_journal.order_result(client_order_id, product_id, order)
+        if order.get('success'):
+            self.portfolio_cache.apply_order(order, decision, product_id, trade_amount, self.last_price(product_id))
+            order_id = order.get('order_id') or (order.get('success_response') or {}).get('order_id')
+            with self.entry_lock:
+                if decision == 'buy':
+                    # Store the entry price: the fill's average price if it came first
+                    price = self.fill_prices.pop(order_id, None)
+                    if price is None:
+                        price = self.last_price(product_id)
+                        self._track(self.provisional_entries, order_id, product_id)
+                    self.entry_prices[product_id] = price
                 else:
-                    print(json.dumps(order, indent=2))
-        except Exception as e:
-            print(f"Error executing {decision} order for {product_id} with amount {trade_amount}: {e}")
-    else:
-        print(f"Trade amount {trade_amount:.8f} is too small to execute for {decision} on {product_id}")
-
-
-
-min_trade_amounts = {
-    'BTC': 0.0001,'ETH': 0.0001,'LTC': 0.01,'BCH': 0.01,'ADA': 10,
-    'LINK': 0.1,'DOT': 0.1,'DOGE': 10,'UNI': 0.1,'SOL': 0.001,
-    'SHIB': 1000,'AAVE': 0.01,'ALGO': 10,'ATOM': 1,'FIL': 0.1,
-    'XTZ': 1
-}
-# Function to check account balances and make trading decisions
-def check_and_trade():
-    accounts = client.get_accounts()
-    gbp_balance = 0
-    portfolio = {}
-
-    for account in accounts['accounts']:
-        currency = account['currency']
-        balance = float(account['available_balance']['value'])
-        portfolio[currency] = balance
-        if currency == 'GBP':
-            gbp_balance = balance
-
-    for account in accounts['accounts']:
-        currency = account['currency']
-        if currency != 'GBP':
-            product_id = f"{currency}-GBP"
-            if product_id in available_wallets:
-                df = real_time_data[product_id].copy()
-                if len(df) >= 26:
-                    df = apply_technical_indicators(df)
-                    performance_score = calculate_performance_score(df)
-                    current_price = df['price'].iloc[-1]
-
-                    if entry_prices[product_id]:
-                        entry_price = entry_prices[product_id]
-                        if current_price <= entry_price * (1 - STOP_LOSS_PERCENTAGE):
-                            print(f"Stop loss triggered for {product_id}: current price {current_price} <= entry price {entry_price} * (1 - {STOP_LOSS_PERCENTAGE})")
-                            coin_balance = portfolio[currency]
-                            trade_amount = determine_sell_trade_amount(performance_score, coin_balance, product_id)
-                            if trade_amount >= min_trade_amounts.get(currency, 0.0001):
-                                execute_trade('sell', product_id, trade_amount)
-                            else:
-                                print(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id} (stop-loss triggered)")
-                        elif current_price >= entry_price * (1 + TAKE_PROFIT_PERCENTAGE):
-                            print(f"Take profit triggered for {product_id}: current price {current_price} >= entry price {entry_price} * (1 + {TAKE_PROFIT_PERCENTAGE})")
-                            coin_balance = portfolio[currency]
-                            trade_amount = determine_sell_trade_amount(performance_score, coin_balance, product_id)
-                            if trade_amount >= min_trade_amounts.get(currency, 0.0001):
-                                execute_trade('sell', product_id, trade_amount)
-                            else:
-                                print(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id} (take-profit triggered)")
-
-                    if performance_score > 0.5:
-                        trade_amount = determine_buy_trade_amount(performance_score, gbp_balance, product_id)
-                        if trade_amount >= min_trade_amounts.get(currency, 0.0001) and trade_amount > 0:
-                            execute_trade('buy', product_id, trade_amount)
-                        else:
-                            print(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id}")
-                    elif performance_score < 0.5:
-                        coin_balance = portfolio[currency]
-                        trade_amount = determine_sell_trade_amount(performance_score, coin_balance, product_id)
-                        if trade_amount >= min_trade_amounts.get(currency, 0.0001) and trade_amount > 0:
-                            execute_trade('sell', product_id, trade_amount)
-                        else:
-                            print(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id}")
-                    else:
-                        print(f"Performance score is neutral: {performance_score:.2f} for {product_id}")
-    if gbp_balance == 0:
-        print("GBP balance is zero. Cannot execute trades.")
-
-
-# Retry mechanism for WebSocket connection
-async def run_websocket(duration, retries=5, retry_delay=5):
-    for attempt in range(retries):
+                    self.entry_prices[product_id] = None  # Reset the entry price
+                    for pending in [key for key, pending in self.provisional_entries.items() if pending == product_id]:
+                        del self.provisional_entries[pending]
+                    log.debug("%s", json.dumps(order, indent=2))
+                if self.state_journal:
+                    self.state_journal.entry_price(product_id, self.entry_prices[product_id])
+        else:
+            self.portfolio_cache.invalidate()
+            log.warning(f"Failed to execute order: {order.get('failure_reason', 'Unknown reason')}")
+
+    # Remember key -> value among the last MAX_TRACKED_ORDERS orders
+    @staticmethod
+    def _track(orders, key, value):
+        if key:
+            orders[key] = value
+            if len(orders) > MAX_TRACKED_ORDERS:
+                del orders[next(iter(orders))]
+
+    # Called on the WebSocket thread with each user-channel order update: a
+    # buy's average fill price replaces the provisional entry price
+    def apply_fill_price(self, update):
+        price = float(update.get('avg_price') or 0)
+        if update.get('order_side', '').upper() != 'BUY' or not price:
+            return
+        order_id = update.get('order_id')
+        with self.entry_lock:
+            product_id = self.provisional_entries.get(order_id)
+            if product_id is None:
+                self._track(self.fill_prices, order_id, price)
+                return
+            self.entry_prices[product_id] = price
+            if update.get('status') == 'FILLED':
+                del self.provisional_entries[order_id]
+        if self.state_journal:
+            self.state_journal.record_later('entry_price', product_id, price)
+
+    def _order_done(self, decision, product_id, trade_amount, client_order_id, submitted, future):
+        self.ack_latency.record(time.perf_counter_ns() - submitted)
         try:
-            ws_client = WSClient(api_key, api_secret, on_message=on_message)
-            ws_client.open()
-            ws_client.subscribe(product_ids=available_wallets, channels=["ticker", "heartbeat"])
-            await asyncio.sleep(duration)
-            ws_client.close()
-            break
+            self.handle_order_result(decision, product_id, trade_amount, future.result(), client_order_id)
         except Exception as e:
-            print(f"WebSocket connection failed: {e}. Attempt {attempt + 1}/{retries}")
-            await asyncio.sleep(retry_delay)
-
-# Event to signal stopping the bot
-stop_event = threading.Event()
-
-# Graceful shutdown handler
-def shutdown_handler(signum, frame):
-    print("Shutting down...")
-    stop_event.set()
-
-# Register the signal handlers
-signal.signal(signal.SIGINT, shutdown_handler)
-signal.signal(signal.SIGTERM, shutdown_handler)
-
-# Main function to run the data collection and trading logic in cycles
-async def main():
-    print_wallet_balances()  # Print wallet balances at the beginning
-    while not stop_event.is_set():
-        print("Collecting data...")
-        await run_websocket(60)  # Run WebSocket for 1 minute to collect data
-        print("Running trading logic...")
-        check_and_trade()
-        print_wallet_balances()
-        print("Sleeping for 5 minutes...")
-        await asyncio.sleep(300)  # Sleep for 5 minutes before collecting data again
+            # The order may or may not have gone through; reload balances
+            self.portfolio_cache.invalidate()
+            log.error(f"Error executing {decision} order for {product_id} with amount {trade_amount}: {e}")
+
+    # Function to execute trades: submits the order to the async executor and
+    # returns its future, or None when nothing was sent
+    def execute_trade(self, decision, product_id, trade_amount):
+        if trade_amount >= self.min_trade_amount(product_id, decision) and trade_amount > 0:
+            self.trade_counters[product_id] += 1  # Increment the counter for each trade
+            client_order_id = f"order_{decision}_{self.session_id}_{product_id}_{self.trade_counters[product_id]}"
+            if self.state_journal:
+                self.state_journal.trade_count(product_id, self.trade_counters[product_id])
+                self.state_journal.order_submitted(client_order_id, product_id, decision, trade_amount)
 
-# Start the main asynchronous loop
-def run_main():
-    asyncio.run(main())
+            if decision == 'buy':
+                def place(order_id):
+                    return self.client.market_order_buy(client_order_id=order_id, product_id=product_id,
+                                                        quote_size=str(trade_amount))
+            else:
+                def place(order_id):
+                    return self.client.market_order_sell(client_order_id=order_id, product_id=product_id,
+                                                         base_size=str(trade_amount))
+
+            submitted = time.perf_counter_ns()
+            future = self.order_executor.submit(product_id, client_order_id, place)
+            self.submit_latency.record(time.perf_counter_ns() - submitted)
+            future.add_done_callback(
+                lambda f: self._order_done(decision, product_id, trade_amount, client_order_id, submitted, f))
+            return future
+        else:
+            log.info(f"Trade amount {trade_amount:.8f} is too small to execute for {decision} on {product_id}")
+            return None
+
+    # Function to get account balances keyed by currency from the local cache
+    def get_portfolio(self):
+        return self.portfolio_cache.snapshot()
+
+    # Function to turn the latest score and price into (decision, reason) pairs.
+    # Stop-loss and take-profit only need an entry price, so they still fire
+    # while the indicators warm up (performance_score None)
+    def decide_trades(self, product_id, performance_score, current_price):
+        decisions = []
+        if self.entry_prices[product_id]:
+            entry_price = self.entry_prices[product_id]
+            if current_price <= entry_price * (1 - STOP_LOSS_PERCENTAGE):
+                log.info(f"Stop loss triggered for {product_id}: current price {current_price} <= entry price {entry_price} * (1 - {STOP_LOSS_PERCENTAGE})")
+                decisions.append(('sell', 'stop-loss'))
+            elif current_price >= entry_price * (1 + TAKE_PROFIT_PERCENTAGE):
+                log.info(f"Take profit triggered for {product_id}: current price {current_price} >= entry price {entry_price} * (1 + {TAKE_PROFIT_PERCENTAGE})")
+                decisions.append(('sell', 'take-profit'))
+
+        if performance_score is None:
+            log.debug("Indicators are still warming up for %s", product_id)
+        elif performance_score > 0.5:
+            decisions.append(('buy', 'score'))
+        elif performance_score < 0.5:
+            decisions.append(('sell', 'score'))
+        else:
+            log.debug("Performance score is neutral: %.2f for %s", performance_score, product_id)
+        return decisions
+
+    # Function to size and submit a single decision
+    # Workers share one account, so each sizes buys from its share of the cash
+    def place_trade(self, product_id, decision, reason, performance_score, portfolio):
+        currency, quote_currency = product_id.split('-')
+        if decision == 'buy':
+            quote_balance = portfolio.get(quote_currency, 0) / self.worker_count
+            trade_amount = self.determine_buy_trade_amount(performance_score, quote_balance, product_id)
+        elif reason == 'score':
+            coin_balance = portfolio.get(currency, 0)
+            trade_amount = self.determine_sell_trade_amount(performance_score, coin_balance, product_id)
+        else:
+            trade_amount = self.determine_exit_trade_amount(portfolio.get(currency, 0), product_id)
 
-# Run the main function in a separate thread to handle signals
-main_thread = threading.Thread(target=run_main)
-main_thread.start()
+        if trade_amount >= self.min_trade_amount(product_id, decision) and trade_amount > 0:
+            return self.execute_trade(decision, product_id, trade_amount)
+        elif reason == 'score':
+            log.info(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id}")
+        else:
+            log.info(f"Trade amount {trade_amount:.8f} is below the minimum trade amount for {currency} on {product_id} ({reason} triggered)")
+        return None
+
+    # Function to check account balances and make trading decisions
+    def check_and_trade(self):
+        portfolio, quote_balance = self.get_portfolio()
+        futures = []
+
+        # Every watched product, including currencies without an account yet
+        for product_id, performance_score in zip(self.available_wallets, self.score_products(self.available_wallets)):
+            for decision, reason in self.decide_trades(product_id, performance_score, self.last_price(product_id)):
+                futures.append(self.place_trade(product_id, decision, reason, performance_score, portfolio))
+        # Orders for all products are in flight together; wait for the burst to settle
+        self.order_executor.wait_all([f for f in futures if f is not None])
+        if quote_balance == 0:
+            log.warning(f"{self.portfolio_cache.quote_currency} balance is zero. Cannot execute trades.")
+
+    # Event-driven counterpart of check_and_trade: re-score only the products
+    # that ticked, and fetch balances only when a debounced decision fires.
+    # Returns the futures of the orders it sent.
+    def evaluate_dirty_products(self, product_ids):
+        fired = []
+        for product_id, performance_score in zip(product_ids, self.score_products(product_ids)):
+            for decision, reason in self.decide_trades(product_id, performance_score, self.last_price(product_id)):
+                if self.decision_debouncer.allow(product_id, decision, reason, now=self.clock()):
+                    fired.append((product_id, decision, reason, performance_score))
+
+        if not fired:
+            return []
+        portfolio, _ = self.get_portfolio()
+        futures = [self.place_trade(product_id, decision, reason, performance_score, portfolio)
+                   for product_id, decision, reason, performance_score in fired]
+        futures = [f for f in futures if f is not None]
+        if self.paced:
+            # Fill at this tick's price, as a live order would be
+            self.order_executor.wait_all(futures)
+        return futures
+
+    # Simulator pacing: hold the replay until the tick just sent is evaluated
+    def wait_for_dispatch(self):
+        while not self.stop_event.is_set() and not self.dispatcher.wait_settled(timeout=1):
+            pass
+
+    # Check protective exits on every tick so they don't wait for the next bar
+    def check_protective_exit(self, product_id, price):
+        entry_price = self.entry_prices[product_id]
+        if entry_price and (price <= entry_price * (1 - STOP_LOSS_PERCENTAGE)
+                            or price >= entry_price * (1 + TAKE_PROFIT_PERCENTAGE)):
+            self.dispatcher.mark_urgent(product_id, self.product_index.get(product_id) // self.connection_size)
+
+    # Graceful shutdown handler
+    def shutdown_handler(self, signum, frame):
+        log.info("Shutting down...")
+        self.stop_event.set()
+
+# Trading loop of a bot: keep the feed connected and evaluate trades per tick
+# or on a fixed schedule until its stop_event is set
+async def run(bot):
+    metrics_server = bot.telemetry.serve(int(bot.metrics_port)) if bot.metrics_port else None
+    bot.print_wallet_balances()  # Print wallet balances at the beginning
+    feed_task = asyncio.create_task(bot.feed.run(bot.stop_event))
+    dispatch_task = asyncio.create_task(bot.dispatcher.run(bot.stop_event)) if EVENT_DRIVEN else None
+    while not bot.stop_event.is_set():
+        await asyncio.sleep(EVALUATION_INTERVAL)
+        if not EVENT_DRIVEN:
+            if bot.feed.stale:
+                log.warning("Feed is stale, skipping trading logic")
+                continue
+            log.info("Running trading logic...")
+            bot.check_and_trade()
+        bot.print_wallet_balances()
+        bot.tick_recorder.flush()
+        if bot.state_journal:
+            bot.save_snapshots()
+        if bot.metrics_snapshot:
+            bot.telemetry.write_snapshot(bot.metrics_snapshot)
+        # A simulated exchange stops once its replay is exhausted
+        replay_finished = getattr(bot.exchange, 'finished', None)
+        if replay_finished is not None and replay_finished.is_set():
+            log.info(f"Replay finished: {bot.exchange.stats()}")
+            bot.stop_event.set()
+    await feed_task
+    if dispatch_task:
+        await dispatch_task
+    bot.order_executor.close()
+    bot.tick_recorder.flush()
+    if bot.state_journal:
+        bot.save_snapshots()
+        bot.state_journal.compact()
+        bot.state_journal.close()
+    if bot.metrics_snapshot:
+        bot.telemetry.write_snapshot(bot.metrics_snapshot)
+    if metrics_server:
+        metrics_server.shutdown()
 
-# Wait for the main thread to finish
-main_thread.join()
\ No newline at end of file
+# Start the main asynchronous loop
+def run_main(bot):
+    asyncio.run(run(bot))
+
+# Entry point. With workers > 1 the products are partitioned across that many
+# processes, each a full copy of the bot with its own feeds, candles and
+# evaluation; the parent process only supervises them. Returns the exit code.
+def main():
+    # Load environment variables from .env file
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    worker_count = int(os.getenv("workers", "1"))
+    worker_index = os.getenv(WORKER_INDEX_VARIABLE)
+
+    # Log through a background queue so console I/O never stalls the WebSocket callback
+    log_listener = setup_queue_logging(
+        os.getenv("log_level", "INFO").upper(),
+        fmt=f'%(asctime)s %(levelname)s [worker {worker_index}] %(name)s: %(message)s' if worker_index else
+        '%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    if worker_count > 1 and worker_index is None:
+        exit_code = run_workers(worker_count)
+        log_listener.stop()
+        return exit_code
+    bot = TradingBot(worker_count, int(worker_index or 0))
+
+    # Register the signal handlers
+    signal.signal(signal.SIGINT, bot.shutdown_handler)
+    signal.signal(signal.SIGTERM, bot.shutdown_handler)
+
+    # Run the trading loop in a separate thread to handle signals
+    main_thread = threading.Thread(target=run_main, args=(bot,))
+    main_thread.start()
+    main_thread.join()
+    log_listener.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,420 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import align_frames, run_portfolio, run_single_asset
+from bars import BarAggregator
+from columnar_store import ColumnarStore, read_historical_csv
+from decoder import MessageDecoder
+from indicators import indicator_arrays
+from scoring import score_columns
+from strategies import ClassicStrategy, SignalGraph
+from tick_backtest import TickBacktester
+from tick_buffer import TickBuffer
+
+DEFAULT_OUTPUT_DIR = 'bench_results'
+
+# Per-message and per-update benchmarks run in pure Python; cap their input
+# so large datasets still finish, and report throughput on what was run
+MAX_MESSAGES = 200_000
+MAX_STREAMING_UPDATES = 1_000_000
+
+SWEEP_GRID = {'rsi_low': [25, 30], 'rsi_high': [70, 75], 'portion': [0.1, 0.3], 'stop_loss': [None, 0.05]}
+
+CSV_FILE = 'historical_data_BTC.csv'
+
+# Startup budgets in seconds: importing the bot module, and process start to
+# the first subscription of a simulated run. Importing must not pull in the
+# heavy optional dependencies, which the bot loads only where it uses them.
+IMPORT_BUDGET = 0.5
+SUBSCRIBE_BUDGET = 1.0
+LAZY_MODULES = ('pandas', 'ta', 'coinbase', 'dotenv')
+
+
+# `rows` ticks spread round-robin over `products` random-walk price series,
+# about one tick per 100ms, as (times_ns, product slots, prices)
+def synthetic_ticks(rows, products=1, seed=0, start='2024-01-01'):
+    rng = np.random.default_rng(seed)
+    times = pd.Timestamp(start).value + np.cumsum(rng.integers(1, 200_000_000, rows, dtype=np.int64))
+    slots = np.arange(rows, dtype=np.int32) % products
+    steps = rng.normal(0, 0.001, rows)
+    prices = np.empty(rows)
+    for slot in range(products):
+        mask = slots == slot
+        prices[mask] = 100 * (slot + 1) * np.exp(np.cumsum(steps[mask]))
+    return times, slots, prices
+
+
+# `rows` bars in total split evenly over `products` OHLCV frames shaped like
+# the historical CSVs (date index, open/high/low/close/volume plus 'price')
+def synthetic_bars(rows, products=1, seed=0, freq='1D', start='2010-01-01'):
+    rng = np.random.default_rng(seed)
+    per_product = max(rows // products, 1)
+    index = pd.date_range(start, periods=per_product, freq=freq)
+    frames = {}
+    for slot in range(products):
+        close = 100 * (slot + 1) * np.exp(np.cumsum(rng.normal(0, 0.02, per_product)))
+        spread = np.abs(rng.normal(0, 0.01, per_product)) * close
+        frames[f'P{slot}-GBP'] = pd.DataFrame({
+            'open': np.roll(close, 1), 'high': close + spread, 'low': close - spread,
+            'close': close, 'volume': rng.uniform(1e3, 1e6, per_product), 'price': close,
+        }, index=index)
+    return frames
+
+
+def csv_bars(file_path=CSV_FILE):
+    data = read_historical_csv(file_path)
+    data['price'] = data['close']
+    return {'BTC-GBP': data}
+
+
+# Dataset shared by the benchmarks: bar frames per product and a tick stream
+def make_dataset(name, rows=None, products=1, seed=0):
+    if name == 'csv':
+        frames = csv_bars()
+        frame = frames['BTC-GBP']
+        times = frame.index.values.astype('datetime64[ns]').astype(np.int64)
+        ticks = times, np.zeros(len(times), dtype=np.int32), frame['close'].to_numpy()
+    else:
+        frames = synthetic_bars(rows, products, seed)
+        ticks = synthetic_ticks(rows, products, seed)
+    return {'name': name, 'frames': frames, 'ticks': ticks, 'product_ids': list(frames)}
+
+
+def _ticker_messages(dataset, limit):
+    times, slots, prices = (column[:limit] for column in dataset['ticks'])
+    product_ids = dataset['product_ids']
+    stamps = np.datetime_as_string(times.astype('datetime64[ns]'))
+    return [json.dumps({'channel': 'ticker', 'client_id': '', 'timestamp': f'{stamp}Z', 'sequence_num': i,
+                        'events': [{'type': 'update', 'tickers': [
+                            {'type': 'ticker', 'product_id': product_ids[slot], 'price': str(price)}]}]},
+                       separators=(',', ':'))
+            for i, (stamp, slot, price) in enumerate(zip(stamps.tolist(), slots.tolist(), prices.tolist()))]
+
+
+# Each benchmark prepares its inputs untimed and returns (run, items): run()
+# is what gets timed and items is how many rows it processes
+BENCHMARKS = {}
+
+
+def benchmark(function):
+    BENCHMARKS[function.__name__.replace('bench_', '')] = function
+    return function
+
+
+# WebSocket message -> decoder -> tick buffer -> bar aggregator, as on_message
+@benchmark
+def bench_ingest_messages(dataset, options):
+    messages = _ticker_messages(dataset, MAX_MESSAGES)
+    product_ids = dataset['product_ids']
+
+    def run():
+        decoder = MessageDecoder(product_ids)
+        buffers = [TickBuffer() for _ in product_ids]
+        aggregator = BarAggregator(product_ids)
+        for msg in messages:
+            decoded = decoder.decode(msg)
+            if decoded is None:
+                continue
+            for slot, product_id, timestamp, price in decoder.tickers(decoded[1]):
+                buffers[slot].append(timestamp, price)
+                aggregator.update(slot, timestamp, price)
+    return run, len(messages)
+
+
+# Appending the tick stream to the columnar store and mapping it back
+@benchmark
+def bench_store_roundtrip(dataset, options):
+    times, slots, prices = dataset['ticks']
+    product_ids = dataset['product_ids']
+    columns = []
+    for slot, product_id in enumerate(product_ids):
+        mask = slots == slot
+        columns.append((product_id, {'time': times[mask], 'price': prices[mask]}))
+
+    def run():
+        with tempfile.TemporaryDirectory() as root:
+            store = ColumnarStore(root)
+            for product_id, ticks in columns:
+                store.append(product_id, 'ticks', ticks)
+            for product_id, _ in columns:
+                float(np.asarray(store.load(product_id, 'ticks')['price']).sum())
+    return run, len(times)
+
+
+# Whole-series indicators through ta, as apply_technical_indicators
+@benchmark
+def bench_indicators_batch(dataset, options):
+    closes = [frame['close'].to_numpy() for frame in dataset['frames'].values()]
+
+    def run():
+        for prices in closes:
+            indicator_arrays(prices)
+    return run, sum(len(prices) for prices in closes)
+
+
+# Per-update streaming indicators, as the live bot on each bar close
+@benchmark
+def bench_indicators_streaming(dataset, options):
+    closes = [frame['close'].to_numpy() for frame in dataset['frames'].values()]
+    budget = MAX_STREAMING_UPDATES
+    series = []
+    for prices in closes:
+        if budget <= 0:
+            break
+        series.append(prices[:budget].tolist())
+        budget -= len(series[-1])
+
+    graph = SignalGraph([ClassicStrategy()])
+
+    def run():
+        for prices in series:
+            signals = graph.stream()
+            for price in prices:
+                signals.update(price)
+            signals.values()
+    return run, sum(len(prices) for prices in series)
+
+
+@benchmark
+def bench_scoring(dataset, options):
+    columns = [indicator_arrays(frame['close'].to_numpy()) for frame in dataset['frames'].values()]
+
+    def run():
+        for column in columns:
+            score_columns(column)
+    return run, sum(len(column['price']) for column in columns)
+
+
+# Vectorized single-asset backtest of every product in turn
+@benchmark
+def bench_backtest_single(dataset, options):
+    inputs = []
+    for product_id, frame in dataset['frames'].items():
+        columns = indicator_arrays(frame['close'].to_numpy())
+        inputs.append((product_id, frame.index.to_numpy(), columns['price'], score_columns(columns)))
+
+    def run():
+        for product_id, times, prices, scores in inputs:
+            run_single_asset(times, prices, scores, product_id, 50000, {}, 50000, 0.1)
+    return run, sum(len(prices) for _, _, prices, _ in inputs)
+
+
+# Multi-asset backtest on the aligned time axis
+@benchmark
+def bench_backtest_portfolio(dataset, options):
+    frames = {}
+    for product_id, frame in dataset['frames'].items():
+        columns = indicator_arrays(frame['close'].to_numpy())
+        frames[product_id] = pd.DataFrame({'price': columns['price'], 'score': score_columns(columns)},
+                                          index=frame.index)
+
+    def run():
+        times, product_ids, prices = align_frames(frames)
+        _, _, scores = align_frames(frames, 'score')
+        run_portfolio(times, product_ids, prices, scores, 50000, {}, 50000, 0.1)
+    return run, sum(len(frame) for frame in frames.values())
+
+
+# Event-driven replay of the tick stream through the live rules at 1m bars
+@benchmark
+def bench_backtest_ticks(dataset, options):
+    times, slots, prices = dataset['ticks']
+    product_ids = [f'P{slot}-GBP' for slot in range(int(slots.max()) + 1)]
+    interval = '1d' if dataset['name'] == 'csv' else '1m'
+
+    def run():
+        TickBacktester(product_ids, times, slots, prices, interval=interval).run()
+    return run, len(times)
+
+
+# Process-pool parameter sweep over the first product
+@benchmark
+def bench_sweep(dataset, options):
+    import sweep
+
+    frame = next(iter(dataset['frames'].values()))
+    prices = frame['close'].to_numpy()
+    times = frame.index.values.astype('datetime64[ns]').astype(np.int64)
+    configs = sweep.grid(**SWEEP_GRID)
+
+    def run():
+        sweep.sweep(prices, configs, workers=options.get('workers'), times=times)
+    return run, len(configs) * len(prices)
+
+
+def _peak_memory(run):
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# Best-of-`repeat` wall time and, optionally, tracemalloc peak memory of one
+# benchmark (the memory pass is separate so tracing does not skew timings)
+def measure(name, dataset, repeat=3, memory=True, options=None):
+    run, items = BENCHMARKS[name](dataset, options or {})
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    result = {
+        'benchmark': name,
+        'dataset': dataset['name'],
+        'products': len(dataset['product_ids']),
+        'items': items,
+        'seconds': best,
+        'mean_seconds': sum(timings) / len(timings),
+        'items_per_second': items / best if best > 0 else None,
+    }
+    if memory:
+        result['peak_memory_mb'] = _peak_memory(run) / 2 ** 20
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def run_suite(sizes, products, names=None, repeat=3, memory=True, seed=0, include_csv=True, workers=None):
+    names = names or list(BENCHMARKS)
+    datasets = [('csv', None)] if include_csv and os.path.exists(CSV_FILE) else []
+    datasets += [(f'synthetic_{rows}x{products}', rows) for rows in sizes]
+    results = []
+    for dataset_name, rows in datasets:
+        dataset = make_dataset('csv' if rows is None else dataset_name, rows, products, seed)
+        dataset['name'] = dataset_name
+        for name in names:
+            result = measure(name, dataset, repeat, memory, {'workers': workers})
+            result['rows'] = rows
+            results.append(result)
+            memory_note = f", peak {result['peak_memory_mb']:.1f} MB" if memory else ''
+            print(f"{dataset_name:>24} {name:<22} {result['seconds'] * 1000:10.2f} ms "
+                  f"{result['items_per_second'] or 0:14,.0f} rows/s{memory_note}")
+    return {'environment': environment(), 'results': results}
+
+
+# Seconds to import `module` in a fresh interpreter, and which LAZY_MODULES
+# the import loaded
+def import_time(module='base_bot2'):
+    code = (f"import sys, time; started = time.perf_counter(); import {module}; "
+            f"print(time.perf_counter() - started, *[name for name in {LAZY_MODULES!r} if name in sys.modules])")
+    fields = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    return float(fields[0]), fields[1:]
+
+
+# Seconds from launching base_bot2.py against the simulator until its feed
+# logs the first subscription, or None if it exits first. The bot runs in
+# `cwd` (this directory by default), where it caches product metadata.
+def time_to_subscribe(env=None, cwd=None):
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, exchange='sim', state_path='', SIM_CSV=os.path.join(here, CSV_FILE), **(env or {}))
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(here, 'base_bot2.py')], env=env, cwd=cwd or here,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        for line in process.stderr:
+            if 'subscribed to' in line:
+                return time.perf_counter() - started
+        return None
+    finally:
+        # Nothing is journaled with state_path unset, so skip the graceful shutdown
+        process.kill()
+        process.communicate()
+
+
+# Startup timings against IMPORT_BUDGET and SUBSCRIBE_BUDGET; the best of
+# `repeat` runs each, so a cold disk cache doesn't fail the check
+def check_startup(repeat=3):
+    imports = [import_time() for _ in range(repeat)]
+    seconds, loaded = min(imports)
+    subscribes = [time_to_subscribe() for _ in range(repeat)]
+    subscribe = min((t for t in subscribes if t is not None), default=None)
+    failures = []
+    if seconds > IMPORT_BUDGET:
+        failures.append(f"import took {seconds:.3f}s, budget {IMPORT_BUDGET}s")
+    if loaded:
+        failures.append(f"import loaded {', '.join(loaded)}")
+    if subscribe is None or subscribe > SUBSCRIBE_BUDGET:
+        failures.append(f"first subscription took {subscribe}s, budget {SUBSCRIBE_BUDGET}s")
+    return {'import_seconds': seconds, 'subscribe_seconds': subscribe, 'failures': failures}
+
+
+# Side-by-side timings of two saved result files, keyed by dataset and benchmark
+def compare(baseline_path, candidate_path):
+    with open(baseline_path) as f:
+        baseline = {(r['dataset'], r['benchmark']): r for r in json.load(f)['results']}
+    with open(candidate_path) as f:
+        candidate = {(r['dataset'], r['benchmark']): r for r in json.load(f)['results']}
+    rows = []
+    for key in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[key]['seconds'], candidate[key]['seconds']
+        rows.append({'dataset': key[0], 'benchmark': key[1], 'baseline_ms': before * 1000,
+                     'candidate_ms': after * 1000, 'speedup': before / after if after else None})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ingestion, indicators, scoring and backtests')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000],
+                        help='synthetic dataset sizes in rows (1k to 100M)')
+    parser.add_argument('--products', type=int, default=16, help='products per synthetic dataset (1 to 500)')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='process pool size for the sweep benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc peak memory pass')
+    parser.add_argument('--no-csv', action='store_true', help=f'skip {CSV_FILE}')
+    parser.add_argument('--output', help=f'results file (default {DEFAULT_OUTPUT_DIR}/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CANDIDATE'),
+                        help='compare two results files instead of running')
+    parser.add_argument('--startup', action='store_true',
+                        help='check import time and time to first subscription against their budgets')
+    args = parser.parse_args()
+
+    if args.startup:
+        startup = check_startup(args.repeat)
+        print(f"import {startup['import_seconds'] * 1000:.0f} ms, first subscription "
+              f"{(startup['subscribe_seconds'] or 0) * 1000:.0f} ms")
+        for failure in startup['failures']:
+            print(f"Over budget: {failure}")
+        sys.exit(1 if startup['failures'] else 0)
+
+    if args.compare:
+        print(compare(*args.compare).to_string(index=False))
+        sys.exit()
+
+    report = run_suite(args.rows, args.products, args.only, args.repeat, not args.no_memory, args.seed,
+                       not args.no_csv, args.workers)
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{report['environment']['commit'] or 'results'}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {len(report['results'])} results to {output}")
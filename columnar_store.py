@@ -0,0 +1,201 @@
+import logging
+import os
+import queue
+import threading
+
+import numpy as np
+
+# Default location of the on-disk market data store
+DEFAULT_ROOT = 'data'
+
+# Column layouts of the two record kinds kept per product
+SCHEMAS = {
+    'ticks': {'time': np.int64, 'price': np.float64},
+    'bars': {'time': np.int64, 'open': np.float64, 'high': np.float64, 'low': np.float64,
+             'close': np.float64, 'volume': np.float64},
+}
+
+# Ticks are partitioned by day, bars by month to keep file counts small
+PARTITION_UNITS = {'ticks': 'D', 'bars': 'M'}
+
+# Alpha Vantage-style CSV headers and the bar columns they hold
+CSV_COLUMNS = {'1. open': 'open', '2. high': 'high', '3. low': 'low', '4. close': 'close', '5. volume': 'volume'}
+
+log = logging.getLogger(__name__)
+
+
+# A historical_data_{symbol}.csv file as a date-indexed, sorted frame with
+# plain open/high/low/close/volume columns
+def read_historical_csv(file_path):
+    import pandas as pd
+
+    data = pd.read_csv(file_path, index_col='date', parse_dates=True).sort_index()
+    return data.rename(columns=CSV_COLUMNS)
+
+
+# Append-only columnar store: one raw little-endian file per column per
+# partition, laid out as <root>/<product_id>/<kind>/<partition>/<column>.bin
+# and read back through np.memmap without parsing.
+class ColumnarStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _kind_dir(self, product_id, kind):
+        return os.path.join(self.root, product_id, kind)
+
+    def products(self, kind='bars'):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(p for p in os.listdir(self.root) if os.path.isdir(self._kind_dir(p, kind)))
+
+    def has(self, product_id, kind='bars'):
+        return bool(self._partitions(product_id, kind))
+
+    def _partitions(self, product_id, kind):
+        directory = self._kind_dir(product_id, kind)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    @staticmethod
+    def _partition_keys(times, kind):
+        return np.asarray(times, dtype='datetime64[ns]').astype(f'datetime64[{PARTITION_UNITS[kind]}]')
+
+    # Append records (a dict of equal-length column arrays, sorted by time)
+    def append(self, product_id, kind, columns):
+        schema = SCHEMAS[kind]
+        times = np.asarray(columns['time'], dtype=np.int64)
+        if len(times) == 0:
+            return
+        keys = self._partition_keys(times, kind)
+        boundaries = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = np.concatenate([[0], boundaries])
+        ends = np.concatenate([boundaries, [len(times)]])
+        with self._lock:
+            for start, end in zip(starts, ends):
+                directory = os.path.join(self._kind_dir(product_id, kind), str(keys[start]))
+                os.makedirs(directory, exist_ok=True)
+                for name, dtype in schema.items():
+                    values = np.ascontiguousarray(np.asarray(columns[name])[start:end], dtype=dtype)
+                    with open(os.path.join(directory, f'{name}.bin'), 'ab') as f:
+                        f.write(values.tobytes())
+
+    def _map_partition(self, directory, schema):
+        mapped = {}
+        for name, dtype in schema.items():
+            path = os.path.join(directory, f'{name}.bin')
+            size = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+            mapped[name] = np.memmap(path, dtype=dtype, mode='r', shape=(size,)) if size else np.empty(0, dtype)
+        # A crash between column writes can leave columns of unequal length
+        length = min(len(values) for values in mapped.values())
+        return {name: values[:length] for name, values in mapped.items()}
+
+    # Memory-map the records of a product between start and end (inclusive
+    # start, exclusive end, anything accepted by np.datetime64). A single
+    # partition is returned as zero-copy memmap slices.
+    def load(self, product_id, kind='bars', start=None, end=None):
+        schema = SCHEMAS[kind]
+        unit = PARTITION_UNITS[kind]
+        start_ns = None if start is None else np.datetime64(start, 'ns').astype(np.int64)
+        end_ns = None if end is None else np.datetime64(end, 'ns').astype(np.int64)
+        first = None if start is None else str(np.datetime64(start, unit))
+        last = None if end is None else str(np.datetime64(end, unit))
+
+        chunks = []
+        for partition in self._partitions(product_id, kind):
+            if (first is not None and partition < first) or (last is not None and partition > last):
+                continue
+            columns = self._map_partition(os.path.join(self._kind_dir(product_id, kind), partition), schema)
+            times = columns['time']
+            lo = 0 if start_ns is None else np.searchsorted(times, start_ns, side='left')
+            hi = len(times) if end_ns is None else np.searchsorted(times, end_ns, side='left')
+            if hi > lo:
+                chunks.append({name: values[lo:hi] for name, values in columns.items()})
+
+        if not chunks:
+            return {name: np.empty(0, dtype) for name, dtype in schema.items()}
+        if len(chunks) == 1:
+            return chunks[0]
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in schema}
+
+    def load_frame(self, product_id, kind='bars', start=None, end=None):
+        import pandas as pd
+
+        columns = self.load(product_id, kind, start, end)
+        index = pd.DatetimeIndex(np.asarray(columns['time']).view('datetime64[ns]'),
+                                 name='date' if kind == 'bars' else 'time')
+        return pd.DataFrame({name: values for name, values in columns.items() if name != 'time'}, index=index)
+
+    # One-off conversion of a historical_data_{symbol}.csv file into bars
+    def import_csv(self, symbol, file_path=None):
+        data = read_historical_csv(file_path or f'historical_data_{symbol}.csv')
+        columns = {'time': data.index.values.astype('datetime64[ns]').astype(np.int64)}
+        for name in SCHEMAS['bars']:
+            if name != 'time':
+                columns[name] = data[name].to_numpy(dtype=np.float64)
+        self.append(symbol, 'bars', columns)
+
+
+# Buffers live ticks per product and appends them to the store in batches.
+# A full batch is swapped out and handed to a writer thread, so the WebSocket
+# callback never waits on disk I/O; one writer keeps each product's batches
+# in order. flush() queues everything pending and waits until it is written.
+class TickRecorder:
+    def __init__(self, store, flush_size=1024):
+        self.store = store
+        self.flush_size = flush_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._batches = queue.Queue()
+        self._writer = threading.Thread(target=self._write_batches, name='tick-recorder', daemon=True)
+        self._writer.start()
+
+    def record(self, product_id, time_ns, price):
+        with self._lock:
+            times, prices = self._pending.setdefault(product_id, ([], []))
+            times.append(time_ns)
+            prices.append(price)
+            if len(times) >= self.flush_size:
+                self._batches.put((product_id, self._pending.pop(product_id)))
+
+    def flush(self, product_id=None):
+        with self._lock:
+            product_ids = [product_id] if product_id else list(self._pending)
+            for p in product_ids:
+                if p in self._pending:
+                    self._batches.put((p, self._pending.pop(p)))
+        self._batches.join()
+
+    def _write_batches(self):
+        while True:
+            product_id, (times, prices) = self._batches.get()
+            try:
+                times = np.asarray(times, dtype=np.int64)
+                order = np.argsort(times, kind='stable')
+                self.store.append(product_id, 'ticks', {'time': times[order],
+                                                        'price': np.asarray(prices, dtype=np.float64)[order]})
+            except Exception:
+                log.exception(f"Failed to record {len(times)} ticks of {product_id}")
+            finally:
+                self._batches.task_done()
+
+
+# Daily bars for a symbol, importing historical_data_{symbol}.csv into the
+# store on first use. Delete <root>/<symbol>/bars to re-import the CSV.
+def load_historical_bars(symbol, start_date=None, end_date=None, store=None):
+    store = store or ColumnarStore()
+    if not store.has(symbol, 'bars'):
+        store.import_csv(symbol)
+    return store.load_frame(symbol, 'bars', start_date, end_date)
+
+
+# Resample stored live ticks into OHLCV bars shaped like the historical data.
+# The ticker feed carries no trade size, so the tick count stands in for volume.
+def load_tick_bars(product_id, freq='1D', start_date=None, end_date=None, store=None):
+    store = store or ColumnarStore()
+    ticks = store.load_frame(product_id, 'ticks', start_date, end_date)
+    bars = ticks['price'].resample(freq).ohlc().dropna()
+    bars['volume'] = ticks['price'].resample(freq).count().reindex(bars.index).astype(np.float64)
+    bars.index.name = 'date'
+    return bars
@@ -0,0 +1,3 @@
+# test_bot.py and test_using_csv.py are backtest scripts that run (and fetch
+# data) when imported, not pytest modules
+collect_ignore = ['test_bot.py', 'test_using_csv.py']
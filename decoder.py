@@ -0,0 +1,182 @@
+import logging
+import sys
+import time
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # orjson is optional; fall back to the standard library
+    import json
+
+    _loads = json.loads
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+
+log = logging.getLogger(__name__)
+
+# Epoch ns of midnight for each 'YYYY-MM-DD' seen, so only the time of day
+# is parsed per message
+_midnights = {}
+
+
+# Days since 1970-01-01 for a proleptic Gregorian date (Hinnant's algorithm)
+def days_from_civil(year, month, day):
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+# Convert an ISO-8601 timestamp such as 2024-05-01T12:30:15.123456789Z (or
+# with a +HH:MM offset) to integer nanoseconds since the epoch
+def parse_iso8601_ns(text):
+    date = text[:10]
+    midnight = _midnights.get(date)
+    if midnight is None:
+        midnight = days_from_civil(int(text[0:4]), int(text[5:7]), int(text[8:10])) * NS_PER_DAY
+        _midnights[date] = midnight
+    seconds = int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+    fraction = 0
+    position = 19
+    length = len(text)
+    if position < length and text[position] == '.':
+        end = position + 1
+        while end < length and text[end].isdigit():
+            end += 1
+        digits = text[position + 1:end]
+        fraction = int(digits[:9].ljust(9, '0'))
+        position = end
+    offset = 0
+    if position < length and text[position] in '+-':
+        sign = 1 if text[position] == '+' else -1
+        offset = sign * (int(text[position + 1:position + 3]) * 3600 + int(text[position + 4:position + 6]) * 60)
+    return midnight + (seconds - offset) * NS_PER_SECOND + fraction
+
+
+# Interned product id -> dense slot number, for O(1) membership tests and
+# indexing per-product arrays
+class ProductIndex:
+    def __init__(self, product_ids):
+        self.product_ids = [sys.intern(product_id) for product_id in product_ids]
+        self.slots = {product_id: slot for slot, product_id in enumerate(self.product_ids)}
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def __contains__(self, product_id):
+        return product_id in self.slots
+
+    def get(self, product_id):
+        return self.slots.get(product_id)
+
+    def add(self, product_id):
+        slot = self.slots.get(product_id)
+        if slot is None:
+            product_id = sys.intern(product_id)
+            slot = len(self.product_ids)
+            self.product_ids.append(product_id)
+            self.slots[product_id] = slot
+        return slot
+
+
+# Fast-path decoding of WebSocket messages: heartbeats are dropped from the
+# raw text before any JSON parsing, the rest are parsed with orjson when
+# available and ticker events are reduced to (slot, product_id, time_ns, price)
+class MessageDecoder:
+    def __init__(self, product_ids):
+        self.index = product_ids if isinstance(product_ids, ProductIndex) else ProductIndex(product_ids)
+        self.decoded = 0
+        self.dropped = 0
+        self.unknown_products = 0
+
+    # (channel, data) for a raw message, or None if it was dropped unparsed
+    def decode(self, msg):
+        if 'heartbeats' in msg[:48]:
+            self.dropped += 1
+            return None
+        data = _loads(msg)
+        self.decoded += 1
+        return data.get('channel'), data
+
+    def tickers(self, data):
+        ticks = []
+        slots = self.index.slots
+        for event in data.get('events', ()):
+            for ticker in event.get('tickers', ()):
+                product_id = ticker.get('product_id')
+                slot = slots.get(product_id)
+                if slot is None:
+                    self.unknown_products += 1
+                    continue
+                time_str = ticker.get('time') or data.get('timestamp')
+                if not time_str:
+                    log.warning(f"Skipping ticker without time: {ticker}")
+                    continue
+                ticks.append((slot, self.index.product_ids[slot], parse_iso8601_ns(time_str),
+                              float(ticker.get('price', 0))))
+        return ticks
+
+
+def _sample_messages(product_ids, n, heartbeat_every=10):
+    import json
+
+    messages = []
+    for i in range(n):
+        if i % heartbeat_every == 0:
+            messages.append(json.dumps({'channel': 'heartbeats', 'client_id': '',
+                                        'timestamp': '2024-05-01T12:30:15.123456789Z', 'sequence_num': i,
+                                        'events': [{'current_time': '2024-05-01 12:30:15.123 +0000 UTC',
+                                                    'heartbeat_counter': i}]}, separators=(',', ':')))
+            continue
+        product_id = product_ids[i % len(product_ids)]
+        messages.append(json.dumps({'channel': 'ticker', 'client_id': '',
+                                    'timestamp': f'2024-05-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}Z',
+                                    'sequence_num': i,
+                                    'events': [{'type': 'update', 'tickers': [{
+                                        'type': 'ticker', 'product_id': product_id, 'price': f'{20000 + i % 500}.12',
+                                        'volume_24_h': '1234.5', 'low_24_h': '19000', 'high_24_h': '21000',
+                                        'best_bid': '20000.01', 'best_ask': '20000.02'}]}]},
+                                   separators=(',', ':')))
+    return messages
+
+
+# Messages per second through the decoder versus the original on_message
+# parsing path (json.loads, list membership and pd.to_datetime per ticker)
+def benchmark(n=100_000, product_ids=None):
+    import json
+
+    import pandas as pd
+
+    product_ids = product_ids or [f'{symbol}-GBP' for symbol in (
+        'BTC', 'ETH', 'LTC', 'BCH', 'ADA', 'LINK', 'DOT', 'DOGE',
+        'UNI', 'SOL', 'SHIB', 'AAVE', 'ALGO', 'ATOM', 'FIL', 'XTZ')]
+    messages = _sample_messages(product_ids, n)
+
+    start = time.perf_counter()
+    for msg in messages:
+        data = json.loads(msg)
+        for event in data.get('events', []):
+            for ticker in event.get('tickers', []):
+                if ticker.get('product_id') in product_ids:
+                    pd.to_datetime(ticker.get('time') or data.get('timestamp'))
+                    float(ticker.get('price', 0))
+    baseline = n / (time.perf_counter() - start)
+
+    decoder = MessageDecoder(product_ids)
+    start = time.perf_counter()
+    for msg in messages:
+        decoded = decoder.decode(msg)
+        if decoded is not None:
+            decoder.tickers(decoded[1])
+    fast = n / (time.perf_counter() - start)
+    return {'baseline_msgs_per_sec': baseline, 'decoder_msgs_per_sec': fast, 'speedup': fast / baseline}
+
+
+if __name__ == '__main__':
+    results = benchmark()
+    print(f"Baseline: {results['baseline_msgs_per_sec']:,.0f} msg/s")
+    print(f"Decoder:  {results['decoder_msgs_per_sec']:,.0f} msg/s ({results['speedup']:.1f}x)")
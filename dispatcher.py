@@ -0,0 +1,163 @@
+import asyncio
+import logging
+import threading
+import time
+
+from handoff import DEFAULT_QUEUE_CAPACITY, SPSCQueue
+
+# How often the dispatcher looks for products that are due
+POLL_INTERVAL = 0.05
+
+log = logging.getLogger(__name__)
+
+
+# Collects products marked dirty by the feed thread and hands the ones that
+# are due to `evaluate` in batches, at most once per `cadence` seconds per
+# product. Urgent products (protective exits) skip the cadence.
+# Marks travel from each feed thread (one producer per feed connection,
+# passing its index as `producer`) to the dispatch loop (the single
+# consumer) over its own lock-free SPSCQueue. If the loop falls so far
+# behind that a queue is full, further marks are coalesced into per-product
+# counters instead, so no product is ever lost, and the drops are counted;
+# the loop stops sleeping between polls until it catches up.
+# wait_settled() lets a producer block until everything it marked has been
+# evaluated, so a replay can step the loop one tick at a time.
+class TradeDispatcher:
+    def __init__(self, evaluate, cadence=0.25, poll_interval=POLL_INTERVAL, queue_capacity=DEFAULT_QUEUE_CAPACITY,
+                 producers=1):
+        self.evaluate = evaluate
+        self.cadence = cadence
+        self.poll_interval = poll_interval
+        self.evaluations = 0
+        self.queues = [SPSCQueue(queue_capacity) for _ in range(producers)]
+        # Per producer, (product_id, urgent) -> marks that did not fit in its
+        # queue, written only by that producer; the consumer remembers the
+        # counts it has seen
+        self._overflow = [{} for _ in range(producers)]
+        self._overflow_seen = {}
+        # Consumer-side state
+        self._dirty = set()
+        self._urgent = set()
+        self._last_evaluated = {}
+        # Tickets handed out by wait_settled() and the latest one a settled
+        # round has covered
+        self._settled = threading.Condition()
+        self._tickets = 0
+        self._served = 0
+
+    @property
+    def dropped(self):
+        return sum(queue.dropped for queue in self.queues)
+
+    @property
+    def high_water(self):
+        return max(queue.high_water for queue in self.queues)
+
+    # Fill of the most backed-up queue
+    @property
+    def fill(self):
+        return max(queue.fill for queue in self.queues)
+
+    def _mark(self, product_id, urgent, producer):
+        if not self.queues[producer].push((product_id, urgent)):
+            overflow = self._overflow[producer]
+            key = (product_id, urgent)
+            overflow[key] = overflow.get(key, 0) + 1
+
+    def mark_dirty(self, product_id, producer=0):
+        self._mark(product_id, False, producer)
+
+    def mark_urgent(self, product_id, producer=0):
+        self._mark(product_id, True, producer)
+
+    def _collect(self):
+        for queue, overflow in zip(self.queues, self._overflow):
+            for product_id, urgent in queue.drain():
+                (self._urgent if urgent else self._dirty).add(product_id)
+            if overflow:
+                for key, marks in list(overflow.items()):
+                    if self._overflow_seen.get(key) != marks:
+                        self._overflow_seen[key] = marks
+                        (self._urgent if key[1] else self._dirty).add(key[0])
+
+    def take_due(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._collect()
+        due = set(self._urgent)
+        for product_id in self._dirty:
+            if now - self._last_evaluated.get(product_id, float('-inf')) >= self.cadence:
+                due.add(product_id)
+        self._urgent.clear()
+        self._dirty -= due
+        for product_id in due:
+            self._last_evaluated[product_id] = now
+        return sorted(due)
+
+    # Dispatch until stop_event (a threading.Event) is set. Evaluation runs in
+    # a worker thread so REST calls never stall the event loop.
+    async def run(self, stop_event):
+        while not stop_event.is_set():
+            with self._settled:
+                ticket = self._tickets
+            due = self.take_due()
+            if due:
+                self.evaluations += len(due)
+                try:
+                    await asyncio.to_thread(self.evaluate, due)
+                except Exception as e:
+                    log.error(f"Error evaluating {due}: {e}")
+            elif not self._dirty and not self._urgent:
+                # Every mark made before `ticket` was taken has been evaluated
+                with self._settled:
+                    self._served = ticket
+                    self._settled.notify_all()
+            # Backpressure: drain again straight away while the queue is backed up
+            await asyncio.sleep(0 if self.fill > 0.5 else self.poll_interval)
+
+    # Block until every product marked before the call has been evaluated, or
+    # `timeout` seconds pass; True if it settled
+    def wait_settled(self, timeout=None):
+        with self._settled:
+            self._tickets += 1
+            ticket = self._tickets
+            return self._settled.wait_for(lambda: self._served >= ticket, timeout)
+
+
+# Suppresses repeats of the same decision for a product within `cooldown`
+# seconds and score-driven orders for a product closer than `min_interval`.
+# Protective exits (any reason other than 'score') are only held to their
+# own cooldown so a recent score trade can never block a stop-loss.
+class DecisionDebouncer:
+    def __init__(self, cooldown=60, min_interval=5):
+        self.cooldown = cooldown
+        self.min_interval = min_interval
+        self.suppressed = 0
+        self._last_fired = {}
+        self._last_order = {}
+        self._lock = threading.Lock()
+
+    def allow(self, product_id, decision, reason='score', now=None):
+        now = time.monotonic() if now is None else now
+        key = (product_id, decision, reason)
+        with self._lock:
+            too_soon = reason == 'score' and now - self._last_order.get(product_id, float('-inf')) < self.min_interval
+            if too_soon or now - self._last_fired.get(key, float('-inf')) < self.cooldown:
+                self.suppressed += 1
+                return False
+            self._last_fired[key] = now
+            self._last_order[product_id] = now
+            return True
+
+    # Earliest time at which allow() could pass this decision
+    def release_time(self, product_id, decision, reason='score'):
+        with self._lock:
+            release = self._last_fired.get((product_id, decision, reason), float('-inf')) + self.cooldown
+            if reason == 'score':
+                release = max(release, self._last_order.get(product_id, float('-inf')) + self.min_interval)
+            return release
+
+    def reset(self, product_id):
+        with self._lock:
+            self._last_order.pop(product_id, None)
+            for key in [key for key in self._last_fired if key[0] == product_id]:
+                del self._last_fired[key]
@@ -0,0 +1,39 @@
+import os
+
+
+# An exchange is a REST client plus a factory for WebSocket clients with the
+# coinbase-advanced-py call signatures the bot uses:
+#   rest_client.get_accounts(), market_order_buy(...), market_order_sell(...)
+#   ws_client_factory(api_key, api_secret, on_message=..., on_close=..., retry=...)
+#       -> object with open(), subscribe(product_ids, channels), close()
+class Exchange:
+    def __init__(self, rest_client, ws_client_factory):
+        self.rest_client = rest_client
+        self.ws_client_factory = ws_client_factory
+
+
+def coinbase_exchange(api_key, api_secret):
+    from coinbase.rest import RESTClient
+    from coinbase.websocket import WSClient
+
+    return Exchange(RESTClient(api_key=api_key, api_secret=api_secret), WSClient)
+
+
+# Build the exchange named by `name` ('coinbase' or 'sim'). The simulator is
+# configured from the SIM_* environment variables unless options are given.
+def create_exchange(name, api_key=None, api_secret=None, **options):
+    if name == 'coinbase':
+        return coinbase_exchange(api_key, api_secret)
+    if name == 'sim':
+        from simulator import SimulatedExchange
+
+        if not options:
+            options = {
+                'csv_files': os.getenv('SIM_CSV', 'historical_data_BTC.csv').split(','),
+                'speed': float(os.getenv('SIM_SPEED', '0')),
+                'slippage': float(os.getenv('SIM_SLIPPAGE', '0.001')),
+                'latency': float(os.getenv('SIM_LATENCY', '0.05')),
+                'quote_balance': float(os.getenv('SIM_BALANCE', '1000')),
+            }
+        return SimulatedExchange(**options)
+    raise ValueError(f"Unknown exchange: {name}")
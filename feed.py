@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import random
+import time
+
+# Seconds without any message (ticker or heartbeat) before the connection
+# is considered dead and replaced
+HEARTBEAT_TIMEOUT = 15
+
+# Reconnect backoff bounds in seconds
+INITIAL_BACKOFF = 1
+MAX_BACKOFF = 60
+
+# How often the supervisor checks connection health
+CHECK_INTERVAL = 1
+
+SEQUENCE_FIELD = '"sequence_num":'
+
+# Products subscribed per WebSocket connection; larger universes are split
+# across several connections
+PRODUCTS_PER_CONNECTION = 50
+
+log = logging.getLogger(__name__)
+
+
+# Cheap extraction of the connection sequence number without a full JSON parse
+def sequence_number(msg):
+    index = msg.find(SEQUENCE_FIELD)
+    if index < 0:
+        return None
+    index += len(SEQUENCE_FIELD)
+    end = index
+    while end < len(msg) and msg[end] in ' -0123456789':
+        end += 1
+    try:
+        return int(msg[index:end])
+    except ValueError:
+        return None
+
+
+# One long-lived WebSocket subscription with heartbeat monitoring, automatic
+# reconnect with exponential backoff and sequence-number gap detection.
+# Messages are passed through to `on_message` unchanged.
+class MarketFeed:
+    def __init__(self, api_key, api_secret, product_ids, on_message, channels=('ticker', 'heartbeats'),
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT, initial_backoff=INITIAL_BACKOFF,
+                 max_backoff=MAX_BACKOFF, client_factory=None):
+        if client_factory is None:
+            from coinbase.websocket import WSClient
+            client_factory = WSClient
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.product_ids = list(product_ids)
+        self.on_message = on_message
+        self.channels = list(channels)
+        self.heartbeat_timeout = heartbeat_timeout
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.client_factory = client_factory
+
+        self.connected = False
+        self.last_message_time = None
+        self.last_sequence = None
+        self.messages = 0
+        self.gaps = 0
+        self.missed_messages = 0
+        self.reconnects = 0
+        self._client = None
+        self._connected_at = None
+
+    def _handle_message(self, msg):
+        self.last_message_time = time.monotonic()
+        self.messages += 1
+        sequence = sequence_number(msg)
+        if sequence is not None:
+            if self.last_sequence is not None and sequence > self.last_sequence + 1:
+                missed = sequence - self.last_sequence - 1
+                self.gaps += 1
+                self.missed_messages += missed
+                log.warning(f"Sequence gap detected: missed {missed} messages ({self.last_sequence} -> {sequence})")
+            if self.last_sequence is None or sequence > self.last_sequence:
+                self.last_sequence = sequence
+        self.on_message(msg)
+
+    def _handle_close(self):
+        self.connected = False
+
+    def _connect(self):
+        client = self.client_factory(self.api_key, self.api_secret, on_message=self._handle_message,
+                                     on_close=self._handle_close, retry=False)
+        self._client = client
+        self.last_sequence = None
+        client.open()
+        client.subscribe(product_ids=self.product_ids, channels=self.channels)
+        self.last_message_time = time.monotonic()
+        self._connected_at = self.last_message_time
+        self.connected = True
+
+    def _disconnect(self):
+        client, self._client = self._client, None
+        self.connected = False
+        if client is not None:
+            try:
+                client.close()
+            except Exception as e:
+                log.warning(f"Error closing WebSocket: {e}")
+
+    @property
+    def stale(self):
+        if self.last_message_time is None:
+            return True
+        return time.monotonic() - self.last_message_time > self.heartbeat_timeout
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.initial_backoff * 2 ** attempt)
+        return delay * random.uniform(0.5, 1.0)
+
+    @staticmethod
+    async def _sleep(seconds, stop_event):
+        deadline = time.monotonic() + seconds
+        while not stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(remaining, CHECK_INTERVAL))
+
+    # Supervise the connection until stop_event (a threading.Event) is set
+    async def run(self, stop_event):
+        attempt = 0
+        while not stop_event.is_set():
+            if self.connected and not self.stale:
+                await self._sleep(CHECK_INTERVAL, stop_event)
+                continue
+
+            if self._client is not None:
+                if self.connected:
+                    log.warning(f"No WebSocket messages for {self.heartbeat_timeout}s, reconnecting")
+                else:
+                    log.warning("WebSocket closed, reconnecting")
+                # A connection that stayed healthy for a while resets the backoff
+                if self._connected_at is not None and time.monotonic() - self._connected_at > self.heartbeat_timeout:
+                    attempt = 0
+                await asyncio.to_thread(self._disconnect)
+                self.reconnects += 1
+                if attempt:
+                    await self._sleep(self._backoff(attempt), stop_event)
+
+            try:
+                await asyncio.to_thread(self._connect)
+                log.info(f"WebSocket connected, subscribed to {len(self.product_ids)} products")
+            except Exception as e:
+                delay = self._backoff(attempt)
+                attempt += 1
+                log.warning(f"WebSocket connection failed: {e}. Attempt {attempt}, retrying in {delay:.1f}s")
+                await asyncio.to_thread(self._disconnect)
+                await self._sleep(delay, stop_event)
+                continue
+            attempt += 1
+
+        await asyncio.to_thread(self._disconnect)
+
+
+# Several MarketFeed connections supervised together, e.g. one per shard of
+# a large product universe, exposing the same counters as a single feed.
+# Each connection delivers its messages from its own thread.
+class FeedGroup:
+    def __init__(self, feeds):
+        self.feeds = list(feeds)
+
+    @property
+    def product_ids(self):
+        return [product_id for feed in self.feeds for product_id in feed.product_ids]
+
+    @property
+    def messages(self):
+        return sum(feed.messages for feed in self.feeds)
+
+    @property
+    def gaps(self):
+        return sum(feed.gaps for feed in self.feeds)
+
+    @property
+    def missed_messages(self):
+        return sum(feed.missed_messages for feed in self.feeds)
+
+    @property
+    def reconnects(self):
+        return sum(feed.reconnects for feed in self.feeds)
+
+    @property
+    def stale(self):
+        return any(feed.stale for feed in self.feeds)
+
+    async def run(self, stop_event):
+        await asyncio.gather(*(feed.run(stop_event) for feed in self.feeds))
@@ -0,0 +1,95 @@
+import numpy as np
+
+DEFAULT_QUEUE_CAPACITY = 4096
+
+
+# Per-slot seqlock over a (slots x fields) float64 table. One writer thread
+# bumps the slot's sequence to odd, writes the row and bumps it back to even;
+# readers copy the row and retry if the sequence was odd or moved meanwhile.
+# Readers never block the writer and always get a row from a single write,
+# at the cost of copying just that row rather than any history.
+class SnapshotBoard:
+    def __init__(self, slots, fields):
+        self.fields = tuple(fields)
+        self._values = np.full((slots, len(self.fields)), np.nan)
+        self._sequence = [0] * slots
+        self.retries = 0
+
+    def write(self, slot, values):
+        self._sequence[slot] += 1
+        self._values[slot] = values
+        self._sequence[slot] += 1
+
+    # Consistent copy of one slot's row
+    def read(self, slot):
+        sequence = self._sequence
+        row = self._values[slot]
+        while True:
+            before = sequence[slot]
+            if not before & 1:
+                values = row.copy()
+                if sequence[slot] == before:
+                    return values
+            self.retries += 1
+
+    # Rows of several slots as a (len(slots) x fields) matrix, each row
+    # consistent on its own
+    def read_many(self, slots):
+        values = np.empty((len(slots), len(self.fields)))
+        for i, slot in enumerate(slots):
+            values[i] = self.read(slot)
+        return values
+
+    def read_dict(self, slot):
+        return dict(zip(self.fields, self.read(slot).tolist()))
+
+    # Number of completed writes to a slot
+    def version(self, slot):
+        return self._sequence[slot] // 2
+
+
+# Bounded single-producer/single-consumer ring. The producer only advances
+# the tail and the consumer only advances the head, so neither side takes a
+# lock. push() never blocks: when the consumer has fallen `capacity` items
+# behind it refuses the item and counts the drop, and the producer decides
+# how to degrade (see TradeDispatcher). `fill` exposes the backlog.
+class SPSCQueue:
+    def __init__(self, capacity=DEFAULT_QUEUE_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+        self.high_water = 0
+
+    def __len__(self):
+        return self._tail - self._head
+
+    @property
+    def fill(self):
+        return len(self) / self.capacity
+
+    # Producer side
+    def push(self, item):
+        tail = self._tail
+        backlog = tail - self._head
+        if backlog >= self.capacity:
+            self.dropped += 1
+            return False
+        self._items[tail % self.capacity] = item
+        self._tail = tail + 1
+        if backlog + 1 > self.high_water:
+            self.high_water = backlog + 1
+        return True
+
+    # Consumer side: remove and return everything queued so far
+    def drain(self):
+        head = self._head
+        tail = self._tail
+        items = [self._items[i % self.capacity] for i in range(head, tail)]
+        for i in range(head, tail):
+            self._items[i % self.capacity] = None
+        self._head = tail
+        return items
@@ -0,0 +1,153 @@
+import math
+from collections import deque
+
+# Maximum difference allowed between the streaming indicators and the `ta`
+# library when both are fed the same price series, relative to the price
+# level (RSI is relative to its 0-100 range)
+TA_TOLERANCE = 1e-9
+
+# Recompute the rolling mean and variance from scratch every this many
+# updates to stop floating point drift from accumulating on long-running feeds
+RESYNC_INTERVAL = 10000
+
+
+# Rolling mean and population standard deviation over a fixed window, updated
+# with Welford's add/remove recurrences so the variance stays accurate
+class RollingStats:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.average = 0.0
+        self.m2 = 0.0
+        self._updates = 0
+
+    def update(self, value):
+        if len(self.values) == self.window:
+            old = self.values[0]
+            previous = self.average
+            self.average += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.average + old - previous)
+        else:
+            delta = value - self.average
+            self.average += delta / (len(self.values) + 1)
+            self.m2 += delta * (value - self.average)
+        self.values.append(value)
+        self._updates += 1
+        if self._updates % RESYNC_INTERVAL == 0:
+            self.average = math.fsum(self.values) / len(self.values)
+            self.m2 = math.fsum((v - self.average) ** 2 for v in self.values)
+
+    def state(self):
+        return {'values': list(self.values), 'average': self.average, 'm2': self.m2, 'updates': self._updates}
+
+    def restore(self, state):
+        self.values = deque(state['values'], maxlen=self.window)
+        self.average = state['average']
+        self.m2 = state['m2']
+        self._updates = state['updates']
+
+    @property
+    def ready(self):
+        return len(self.values) == self.window
+
+    @property
+    def mean(self):
+        if not self.ready:
+            return float('nan')
+        return self.average
+
+    @property
+    def std(self):
+        if not self.ready:
+            return float('nan')
+        return math.sqrt(max(self.m2 / self.window, 0.0))
+
+
+# Exponential moving average matching pandas ewm(adjust=False)
+class StreamingEMA:
+    def __init__(self, span=None, alpha=None, min_periods=None):
+        if alpha is None:
+            alpha = 2.0 / (span + 1)
+        self.alpha = alpha
+        self.min_periods = min_periods if min_periods is not None else (span or 0)
+        self.count = 0
+        self.average = float('nan')
+
+    def update(self, value):
+        if self.count == 0:
+            self.average = value
+        else:
+            self.average = (1 - self.alpha) * self.average + self.alpha * value
+        self.count += 1
+        return self.value
+
+    def state(self):
+        return {'count': self.count, 'average': self.average}
+
+    def restore(self, state):
+        self.count = state['count']
+        self.average = state['average']
+
+    @property
+    def value(self):
+        if self.count < self.min_periods:
+            return float('nan')
+        return self.average
+
+
+# Relative Strength Index with Wilder smoothing of gains and losses
+class StreamingRSI:
+    def __init__(self, window=14):
+        self.window = window
+        self.gains = StreamingEMA(alpha=1 / window, min_periods=window)
+        self.losses = StreamingEMA(alpha=1 / window, min_periods=window)
+        self.previous = None
+
+    def update(self, price):
+        change = 0.0 if self.previous is None else price - self.previous
+        self.previous = price
+        self.gains.update(change if change > 0 else 0.0)
+        self.losses.update(-change if change < 0 else 0.0)
+        return self.value
+
+    def state(self):
+        return {'gains': self.gains.state(), 'losses': self.losses.state(), 'previous': self.previous}
+
+    def restore(self, state):
+        self.gains.restore(state['gains'])
+        self.losses.restore(state['losses'])
+        self.previous = state['previous']
+
+    @property
+    def value(self):
+        gain = self.gains.value
+        loss = self.losses.value
+        if math.isnan(loss):
+            return float('nan')
+        if loss == 0:
+            return 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+
+# Full-series indicator columns for a price array, computed with the same
+# `ta` calls as apply_technical_indicators but with configurable windows
+def indicator_arrays(prices, sma_window=20, rsi_window=14, macd_fast=12, macd_slow=26,
+                     macd_sign=9, bollinger_window=20, bollinger_dev=2):
+    import pandas as pd
+    import ta.momentum
+    import ta.trend
+    import ta.volatility
+
+    close = pd.Series(prices, dtype='float64')
+    macd = ta.trend.MACD(close, window_slow=macd_slow, window_fast=macd_fast, window_sign=macd_sign)
+    bollinger = ta.volatility.BollingerBands(close, window=bollinger_window, window_dev=bollinger_dev)
+    return {
+        'price': close.to_numpy(),
+        'SMA': ta.trend.SMAIndicator(close, window=sma_window).sma_indicator().to_numpy(),
+        'RSI': ta.momentum.RSIIndicator(close, window=rsi_window).rsi().to_numpy(),
+        'MACD': macd.macd().to_numpy(),
+        'MACD_Signal': macd.macd_signal().to_numpy(),
+        'MACD_Diff': macd.macd_diff().to_numpy(),
+        'Bollinger_High': bollinger.bollinger_hband().to_numpy(),
+        'Bollinger_Low': bollinger.bollinger_lband().to_numpy(),
+    }
@@ -0,0 +1,262 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Histogram resolution: 2**SUB_BUCKET_BITS linear sub-buckets per power of
+# two, i.e. values are kept to within 1/64 (~1.6%) of their true size
+SUB_BUCKET_BITS = 7
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+# Enough buckets for values up to 2**40 ns (~18 minutes); larger ones clamp
+MAX_BUCKETS = (40 - SUB_BUCKET_BITS + 2) * _HALF
+
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def _bucket_floor(index):
+    if index < 2 * _HALF:
+        return index
+    shift = index // _HALF - 1
+    return (index - shift * _HALF) << shift
+
+
+# HDR-style latency histogram of integer nanoseconds: log-linear buckets of
+# fixed relative precision, so recording is O(1) with no allocation and the
+# percentiles cover nanoseconds to minutes in a few thousand counters.
+# record() takes no lock; each hot path records from its own thread, and a
+# rare lost increment between racing threads is acceptable for monitoring.
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * MAX_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value_ns):
+        if value_ns < 2 * _HALF:
+            index = value_ns if value_ns > 0 else 0
+        else:
+            shift = value_ns.bit_length() - SUB_BUCKET_BITS
+            index = min(shift * _HALF + (value_ns >> shift), MAX_BUCKETS - 1)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+        if self.min is None or value_ns < self.min:
+            self.min = value_ns
+
+    # Values at the given quantiles, each reported as its bucket's lower bound
+    def quantiles(self, quantiles=QUANTILES):
+        counts = np.array(self.counts, dtype=np.int64)
+        count = int(counts.sum())
+        if count == 0:
+            return {q: 0 for q in quantiles}
+        cumulative = np.cumsum(counts)
+        indexes = np.searchsorted(cumulative, [max(1, int(np.ceil(q * count))) for q in quantiles])
+        return {q: _bucket_floor(int(index)) for q, index in zip(quantiles, indexes)}
+
+    def summary(self):
+        quantiles = self.quantiles()
+        return {
+            'count': self.count,
+            'mean_us': self.total / self.count / 1000 if self.count else 0.0,
+            'min_us': (self.min or 0) / 1000,
+            'max_us': self.max / 1000,
+            **{f'p{q * 100:g}_us': value / 1000 for q, value in quantiles.items()},
+        }
+
+
+# Monotonic counter; like LatencyHistogram.record, inc() takes no lock
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+
+# Counters, latency histograms and pulled gauges for the live bot, exported
+# as a JSON snapshot or Prometheus text. Hot paths hold on to the Counter and
+# LatencyHistogram objects and record perf_counter_ns() deltas into them;
+# gauges are callables read at export time.
+class Instrumentation:
+    def __init__(self):
+        self.started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, **labels):
+        key = (name, _labels(labels))
+        counter = self._counters.get(key)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.setdefault(key, Counter())
+        return counter
+
+    def count(self, name, n=1, **labels):
+        self.counter(name, **labels).inc(n)
+
+    def histogram(self, name, **labels):
+        key = (name, _labels(labels))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def observe(self, name, value_ns, **labels):
+        self.histogram(name, **labels).record(value_ns)
+
+    def gauge(self, name, read, **labels):
+        self._gauges[(name, _labels(labels))] = read
+
+    # Proxy for a REST client that times every method call into the
+    # 'rest_call' histogram, labelled by method
+    def wrap_client(self, client):
+        return _TimedClient(client, self)
+
+    def snapshot(self):
+        uptime = time.time() - self.started
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        gauges = {}
+        for key, read in list(self._gauges.items()):
+            try:
+                gauges[key] = read()
+            except Exception as e:
+                gauges[key] = None
+                logging.getLogger(__name__).warning("Gauge %s failed: %s", key[0], e)
+
+        def name(key):
+            return key[0] + _format_labels(key[1])
+
+        return {
+            'timestamp': time.time(),
+            'uptime_seconds': uptime,
+            'counters': {name(key): counter.value for key, counter in counters.items()},
+            'rates_per_second': {name(key): counter.value / uptime for key, counter in counters.items()
+                                 if uptime > 0},
+            'gauges': {name(key): value for key, value in gauges.items()},
+            'latency': {name(key): histogram.summary() for key, histogram in histograms.items()},
+        }
+
+    def write_snapshot(self, path):
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        os.replace(temporary, path)
+
+    def prometheus_text(self, prefix='tradingbot_'):
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items(), key=lambda item: item[0])
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        for (name, labels), counter in counters:
+            lines.append(f"{prefix}{name}_total{_format_labels(labels)} {counter.value}")
+        for (name, labels), read in sorted(self._gauges.items(), key=lambda item: item[0]):
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+        for (name, labels), histogram in histograms:
+            metric = f"{prefix}{name}_seconds"
+            for q, value in histogram.quantiles().items():
+                lines.append(f"{metric}{_format_labels(labels, [('quantile', f'{q:g}')])} {value / 1e9:.9f}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.total / 1e9:.9f}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        lines.append(f"{prefix}uptime_seconds {time.time() - self.started:.3f}")
+        return '\n'.join(lines) + '\n'
+
+    # Serve /metrics (Prometheus text) and /metrics.json on localhost from a
+    # daemon thread; returns the server so the caller can shut it down
+    def serve(self, port, host='127.0.0.1'):
+        instrumentation = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = instrumentation.prometheus_text().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(instrumentation.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+class _TimedClient:
+    def __init__(self, client, instrumentation):
+        self._client = client
+        self._instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+        histogram = self._instrumentation.histogram('rest_call', method=name)
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter_ns()
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                self._instrumentation.count('rest_errors', method=name)
+                raise
+            finally:
+                histogram.record(time.perf_counter_ns() - started)
+        return timed
+
+
+# Route logging through a queue drained by a background listener so callers
+# (the WebSocket callback in particular) never block on console or file I/O.
+# Returns the listener; call .stop() on shutdown to flush it.
+def setup_queue_logging(level=logging.INFO, handlers=None, fmt='%(asctime)s %(levelname)s %(name)s: %(message)s'):
+    if handlers is None:
+        handlers = [logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(fmt))
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    return listener
@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join('data', 'state.db')
+
+# Seconds a writer waits for another process (e.g. a sibling worker) to
+# release the database before giving up
+BUSY_TIMEOUT = 5
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    time REAL NOT NULL,
+    kind TEXT NOT NULL,
+    product_id TEXT,
+    key TEXT,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS journal_kind ON journal (kind, product_id);
+CREATE INDEX IF NOT EXISTS journal_key ON journal (key);
+CREATE TABLE IF NOT EXISTS indicator_snapshots (
+    product_id TEXT PRIMARY KEY,
+    interval TEXT NOT NULL,
+    bar_time INTEGER NOT NULL,
+    state TEXT NOT NULL
+);
+"""
+
+# Latest journal row of a kind per product
+_LATEST = """
+SELECT product_id, payload FROM journal
+WHERE seq IN (SELECT MAX(seq) FROM journal WHERE kind = ? GROUP BY product_id)
+"""
+
+
+# Append-only SQLite journal (WAL mode) of the state the live bot cannot
+# rebuild from the exchange: order submissions and results, fills, entry
+# prices and trade counters, plus the latest indicator snapshot per product.
+# Each record is its own small transaction, so a crash loses at most the
+# record being written; replay() reads back the latest value of everything
+# with a handful of indexed queries. Records from the WebSocket callback
+# (fills) go through a queue drained by a writer thread, as logging does, so
+# the feed never waits on SQLite; flush() and close() wait for them.
+class StateJournal:
+    def __init__(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                           check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        # With WAL, NORMAL only risks the last transactions on power loss,
+        # never corruption, and avoids an fsync per record
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self.records = 0
+        self._pending = queue.Queue()
+        self._writer = threading.Thread(target=self._write_pending, name='journal-writer', daemon=True)
+        self._writer.start()
+
+    def _write(self, recorded, kind, product_id, payload, key):
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO journal (time, kind, product_id, key, payload) VALUES (?, ?, ?, ?, ?)',
+                (recorded, kind, product_id, key, json.dumps(payload, default=str)))
+            self.records += 1
+
+    def _write_pending(self):
+        while True:
+            item = self._pending.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except sqlite3.Error as e:
+                log.error(f"Failed to journal {item[1]} record: {e}")
+            finally:
+                self._pending.task_done()
+
+    def record(self, kind, product_id=None, payload=None, key=None):
+        self._write(time.time(), kind, product_id, payload, key)
+
+    # Queue a record for the writer thread instead of writing it here
+    def record_later(self, kind, product_id=None, payload=None, key=None):
+        self._pending.put((time.time(), kind, product_id, payload, key))
+
+    # Wait until every queued record is written
+    def flush(self):
+        self._pending.join()
+
+    # Written before the order is sent, so a crash mid-request is visible
+    def order_submitted(self, client_order_id, product_id, side, size):
+        self.record('order', product_id, {'side': side, 'size': size}, key=client_order_id)
+
+    def order_result(self, client_order_id, product_id, order):
+        self.record('order_result', product_id, order, key=client_order_id)
+
+    # Called on the WebSocket thread, so written in the background
+    def fill(self, update):
+        self.record_later('fill', update.get('product_id'), update, key=update.get('order_id'))
+
+    def entry_price(self, product_id, price):
+        self.record('entry_price', product_id, price)
+
+    def trade_count(self, product_id, count):
+        self.record('trade_count', product_id, count)
+
+    # Replace the indicator snapshots of several products in one transaction;
+    # snapshots are (product_id, interval, bar_time_ns, state)
+    def save_snapshots(self, snapshots):
+        if not snapshots:
+            return
+        with self._lock:
+            with self._connection:
+                self._connection.execute('BEGIN')
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO indicator_snapshots (product_id, interval, bar_time, state) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(product_id, interval, int(bar_time), json.dumps(state))
+                     for product_id, interval, bar_time, state in snapshots])
+
+    # Everything needed to resume: latest entry price and trade counter per
+    # product, orders sent without a recorded result, and indicator snapshots
+    # as product_id -> (interval, bar_time_ns, state)
+    def replay(self):
+        with self._lock:
+            execute = self._connection.execute
+            entry_prices = {product_id: json.loads(payload)
+                            for product_id, payload in execute(_LATEST, ('entry_price',))}
+            trade_counters = {product_id: json.loads(payload)
+                              for product_id, payload in execute(_LATEST, ('trade_count',))}
+            unresolved = {key: (product_id, json.loads(payload)) for key, product_id, payload in execute(
+                "SELECT key, product_id, payload FROM journal WHERE kind = 'order' AND key NOT IN "
+                "(SELECT key FROM journal WHERE kind = 'order_result')")}
+            snapshots = {product_id: (interval, bar_time, json.loads(state)) for product_id, interval, bar_time, state
+                         in execute('SELECT product_id, interval, bar_time, state FROM indicator_snapshots')}
+        return {'entry_prices': entry_prices, 'trade_counters': trade_counters,
+                'unresolved_orders': unresolved, 'snapshots': snapshots}
+
+    # Drop entry price and trade counter records superseded by later ones
+    def compact(self):
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM journal WHERE kind IN ('entry_price', 'trade_count') AND seq NOT IN "
+                "(SELECT MAX(seq) FROM journal WHERE kind IN ('entry_price', 'trade_count') "
+                "GROUP BY kind, product_id)")
+            return cursor.rowcount
+
+    def close(self):
+        self._pending.put(None)
+        self._writer.join()
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,393 @@
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from bars import COLUMNS, DEFAULT_CAPACITY, DEFAULT_INTERVALS, BarAggregator
+from feed import HEARTBEAT_TIMEOUT, PRODUCTS_PER_CONNECTION, FeedGroup, MarketFeed
+
+# Shared-memory name of the bus when none is given
+DEFAULT_NAME = 'tradingbot'
+
+# Ticks kept per product; a reader more than this far behind loses the oldest
+DEFAULT_TICK_CAPACITY = 8192
+
+# Bytes reserved per product id
+PRODUCT_ID_BYTES = 32
+
+# Seconds between polls of a reader with nothing new
+POLL_INTERVAL = 0.001
+
+MAGIC = int.from_bytes(b'TRADEBUS', 'little')
+HEADER_FIELDS = ('magic', 'products', 'tick_capacity', 'bar_capacity', 'intervals', 'ticks', 'heartbeat')
+_TICKS = HEADER_FIELDS.index('ticks')
+_HEARTBEAT = HEADER_FIELDS.index('heartbeat')
+
+log = logging.getLogger(__name__)
+
+
+# Offsets of every array in the segment, each cache-line aligned, and the
+# segment size. The header is always first so readers can size the rest.
+def _layout(products, tick_capacity, bar_capacity, intervals):
+    arrays = [
+        ('header', np.int64, (len(HEADER_FIELDS),)),
+        ('product_ids', f'S{PRODUCT_ID_BYTES}', (products,)),
+        ('interval_names', 'S8', (intervals,)),
+        ('tick_counts', np.int64, (products,)),
+        ('tick_sequences', np.int64, (products, tick_capacity)),
+        ('tick_times', np.int64, (products, tick_capacity)),
+        ('tick_prices', np.float64, (products, tick_capacity)),
+        ('bar_counts', np.int64, (products, intervals)),
+        ('bar_times', np.int64, (products, intervals, bar_capacity)),
+        ('bar_values', np.float64, (products, intervals, len(COLUMNS), bar_capacity)),
+    ]
+    layout = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        dtype = np.dtype(dtype)
+        layout[name] = (offset, dtype, shape)
+        offset += -(-int(np.prod(shape)) * dtype.itemsize // 64) * 64
+    return layout, max(offset, 1)
+
+
+# Attach to an existing segment without registering it with this process's
+# resource tracker, which would otherwise unlink it when a reader exits
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        memory = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(memory._name, 'shared_memory')
+        return memory
+
+
+# Copy ring entries [start, end) of `columns` (ring position on the last
+# axis) and drop those the writer may have overwritten meanwhile, judged by
+# re-reading its counter. Wait-free: a reader never retries or blocks, it
+# just returns fewer entries. Returns (first entry kept, copies).
+def _read_ring(columns, start, end, capacity, counter):
+    start = max(start, end - capacity)
+    positions = np.arange(start, end) % capacity
+    copies = [column[..., positions] for column in columns]
+    # The writer may be rewriting the position of entry `written - capacity`
+    oldest = int(counter()) - capacity + 1
+    if oldest > start:
+        copies = [copy[..., oldest - start:] for copy in copies]
+        start = oldest
+    return start, copies
+
+
+# Ticks and closed bars of many products in one shared-memory segment,
+# written by a single feed-handler process and read by any number of local
+# bot and strategy processes, which map the same pages instead of opening
+# their own WebSocket and keeping their own copies.
+#
+# Each product has a tick ring and one bar ring per interval, each with a
+# count of entries ever written. The writer fills the next position and only
+# then publishes the new count, and bumps a global tick counter after that;
+# every tick also records its global sequence number, so readers can merge
+# products back into feed order. Readers never write to the segment. This
+# relies on stores becoming visible in program order, as on x86-64.
+class MarketBus:
+    def __init__(self, memory, owner=False):
+        self._memory = memory
+        self.owner = owner
+        self.name = memory.name
+        header = np.ndarray((len(HEADER_FIELDS),), np.int64, buffer=memory.buf)
+        if header[0] != MAGIC:
+            raise ValueError(f"Shared memory {memory.name} is not a market bus")
+        products, self.tick_capacity, self.bar_capacity, intervals = (int(value) for value in header[1:5])
+        layout, _ = _layout(products, self.tick_capacity, self.bar_capacity, intervals)
+        for name, (offset, dtype, shape) in layout.items():
+            setattr(self, f'_{name}', np.ndarray(shape, dtype, buffer=memory.buf, offset=offset))
+        self.product_ids = [product_id.decode() for product_id in self._product_ids]
+        self.slots = {product_id: slot for slot, product_id in enumerate(self.product_ids)}
+        self.intervals = [interval.decode() for interval in self._interval_names]
+        self._interval_slots = {interval: i for i, interval in enumerate(self.intervals)}
+
+    # Create the bus of a feed handler, replacing any segment of the same
+    # name left behind by a previous one
+    @classmethod
+    def create(cls, product_ids, name=DEFAULT_NAME, tick_capacity=DEFAULT_TICK_CAPACITY,
+               bar_capacity=DEFAULT_CAPACITY, intervals=DEFAULT_INTERVALS):
+        product_ids = list(product_ids)
+        layout, size = _layout(len(product_ids), tick_capacity, bar_capacity, len(intervals))
+        try:
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            log.info(f"Replaced stale market bus {name}")
+        except FileNotFoundError:
+            pass
+        memory = shared_memory.SharedMemory(name=name, create=True, size=size)
+        arrays = {array: np.ndarray(shape, dtype, buffer=memory.buf, offset=offset)
+                  for array, (offset, dtype, shape) in layout.items()}
+        arrays['product_ids'][:] = [product_id.encode() for product_id in product_ids]
+        arrays['interval_names'][:] = [interval.encode() for interval in intervals]
+        header = arrays['header']
+        header[1:] = [len(product_ids), tick_capacity, bar_capacity, len(intervals), 0, time.time_ns()]
+        # Written last: readers refuse the segment until it is initialized
+        header[0] = MAGIC
+        return cls(memory, owner=True)
+
+    @classmethod
+    def attach(cls, name=DEFAULT_NAME):
+        return cls(_attach(name))
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        for name in list(vars(self)):
+            if isinstance(getattr(self, name), np.ndarray):
+                delattr(self, name)
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+
+    # Writer side. Only one thread of one process may write.
+
+    def write_tick(self, slot, time_ns, price):
+        count = int(self._tick_counts[slot])
+        position = count % self.tick_capacity
+        self._tick_sequences[slot, position] = self._header[_TICKS]
+        self._tick_times[slot, position] = time_ns
+        self._tick_prices[slot, position] = price
+        self._tick_counts[slot] = count + 1
+        self._header[_TICKS] += 1
+
+    def write_bar(self, slot, interval, start, open_, high, low, close, volume):
+        series = self._interval_slots[interval]
+        count = int(self._bar_counts[slot, series])
+        position = count % self.bar_capacity
+        self._bar_times[slot, series, position] = start
+        self._bar_values[slot, series, :, position] = (open_, high, low, close, volume)
+        self._bar_counts[slot, series] = count + 1
+
+    # Mark the feed alive, also when only heartbeats arrive
+    def touch(self):
+        self._header[_HEARTBEAT] = time.time_ns()
+
+    # Reader side
+
+    # Seconds since the writer last touched the bus
+    @property
+    def age(self):
+        return (time.time_ns() - int(self._header[_HEARTBEAT])) / 1e9
+
+    @property
+    def tick_count(self):
+        return int(self._header[_TICKS])
+
+    def latest_price(self, slot):
+        count = int(self._tick_counts[slot])
+        if not count:
+            return None
+        start, (prices,) = _read_ring([self._tick_prices[slot]], count - 1, count, self.tick_capacity,
+                                      lambda: self._tick_counts[slot])
+        return float(prices[0]) if len(prices) else None
+
+    # Ticks of one product from entry `since` on, as (times, prices, first
+    # entry returned, next entry); the first entry is past `since` when the
+    # reader fell more than tick_capacity behind
+    def ticks(self, slot, since=0):
+        end = int(self._tick_counts[slot])
+        start, (times, prices) = _read_ring([self._tick_times[slot], self._tick_prices[slot]], since, end,
+                                            self.tick_capacity, lambda: self._tick_counts[slot])
+        return times, prices, start, end
+
+    # The latest `count` closed bars of one product as columns time, open,
+    # high, low, close and volume (all that are left if fewer)
+    def bars(self, slot, interval, count=None):
+        series = self._interval_slots[interval]
+        end = int(self._bar_counts[slot, series])
+        start = 0 if count is None else max(0, end - count)
+        _, (times, values) = _read_ring([self._bar_times[slot, series], self._bar_values[slot, series]], start,
+                                        end, self.bar_capacity, lambda: self._bar_counts[slot, series])
+        bars = {'time': times}
+        bars.update(zip(COLUMNS, values))
+        return bars
+
+    # New ticks of several products in the order the writer wrote them, as
+    # (indices into `slots`, times, prices, ticks lost). `cursors` holds the
+    # next entry to read per slot and is advanced in place. Only ticks below
+    # the global counter read up front are returned, so every product's
+    # ticks up to that point are complete and the merge order is exact.
+    def poll(self, slots, cursors):
+        limit = self.tick_count
+        counts = self._tick_counts[slots]
+        lost = 0
+        pending = []
+        for i in np.flatnonzero(counts != cursors).tolist():
+            slot = slots[i]
+            start, (sequences, times, prices) = _read_ring(
+                [self._tick_sequences[slot], self._tick_times[slot], self._tick_prices[slot]], int(cursors[i]),
+                int(counts[i]), self.tick_capacity, lambda: self._tick_counts[slot])
+            lost += start - int(cursors[i])
+            published = int(np.searchsorted(sequences, limit))
+            cursors[i] = start + published
+            if published:
+                pending.append((np.full(published, i), sequences[:published], times[:published],
+                                prices[:published]))
+        if not pending:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0), lost
+        indices, sequences, times, prices = (np.concatenate(column) for column in zip(*pending))
+        order = np.argsort(sequences, kind='stable')
+        return indices[order], times[order], prices[order], lost
+
+
+# Reads ticks of some products from a MarketBus in place of a ticker
+# MarketFeed, with the same counters and supervision: a bus whose writer has
+# gone quiet for heartbeat_timeout is re-attached, so a restarted feed
+# handler is picked up. on_ticks receives lists of (index into product_ids,
+# product_id, time_ns, price) in feed order, from the polling thread.
+class BusFeed:
+    def __init__(self, product_ids, on_ticks, name=DEFAULT_NAME, poll_interval=POLL_INTERVAL,
+                 heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        self.product_ids = list(product_ids)
+        self.on_ticks = on_ticks
+        self.name = name
+        self.poll_interval = poll_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.bus = None
+        self.messages = 0
+        self.gaps = 0
+        self.missed_messages = 0
+        self.reconnects = 0
+        self._slots = None
+        self._present = None
+        self._cursors = None
+
+    def _use(self, bus):
+        if self.bus is not None:
+            self.bus.close()
+            self.reconnects += 1
+        missing = [product_id for product_id in self.product_ids if product_id not in bus.slots]
+        if missing:
+            log.warning(f"Market bus {self.name} does not carry {len(missing)} products: {missing[:10]}")
+        self._slots = np.array([bus.slots.get(product_id, -1) for product_id in self.product_ids], dtype=np.int64)
+        self._present = np.flatnonzero(self._slots >= 0)
+        # Start from the ticks still in the rings
+        self._cursors = np.zeros(len(self._present), dtype=np.int64)
+        self.bus = bus
+        log.info(f"Attached to market bus {self.name} for {len(self._present)} products")
+
+    @property
+    def stale(self):
+        return self.bus is None or self.bus.age > self.heartbeat_timeout
+
+    def _poll(self):
+        indices, times, prices, lost = self.bus.poll(self._slots[self._present], self._cursors)
+        if lost:
+            self.gaps += 1
+            self.missed_messages += lost
+            log.warning(f"Fell behind the market bus: lost {lost} ticks")
+        if not len(times):
+            return 0
+        positions = self._present[indices].tolist()
+        product_ids = self.product_ids
+        self.on_ticks([(position, product_ids[position], time_ns, price)
+                       for position, time_ns, price in zip(positions, times.tolist(), prices.tolist())])
+        self.messages += len(times)
+        return len(times)
+
+    def _run(self, stop_event):
+        while not stop_event.is_set():
+            if self.stale:
+                try:
+                    bus = MarketBus.attach(self.name)
+                except (FileNotFoundError, ValueError) as e:
+                    log.warning(f"Market bus {self.name} unavailable: {e}")
+                    stop_event.wait(1)
+                    continue
+                # Switch only to a live writer, e.g. a restarted feed handler
+                if self.bus is not None and bus.age > self.heartbeat_timeout:
+                    bus.close()
+                    stop_event.wait(1)
+                    continue
+                self._use(bus)
+            if not self._poll():
+                time.sleep(self.poll_interval)
+        if self.bus is not None:
+            self.bus.close()
+            self.bus = None
+
+    # Poll until stop_event (a threading.Event) is set
+    async def run(self, stop_event):
+        await asyncio.to_thread(self._run, stop_event)
+
+
+# Feed handler: one set of ticker connections for all products, writing
+# every tick and every closed bar of the bus intervals to a new MarketBus
+# until stop_event is set. Ticks are also recorded to `recorder` if given.
+async def run_feed_handler(product_ids, api_key, api_secret, client_factory, stop_event, name=DEFAULT_NAME,
+                           products_per_connection=PRODUCTS_PER_CONNECTION, recorder=None, **options):
+    from decoder import MessageDecoder
+    from products import shard
+
+    bus = MarketBus.create(product_ids, name, **options)
+    decoder = MessageDecoder(product_ids)
+    aggregator = BarAggregator(product_ids, intervals=bus.intervals,
+                               on_bar=lambda product_id, interval, series, *bar:
+                               bus.write_bar(bus.slots[product_id], interval, *bar))
+    # Connections deliver from their own threads; the bus has one writer
+    lock = threading.Lock()
+
+    def on_message(msg):
+        decoded = decoder.decode(msg)
+        with lock:
+            bus.touch()
+            if decoded is None or decoded[0] != 'ticker':
+                return
+            for slot, product_id, time_ns, price in decoder.tickers(decoded[1]):
+                bus.write_tick(slot, time_ns, price)
+                aggregator.update(slot, time_ns, price)
+                if recorder is not None:
+                    recorder.record(product_id, time_ns, price)
+
+    feed = FeedGroup(MarketFeed(api_key, api_secret, products, on_message, client_factory=client_factory)
+                     for products in shard(product_ids, products_per_connection))
+    log.info(f"Market bus {name}: {len(product_ids)} products over {len(feed.feeds)} connections, "
+             f"{bus._memory.size / 2 ** 20:.1f} MiB")
+    try:
+        await feed.run(stop_event)
+    finally:
+        if recorder is not None:
+            recorder.flush()
+        bus.close()
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+
+    from columnar_store import ColumnarStore, TickRecorder
+    from exchange import create_exchange
+    from products import ProductCatalog
+
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("log_level", "INFO").upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    api_key = os.getenv("api_key")
+    api_secret = os.getenv("api_secret")
+    exchange_name = os.getenv("exchange", "coinbase")
+    exchange = create_exchange(exchange_name, api_key, api_secret)
+    catalog = ProductCatalog.load(exchange.rest_client, path=os.path.join('data', f'products-{exchange_name}.json'))
+    product_ids = catalog.product_ids(os.getenv("quote_currencies", "GBP").split(','))
+    if os.getenv("products"):
+        selected = set(os.getenv("products").split(','))
+        product_ids = [product_id for product_id in product_ids if product_id in selected]
+
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda signum, frame: stop_event.set())
+    asyncio.run(run_feed_handler(
+        product_ids, api_key, api_secret, exchange.ws_client_factory, stop_event,
+        name=os.getenv("market_bus", DEFAULT_NAME),
+        products_per_connection=int(os.getenv("products_per_connection", PRODUCTS_PER_CONNECTION)),
+        # Every empty interval is written as a flat bar, so replaying daily
+        # data calls for bus_intervals=1d
+        intervals=os.getenv("bus_intervals", ','.join(DEFAULT_INTERVALS)).split(','),
+        recorder=TickRecorder(ColumnarStore()) if exchange_name == 'coinbase' else None))
@@ -0,0 +1,91 @@
+import numpy as np
+
+NS_PER_DAY = 86_400_000_000_000
+NS_PER_YEAR = int(365.25 * NS_PER_DAY)
+
+# Crypto trades every day; used for per-bar returns when no times are given
+DEFAULT_PERIODS_PER_YEAR = 365
+
+DEFAULT_FREQ = '1D'
+
+_freq_ns = {}
+
+
+def freq_to_ns(freq):
+    ns = _freq_ns.get(freq)
+    if ns is None:
+        import pandas as pd
+
+        ns = _freq_ns[freq] = pd.to_timedelta(freq).value
+    return ns
+
+
+# Last value of each `freq` calendar period, for returns on a fixed clock
+# however irregular the bars are
+def resample_last(values, times, freq=DEFAULT_FREQ):
+    periods = np.asarray(times, dtype='datetime64[ns]').astype(np.int64) // freq_to_ns(freq)
+    ends = np.flatnonzero(np.diff(periods))
+    return values[np.append(ends, len(values) - 1)]
+
+
+# Performance of an equity curve. `times` (datetime64 or epoch ns) makes the
+# ratios time-correct: returns are taken on `freq` periods and annualized by
+# the calendar, and drawdown duration is in days; without times every bar is
+# one period of `periods_per_year` and durations are in bars. `invested`
+# (value held in assets) and `traded` (value bought or sold) per bar add
+# exposure and annual turnover. Returns and drawdowns are percentages.
+def compute_metrics(equity, times=None, invested=None, traded=None, freq=DEFAULT_FREQ,
+                    periods_per_year=DEFAULT_PERIODS_PER_YEAR):
+    equity = np.asarray(equity, dtype=np.float64)
+    n = len(equity)
+    if n == 0:
+        return {}
+
+    # Drawdown from the running peak, and how long since that peak was set
+    peaks = np.maximum.accumulate(equity)
+    drawdowns = 1 - equity / peaks
+    max_drawdown = float(drawdowns.max())
+    index = np.arange(n)
+    peak_index = np.maximum.accumulate(np.where(equity >= peaks, index, 0))
+    if times is not None:
+        times = np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+        max_drawdown_duration = float((times - times[peak_index]).max() / NS_PER_DAY)
+        closes = resample_last(equity, times, freq)
+        periods_per_year = NS_PER_YEAR / freq_to_ns(freq)
+        years = (times[-1] - times[0]) / NS_PER_YEAR
+    else:
+        max_drawdown_duration = float((index - peak_index).max())
+        closes = equity
+        years = (n - 1) / periods_per_year
+
+    returns = np.diff(closes) / closes[:-1]
+    mean = returns.mean() if len(returns) else 0.0
+    std = returns.std(ddof=1) if len(returns) > 1 else 0.0
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2)) if len(returns) else 0.0
+    scale = np.sqrt(periods_per_year)
+
+    growth = equity[-1] / equity[0]
+    cagr = growth ** (1 / years) - 1 if years > 0 and growth > 0 else 0.0
+    metrics = {
+        'total_return': float((growth - 1) * 100),
+        'cagr': float(cagr * 100),
+        'max_drawdown': max_drawdown * 100,
+        'max_drawdown_duration': max_drawdown_duration,
+        'sharpe_ratio': float(mean / std * scale) if std > 0 else 0.0,
+        'sortino_ratio': float(mean / downside * scale) if downside > 0 else 0.0,
+        'calmar_ratio': float(cagr / max_drawdown) if max_drawdown > 0 else 0.0,
+    }
+    if invested is not None:
+        # Bars with no equity left hold nothing
+        exposure = np.divide(np.asarray(invested, dtype=np.float64), equity, out=np.zeros(n), where=equity != 0)
+        metrics['exposure'] = float(exposure.mean() * 100)
+    if traded is not None:
+        turnover = np.sum(traded) / equity.mean()
+        metrics['turnover'] = float(turnover / years) if years > 0 else float(turnover)
+    return metrics
+
+
+# compute_metrics for the curves returned by simulate_equity / run_portfolio
+def curve_metrics(curves, times=None, freq=DEFAULT_FREQ, periods_per_year=DEFAULT_PERIODS_PER_YEAR):
+    return compute_metrics(curves['equity'], times, curves.get('invested'), curves.get('traded'),
+                           freq, periods_per_year)
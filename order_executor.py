@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Coinbase Advanced Trade allows 30 private REST requests per second; stay below it
+DEFAULT_RATE = 25
+DEFAULT_BURST = 25
+
+# Orders in flight at once across all products
+DEFAULT_CONCURRENCY = 16
+
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5
+# HTTP statuses worth sending again: request timeout and rate limiting (5xx
+# are always retried)
+RETRY_STATUSES = frozenset({408, 429})
+
+log = logging.getLogger(__name__)
+
+
+# Token bucket limiting how fast requests leave the executor
+class TokenBucket:
+    def __init__(self, rate=DEFAULT_RATE, capacity=DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Whether a failed request may succeed if sent again: timeouts, dropped
+# connections and 408/429/5xx responses. Anything else (other 4xx, e.g.
+# insufficient funds or an invalid product) is a rejection and final.
+def is_transient(error):
+    status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status in RETRY_STATUSES or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    try:
+        from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout
+    except ImportError:
+        return False
+    return isinstance(error, (RequestsConnectionError, Timeout))
+
+
+# coinbase-advanced-py returns response objects (indexable, with to_dict()
+# but no .get()); callers of the executor always get a plain dict
+def _as_dict(response):
+    return response.to_dict() if hasattr(response, 'to_dict') else response
+
+
+# Sends blocking REST orders concurrently from a background event loop.
+# Orders for the same product run strictly in submission order, total
+# concurrency is bounded, every request passes the token bucket, and
+# transient failures are retried with the same client_order_id so the
+# exchange can deduplicate them; rejections are raised at once.
+class OrderExecutor:
+    def __init__(self, max_concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 retries=DEFAULT_RETRIES, retry_backoff=RETRY_BACKOFF):
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.submitted = 0
+        self.retried = 0
+        self._loop = asyncio.new_event_loop()
+        # Blocking SDK calls run on this pool; size it so it never caps concurrency
+        self._loop.set_default_executor(ThreadPoolExecutor(max_concurrency, thread_name_prefix='order'))
+        self._thread = threading.Thread(target=self._loop.run_forever, name='order-executor', daemon=True)
+        self._thread.start()
+        self._product_locks = {}
+        self._semaphore = None
+        self._bucket = None
+        self._ready = asyncio.run_coroutine_threadsafe(self._setup(max_concurrency, rate, burst), self._loop)
+        self._ready.result()
+
+    async def _setup(self, max_concurrency, rate, burst):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+
+    async def _send(self, product_id, client_order_id, place):
+        lock = self._product_locks.setdefault(product_id, asyncio.Lock())
+        async with lock:
+            async with self._semaphore:
+                for attempt in range(self.retries + 1):
+                    await self._bucket.acquire()
+                    try:
+                        return _as_dict(await asyncio.to_thread(place, client_order_id))
+                    except Exception as e:
+                        if attempt == self.retries or not is_transient(e):
+                            raise
+                        self.retried += 1
+                        delay = self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+                        log.warning(f"Order {client_order_id} failed: {e}. Retrying in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+
+    # Queue place(client_order_id) and return a concurrent.futures.Future with
+    # its response as a dict. Safe to call from any thread.
+    def submit(self, product_id, client_order_id, place):
+        self.submitted += 1
+        return asyncio.run_coroutine_threadsafe(self._send(product_id, client_order_id, place), self._loop)
+
+    @staticmethod
+    def wait_all(futures, timeout=None):
+        if futures:
+            wait(futures, timeout=timeout)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
@@ -0,0 +1,115 @@
+import threading
+import time
+
+# Seconds before the cached balances are reloaded from REST
+DEFAULT_TTL = 300
+
+# Number of orders whose fill progress is remembered, to ignore replays
+MAX_TRACKED_ORDERS = 1000
+
+
+# Local copy of account balances. Loaded once from client.get_accounts(),
+# then updated from order responses (provisionally) and user-channel fills
+# (exactly), and only reloaded from REST when the TTL expires or after
+# invalidate() is called.
+class PortfolioCache:
+    def __init__(self, client, quote_currency='GBP', ttl=DEFAULT_TTL):
+        self.client = client
+        self.quote_currency = quote_currency
+        self.ttl = ttl
+        self.refreshes = 0
+        self._balances = {}
+        self._loaded_at = None
+        self._stale = True
+        # order_id -> (product id, base delta, quote delta) applied from an
+        # order response and still awaiting its real fills
+        self._provisional = {}
+        # order_id -> (cumulative quantity, filled value, fees) already applied
+        self._filled = {}
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        accounts = self.client.get_accounts()
+        balances = {}
+        for account in accounts['accounts']:
+            balances[account['currency']] = float(account['available_balance']['value'])
+        with self._lock:
+            self._balances = balances
+            self._provisional.clear()
+            self._loaded_at = time.monotonic()
+            self._stale = False
+            self.refreshes += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def _expired(self):
+        return self._stale or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    # (balances by currency, quote currency balance), refreshing if needed
+    def snapshot(self):
+        with self._lock:
+            expired = self._expired()
+        if expired:
+            self.refresh()
+        with self._lock:
+            return dict(self._balances), self._balances.get(self.quote_currency, 0)
+
+    # Move balances between a product's base and quote currencies
+    def _adjust(self, product_id, base_delta, quote_delta):
+        currency, _, quote_currency = product_id.partition('-')
+        quote_currency = quote_currency or self.quote_currency
+        self._balances[currency] = self._balances.get(currency, 0) + base_delta
+        self._balances[quote_currency] = self._balances.get(quote_currency, 0) + quote_delta
+
+    # Apply a successful market order response using the requested size and
+    # the last traded price until the real fill arrives on the user channel
+    def apply_order(self, order, side, product_id, size, price):
+        if side == 'buy':
+            base_delta, quote_delta = size / price, -size
+        else:
+            base_delta, quote_delta = -size, size * price
+        order_id = (order.get('success_response') or {}).get('order_id')
+        with self._lock:
+            if order_id and order_id in self._filled:
+                return
+            self._adjust(product_id, base_delta, quote_delta)
+            if order_id:
+                self._provisional[order_id] = (product_id, base_delta, quote_delta)
+
+    # Apply 'user' channel events: replace any provisional estimate for an
+    # order with the incremental fills reported by the exchange
+    def apply_user_events(self, events):
+        with self._lock:
+            for event in events:
+                for update in event.get('orders', []):
+                    order_id = update.get('order_id')
+                    if not order_id:
+                        continue
+                    quantity = float(update.get('cumulative_quantity') or 0)
+                    value = float(update.get('filled_value') or 0)
+                    fees = float(update.get('total_fees') or 0)
+                    if event.get('type') == 'snapshot':
+                        # Snapshots describe fills already in the REST balances
+                        self._filled[order_id] = (quantity, value, fees)
+                        continue
+
+                    provisional = self._provisional.pop(order_id, None)
+                    if provisional:
+                        product_id, base_delta, quote_delta = provisional
+                        self._adjust(product_id, -base_delta, -quote_delta)
+
+                    seen_quantity, seen_value, seen_fees = self._filled.get(order_id, (0.0, 0.0, 0.0))
+                    product_id = update.get('product_id', '')
+                    delta_quantity = quantity - seen_quantity
+                    delta_value = value - seen_value
+                    delta_fees = fees - seen_fees
+                    if update.get('order_side', '').upper() == 'BUY':
+                        self._adjust(product_id, delta_quantity, -delta_value - delta_fees)
+                    else:
+                        self._adjust(product_id, -delta_quantity, delta_value - delta_fees)
+
+                    self._filled[order_id] = (quantity, value, fees)
+                    if len(self._filled) > MAX_TRACKED_ORDERS:
+                        del self._filled[next(iter(self._filled))]
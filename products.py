@@ -0,0 +1,135 @@
+import json
+import logging
+import os
+import time
+
+# Product metadata is fetched once and reused from disk until it is this old
+CACHE_PATH = os.path.join('data', 'products.json')
+CACHE_TTL = 24 * 60 * 60
+
+# Used for products the catalog knows nothing about, as the old tables did
+DEFAULT_PRECISION = 6
+DEFAULT_MIN_SIZE = 0.0001
+
+log = logging.getLogger(__name__)
+
+
+# Decimal places of an increment string such as '0.00010000' (-> 4)
+def decimals(increment):
+    text = str(increment)
+    if '.' not in text:
+        return 0
+    return len(text.split('.', 1)[1].rstrip('0'))
+
+
+def _as_dict(item):
+    return item.to_dict() if hasattr(item, 'to_dict') else dict(item)
+
+
+# The fields the bot uses from a get_products() entry
+def _normalize(product):
+    product = _as_dict(product)
+    base, _, quote = product['product_id'].partition('-')
+    return {
+        'base_currency': product.get('base_currency_id') or base,
+        'quote_currency': product.get('quote_currency_id') or quote,
+        'base_increment': str(product.get('base_increment') or '0.00000001'),
+        'quote_increment': str(product.get('quote_increment') or '0.01'),
+        'base_min_size': float(product.get('base_min_size') or 0),
+        'quote_min_size': float(product.get('quote_min_size') or 0),
+        'tradable': (product.get('status', 'online') == 'online'
+                     and not product.get('trading_disabled')
+                     and not product.get('is_disabled')
+                     and not product.get('cancel_only')),
+    }
+
+
+# Increments and minimum sizes of every spot product, replacing the
+# hand-maintained precision and minimum tables. load() serves the on-disk
+# copy while it is younger than the TTL and otherwise refetches it, falling
+# back to the stale copy if the exchange can't be reached.
+class ProductCatalog:
+    def __init__(self, products, fetched_at=None):
+        self.products = products
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def fetch(cls, client):
+        response = _as_dict(client.get_products(product_type='SPOT'))
+        products = {}
+        for product in response.get('products', []):
+            product = _as_dict(product)
+            if product.get('product_type', 'SPOT') == 'SPOT':
+                products[product['product_id']] = _normalize(product)
+        return cls(products, time.time())
+
+    @classmethod
+    def read(cls, path=CACHE_PATH):
+        with open(path) as f:
+            cached = json.load(f)
+        return cls(cached['products'], cached['fetched_at'])
+
+    def write(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Per-process temporary file: workers may refresh the cache together
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'fetched_at': self.fetched_at, 'products': self.products}, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, client, path=CACHE_PATH, ttl=CACHE_TTL):
+        cached = None
+        try:
+            cached = cls.read(path)
+        except (OSError, ValueError, KeyError):
+            pass
+        if cached is not None and time.time() - cached.fetched_at < ttl:
+            return cached
+        try:
+            catalog = cls.fetch(client)
+        except Exception as e:
+            if cached is None:
+                raise
+            log.warning(f"Product refresh failed, using cached metadata: {e}")
+            return cached
+        catalog.write(path)
+        log.info(f"Loaded metadata for {len(catalog.products)} products")
+        return catalog
+
+    def __contains__(self, product_id):
+        return product_id in self.products
+
+    # Tradable product ids, optionally limited to some quote currencies
+    def product_ids(self, quote_currencies=None):
+        return sorted(product_id for product_id, product in self.products.items()
+                      if product['tradable']
+                      and (quote_currencies is None or product['quote_currency'] in quote_currencies))
+
+    # Decimal places of a buy's quote size and a sell's base size
+    def buy_precision(self, product_id):
+        product = self.products.get(product_id)
+        return decimals(product['quote_increment']) if product else DEFAULT_PRECISION
+
+    def sell_precision(self, product_id):
+        product = self.products.get(product_id)
+        return decimals(product['base_increment']) if product else DEFAULT_PRECISION
+
+    def min_quote_size(self, product_id):
+        product = self.products.get(product_id)
+        return product['quote_min_size'] if product else DEFAULT_MIN_SIZE
+
+    def min_base_size(self, product_id):
+        product = self.products.get(product_id)
+        return product['base_min_size'] if product else DEFAULT_MIN_SIZE
+
+
+# Split product ids into WebSocket subscriptions of at most `size` products
+def shard(product_ids, size):
+    product_ids = list(product_ids)
+    return [product_ids[i:i + size] for i in range(0, len(product_ids), size)] or [[]]
+
+
+# The products worker `index` of `count` is responsible for
+def partition(product_ids, count, index):
+    return list(product_ids)[index::count]
@@ -0,0 +1,66 @@
+import numpy as np
+
+# Indicator columns every score reads
+SCORE_FIELDS = ('price', 'RSI', 'MACD_Diff', 'Bollinger_Low', 'Bollinger_High', 'SMA')
+
+# Bars in the rolling means that ATR and OBV are compared with
+EXTRA_MEAN_WINDOW = 14
+
+
+def _vote(high, low):
+    return high.astype(np.int64) - low
+
+
+# The bot's performance score, elementwise over arrays of any shape: one
+# product over time (backtests) or many products at one time (live). Each of
+# RSI, MACD, Bollinger and SMA votes -1/0/+1; when given, ATR below its
+# rolling mean and OBV above its rolling mean add 0.5 each. NaN inputs don't
+# vote, as with the scalar comparisons this replaces. Normalized as
+# (score + 4) / 8, so 0.5 is neutral.
+def score_signals(price, rsi, macd_diff, bollinger_low, bollinger_high, sma, rsi_low=30, rsi_high=70,
+                  atr=None, atr_mean=None, obv=None, obv_mean=None):
+    price = np.asarray(price, dtype=np.float64)
+    rsi = np.asarray(rsi, dtype=np.float64)
+    macd_diff = np.asarray(macd_diff, dtype=np.float64)
+    score = _vote(rsi < rsi_low, rsi > rsi_high)
+    score += _vote(macd_diff > 0, macd_diff < 0)
+    score += _vote(price < bollinger_low, price > bollinger_high)
+    score += _vote(price > sma, price < sma)
+    score = score.astype(np.float64)
+    if atr is not None:
+        score += 0.5 * (np.asarray(atr, dtype=np.float64) < atr_mean)
+    if obv is not None:
+        score += 0.5 * (np.asarray(obv, dtype=np.float64) > obv_mean)
+    return (score + 4) / 8
+
+
+# Scores of every row of a products x indicators matrix whose columns are
+# named by `fields`. ATR/OBV bonuses apply when the matrix has both the
+# value and its 'ATR_Mean'/'OBV_Mean' column.
+def score_matrix(values, fields, rsi_low=30, rsi_high=70):
+    values = np.asarray(values, dtype=np.float64)
+    columns = {name: values[:, i] for i, name in enumerate(fields)}
+    return score_columns(columns, rsi_low, rsi_high)
+
+
+# Scores from a mapping of indicator name -> array
+def score_columns(columns, rsi_low=30, rsi_high=70):
+    extras = {}
+    for name in ('ATR', 'OBV'):
+        if name in columns and f'{name}_Mean' in columns:
+            extras[name.lower()] = columns[name]
+            extras[f'{name.lower()}_mean'] = columns[f'{name}_Mean']
+    return score_signals(columns['price'], columns['RSI'], columns['MACD_Diff'],
+                         columns['Bollinger_Low'], columns['Bollinger_High'],
+                         columns['SMA'], rsi_low, rsi_high, **extras)
+
+
+# Scores of every row of an indicator frame; ATR and OBV columns, if any, are
+# compared with their EXTRA_MEAN_WINDOW-bar rolling means
+def score_frame(df, rsi_low=30, rsi_high=70):
+    columns = {name: df[name].to_numpy() for name in SCORE_FIELDS}
+    for name in ('ATR', 'OBV'):
+        if name in df.columns:
+            columns[name] = df[name].to_numpy()
+            columns[f'{name}_Mean'] = df[name].rolling(EXTRA_MEAN_WINDOW).mean().to_numpy()
+    return score_columns(columns, rsi_low, rsi_high)
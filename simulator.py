@@ -0,0 +1,330 @@
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+# Emit a heartbeats message after this many replayed ticks
+HEARTBEAT_EVERY = 100
+
+DEFAULT_FEE_RATE = 0.006
+
+
+# Close prices of a historical_data_{symbol}.csv file as (times_ns, prices)
+def csv_ticks(file_path, start_date=None, end_date=None):
+    from columnar_store import read_historical_csv
+
+    data = read_historical_csv(file_path)[start_date:end_date]
+    return data.index.values.astype('datetime64[ns]').astype(np.int64), data['close'].to_numpy(dtype=np.float64)
+
+
+# Ticks the live bot recorded into the columnar store, as (times_ns, prices)
+def recorded_ticks(product_id, start_date=None, end_date=None, store=None):
+    from columnar_store import ColumnarStore
+
+    ticks = (store or ColumnarStore()).load(product_id, 'ticks', start_date, end_date)
+    return np.asarray(ticks['time']), np.asarray(ticks['price'])
+
+
+# Merge per-product (product_id, times_ns, prices) series onto one
+# time-ordered stream, as (product_ids, times_ns, product slots, prices)
+def merge_ticks(series):
+    product_ids = [product_id for product_id, _, _ in series]
+    if not series:
+        return product_ids, np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    times = np.concatenate([t for _, t, _ in series])
+    order = np.argsort(times, kind='stable')
+    slots = np.concatenate([np.full(len(t), i) for i, (_, t, _) in enumerate(series)])
+    return product_ids, times[order], slots[order], np.concatenate([p for _, _, p in series])[order]
+
+
+# Ticks of historical CSVs (priced in quote_currency) and recorded products,
+# merged as by merge_ticks
+def load_ticks(csv_files=(), recorded_products=(), quote_currency='GBP', start_date=None, end_date=None,
+               store=None):
+    series = []
+    for file_path in csv_files:
+        symbol = file_path.rsplit('historical_data_', 1)[-1].rsplit('.', 1)[0]
+        series.append((f"{symbol}-{quote_currency}",) + csv_ticks(file_path, start_date, end_date))
+    for product_id in recorded_products:
+        series.append((product_id,) + recorded_ticks(product_id, start_date, end_date, store))
+    return merge_ticks(series)
+
+
+def _iso(time_ns):
+    return np.datetime_as_string(np.datetime64(int(time_ns), 'ns')) + 'Z'
+
+
+# In-process stand-in for Coinbase: replays price series as ticker messages
+# in the shape on_message parses and fills market orders against the last
+# replayed price with configurable slippage, fees and latency.
+class SimulatedExchange:
+    def __init__(self, csv_files=(), recorded_products=(), quote_currency='GBP', speed=0,
+                 slippage=0.001, fee_rate=DEFAULT_FEE_RATE, latency=0.05, quote_balance=1000,
+                 start_date=None, end_date=None, store=None):
+        self.quote_currency = quote_currency
+        self.speed = speed
+        self.slippage = slippage
+        self.fee_rate = fee_rate
+        self.latency = latency
+
+        # Every series merged onto one time-ordered event stream
+        self.product_ids, self._times, self._products, self._prices = load_ticks(
+            csv_files, recorded_products, quote_currency, start_date, end_date, store)
+
+        self.balances = {quote_currency: float(quote_balance)}
+        for product_id in self.product_ids:
+            self.balances[product_id.split('-')[0]] = 0.0
+        self.last_prices = {}
+        self.orders = {}
+        self.ticks_emitted = 0
+        self.latencies = []
+        self._last_tick_wall = {}
+        self._clients = []
+        self._lock = threading.Lock()
+        self._replay_thread = None
+        self._replay_started = None
+        self._replay_seconds = None
+        self.finished = threading.Event()
+        # Fill notifications waiting for the replay thread, which sends every
+        # WebSocket message so callbacks arrive on one thread as they do live
+        self._user_updates = deque()
+        self._user_ready = threading.Event()
+        # At full speed (speed 0) the replay calls this after every tick, if
+        # set, and sends the next one only when it returns, so the consumer
+        # can finish acting on each tick first
+        self.pace = None
+        # Replayed time of the latest tick, in epoch seconds
+        self.replay_time = None
+
+        self.rest_client = SimRESTClient(self)
+
+    def ws_client_factory(self, api_key=None, api_secret=None, on_message=None, on_open=None,
+                          on_close=None, retry=True, **kwargs):
+        return SimWSClient(self, on_message, on_open, on_close)
+
+    def _subscribe(self, client):
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+            if self._replay_thread is None:
+                self._replay_thread = threading.Thread(target=self._replay, name='sim-replay', daemon=True)
+                self._replay_thread.start()
+
+    def _unsubscribe(self, client):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def _replay(self):
+        times = self._times
+        prices = self._prices.tolist()
+        products = [self.product_ids[i] for i in self._products.tolist()]
+        self._replay_started = time.perf_counter()
+        first = int(times[0]) if len(times) else 0
+
+        for i in range(len(prices)):
+            if self.speed:
+                self._wait_until(self._replay_started + (int(times[i]) - first) / 1e9 / self.speed)
+            if self._user_updates:
+                self._deliver_user_updates()
+            product_id = products[i]
+            price = prices[i]
+            timestamp = _iso(times[i])
+            self.last_prices[product_id] = price
+            self.replay_time = int(times[i]) / 1e9
+            self._last_tick_wall[product_id] = time.perf_counter()
+            self.ticks_emitted += 1
+            for client in list(self._clients):
+                client._ticker(product_id, price, timestamp)
+                if self.ticks_emitted % HEARTBEAT_EVERY == 0:
+                    client._heartbeat(timestamp)
+            if not self.speed and self.pace:
+                self.pace()
+
+        self._replay_seconds = time.perf_counter() - self._replay_started
+        self.finished.set()
+        # Orders can still be in flight; keep delivering their fills
+        while True:
+            self._user_ready.wait()
+            self._user_ready.clear()
+            self._deliver_user_updates()
+
+    # Sleep until the perf_counter `deadline`, sending fills as they arrive
+    def _wait_until(self, deadline):
+        while True:
+            self._deliver_user_updates()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                return
+            self._user_ready.wait(remaining)
+            self._user_ready.clear()
+
+    def _deliver_user_updates(self):
+        while self._user_updates:
+            update, timestamp = self._user_updates.popleft()
+            for client in list(self._clients):
+                client._user(update, timestamp)
+
+    # Called from order threads: hand the update to the replay thread
+    def _broadcast_user(self, update, timestamp):
+        if self._clients:
+            self._user_updates.append((update, timestamp))
+            self._user_ready.set()
+
+    def _fill(self, client_order_id, product_id, side, size):
+        time.sleep(self.latency / 2)
+        received = time.perf_counter()
+        with self._lock:
+            if product_id in self._last_tick_wall:
+                self.latencies.append(received - self._last_tick_wall[product_id])
+            if client_order_id in self.orders:
+                return {'success': False, 'failure_reason': 'DUPLICATE_CLIENT_ORDER_ID',
+                        'error_response': {'error': 'DUPLICATE_CLIENT_ORDER_ID'}}
+            price = self.last_prices.get(product_id)
+            currency = product_id.split('-')[0]
+            if price is None:
+                return {'success': False, 'failure_reason': 'UNKNOWN_PRODUCT_PRICE'}
+
+            if side == 'BUY':
+                fill_price = price * (1 + self.slippage)
+                quote = size
+                fees = quote * self.fee_rate
+                value = quote - fees
+                quantity = value / fill_price
+                if quote > self.balances.get(self.quote_currency, 0):
+                    return {'success': False, 'failure_reason': 'INSUFFICIENT_FUND'}
+                self.balances[self.quote_currency] -= quote
+                self.balances[currency] = self.balances.get(currency, 0) + quantity
+                configuration = {'market_market_ioc': {'quote_size': str(size)}}
+            else:
+                fill_price = price * (1 - self.slippage)
+                quantity = size
+                value = quantity * fill_price
+                fees = value * self.fee_rate
+                if quantity > self.balances.get(currency, 0):
+                    return {'success': False, 'failure_reason': 'INSUFFICIENT_FUND'}
+                self.balances[currency] -= quantity
+                self.balances[self.quote_currency] += value - fees
+                configuration = {'market_market_ioc': {'base_size': str(size)}}
+
+            order_id = str(uuid.uuid4())
+            response = {
+                'success': True,
+                'failure_reason': 'UNKNOWN_FAILURE_REASON',
+                'order_id': order_id,
+                'success_response': {'order_id': order_id, 'product_id': product_id, 'side': side,
+                                     'client_order_id': client_order_id},
+                'order_configuration': configuration,
+            }
+            self.orders[client_order_id] = response
+
+        self._broadcast_user({
+            'order_id': order_id, 'client_order_id': client_order_id, 'product_id': product_id,
+            'order_side': side, 'status': 'FILLED', 'cumulative_quantity': str(quantity),
+            'filled_value': str(value), 'total_fees': str(fees), 'avg_price': str(fill_price),
+        }, _iso(time.time_ns()))
+        time.sleep(self.latency / 2)
+        return response
+
+    # Seconds on the replayed clock, for consumers that time decisions by it
+    def replay_clock(self):
+        return self.replay_time or 0.0
+
+    def stats(self):
+        latencies = np.asarray(self.latencies) * 1000
+        stats = {
+            'ticks': self.ticks_emitted,
+            'orders': len(self.orders),
+            'replay_seconds': self._replay_seconds,
+            'ticks_per_second': self.ticks_emitted / self._replay_seconds if self._replay_seconds else None,
+            'balances': dict(self.balances),
+        }
+        if len(latencies):
+            stats.update({
+                'tick_to_order_ms_p50': float(np.percentile(latencies, 50)),
+                'tick_to_order_ms_p99': float(np.percentile(latencies, 99)),
+                'tick_to_order_ms_max': float(latencies.max()),
+            })
+        return stats
+
+
+class SimRESTClient:
+    def __init__(self, exchange):
+        self.exchange = exchange
+
+    def get_accounts(self):
+        time.sleep(self.exchange.latency)
+        with self.exchange._lock:
+            balances = dict(self.exchange.balances)
+        return {'accounts': [{'currency': currency, 'available_balance': {'value': str(balance), 'currency': currency}}
+                             for currency, balance in balances.items()]}
+
+    # The replayed products, with Coinbase-like increments and minimum sizes
+    def get_products(self, **kwargs):
+        time.sleep(self.exchange.latency)
+        products = []
+        for product_id in self.exchange.product_ids:
+            base, quote = product_id.split('-')
+            products.append({'product_id': product_id, 'base_currency_id': base, 'quote_currency_id': quote,
+                             'base_increment': '0.00000001', 'quote_increment': '0.01',
+                             'base_min_size': '0.00000001', 'quote_min_size': '1',
+                             'status': 'online', 'trading_disabled': False, 'product_type': 'SPOT'})
+        return {'products': products, 'num_products': len(products)}
+
+    def market_order_buy(self, client_order_id, product_id, quote_size, **kwargs):
+        return self.exchange._fill(client_order_id, product_id, 'BUY', float(quote_size))
+
+    def market_order_sell(self, client_order_id, product_id, base_size, **kwargs):
+        return self.exchange._fill(client_order_id, product_id, 'SELL', float(base_size))
+
+
+class SimWSClient:
+    def __init__(self, exchange, on_message=None, on_open=None, on_close=None):
+        self.exchange = exchange
+        self.on_message = on_message
+        self.on_open = on_open
+        self.on_close = on_close
+        self.product_ids = set()
+        self.channels = set()
+        self.sequence = 0
+        self.is_open = False
+
+    def open(self):
+        self.is_open = True
+        if self.on_open:
+            self.on_open()
+
+    def subscribe(self, product_ids, channels):
+        self.product_ids.update(product_ids)
+        self.channels.update(channels)
+        self.exchange._subscribe(self)
+
+    def close(self):
+        self.exchange._unsubscribe(self)
+        self.is_open = False
+        if self.on_close:
+            self.on_close()
+
+    def _send(self, channel, timestamp, events):
+        if not self.on_message:
+            return
+        message = {'channel': channel, 'client_id': '', 'timestamp': timestamp,
+                   'sequence_num': self.sequence, 'events': events}
+        self.sequence += 1
+        self.on_message(json.dumps(message))
+
+    def _ticker(self, product_id, price, timestamp):
+        if 'ticker' in self.channels and product_id in self.product_ids:
+            self._send('ticker', timestamp, [{'type': 'update', 'tickers': [
+                {'type': 'ticker', 'product_id': product_id, 'price': str(price)}]}])
+
+    def _heartbeat(self, timestamp):
+        if 'heartbeats' in self.channels:
+            self._send('heartbeats', timestamp, [{'current_time': timestamp, 'heartbeat_counter': self.sequence}])
+
+    def _user(self, update, timestamp):
+        if 'user' in self.channels:
+            self._send('user', timestamp, [{'type': 'update', 'orders': [update]}])
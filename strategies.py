@@ -0,0 +1,404 @@
+import math
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from indicators import RollingStats, StreamingEMA, StreamingRSI, indicator_arrays
+from scoring import score_signals
+
+
+# Indicator nodes are hashable keys, (kind, *params), so two strategies that
+# ask for the same indicator share one node. Derived nodes (MACD, bands) list
+# the nodes they are built from, so e.g. EMA(26) is computed once whether a
+# strategy reads it directly or through MACD.
+def price():
+    return ('price',)
+
+
+def sma(window=20):
+    return ('sma', window)
+
+
+def rolling_std(window=20):
+    return ('std', window)
+
+
+def ema(span):
+    return ('ema', span)
+
+
+def rsi(window=14):
+    return ('rsi', window)
+
+
+def macd(fast=12, slow=26):
+    return ('macd', fast, slow)
+
+
+def macd_signal(fast=12, slow=26, sign=9):
+    return ('macd_signal', fast, slow, sign)
+
+
+def macd_diff(fast=12, slow=26, sign=9):
+    return ('macd_diff', fast, slow, sign)
+
+
+def bollinger_high(window=20, dev=2):
+    return ('bollinger_high', window, dev)
+
+
+def bollinger_low(window=20, dev=2):
+    return ('bollinger_low', window, dev)
+
+
+def node_name(node):
+    return node[0] if len(node) == 1 else f"{node[0]}({','.join(str(p) for p in node[1:])})"
+
+
+def dependencies(node):
+    kind, params = node[0], node[1:]
+    if kind == 'std':
+        return [sma(*params)]
+    if kind == 'macd':
+        return [ema(params[0]), ema(params[1])]
+    if kind == 'macd_signal':
+        return [macd(*params[:2])]
+    if kind == 'macd_diff':
+        return [macd(*params[:2]), macd_signal(*params)]
+    if kind in ('bollinger_high', 'bollinger_low'):
+        return [sma(params[0]), rolling_std(params[0])]
+    if kind in ('price', 'sma', 'ema', 'rsi'):
+        return []
+    raise ValueError(f"Unknown indicator node: {node}")
+
+
+# Whole-series versions with the same pandas operations as the `ta` library,
+# so graph-computed columns equal apply_technical_indicators'
+def _compute(node, close, inputs):
+    kind, params = node[0], node[1:]
+    if kind == 'price':
+        return close
+    if kind == 'sma':
+        return close.rolling(params[0], min_periods=params[0]).mean()
+    if kind == 'std':
+        return close.rolling(params[0], min_periods=params[0]).std(ddof=0)
+    if kind == 'ema':
+        return close.ewm(span=params[0], min_periods=params[0], adjust=False).mean()
+    if kind == 'rsi':
+        import pandas as pd
+
+        window = params[0]
+        diff = close.diff(1)
+        up = diff.where(diff > 0, 0.0).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+        down = (-diff.where(diff < 0, 0.0)).ewm(alpha=1 / window, min_periods=window, adjust=False).mean()
+        return pd.Series(np.where(down == 0, 100, 100 - 100 / (1 + up / down)), index=close.index)
+    if kind == 'macd':
+        return inputs[0] - inputs[1]
+    if kind == 'macd_signal':
+        span = params[2]
+        return inputs[0].ewm(span=span, min_periods=span, adjust=False).mean()
+    if kind == 'macd_diff':
+        return inputs[0] - inputs[1]
+    if kind == 'bollinger_high':
+        return inputs[0] + params[1] * inputs[1]
+    if kind == 'bollinger_low':
+        return inputs[0] - params[1] * inputs[1]
+    raise ValueError(f"Unknown indicator node: {node}")
+
+
+# Streaming versions, updated once per bar in dependency order and matching
+# `ta` to within TA_TOLERANCE (see compare_with_ta)
+class _StreamingNode:
+    def __init__(self, node, inputs):
+        self.node = node
+        self.inputs = inputs
+        self.value = float('nan')
+        kind, params = node[0], node[1:]
+        self._state = None
+        if kind == 'sma':
+            self._state = self.stats = RollingStats(params[0])
+        elif kind == 'std':
+            self.stats = inputs[0].stats
+        elif kind == 'ema':
+            self._state = StreamingEMA(span=params[0])
+        elif kind == 'rsi':
+            self._state = StreamingRSI(params[0])
+        elif kind == 'macd_signal':
+            self._state = StreamingEMA(span=params[2])
+        self.update = getattr(self, f'_update_{kind}')
+
+    def _update_price(self, price):
+        self.value = price
+
+    def _update_sma(self, price):
+        self.stats.update(price)
+        self.value = self.stats.mean
+
+    def _update_std(self, price):
+        self.value = self.stats.std
+
+    def _update_ema(self, price):
+        self.value = self._state.update(price)
+
+    def _update_rsi(self, price):
+        self.value = self._state.update(price)
+
+    def _update_macd(self, price):
+        fast, slow = self.inputs[0].value, self.inputs[1].value
+        if not (math.isnan(fast) or math.isnan(slow)):
+            self.value = fast - slow
+
+    def _update_macd_signal(self, price):
+        line = self.inputs[0].value
+        if not math.isnan(line):
+            self.value = self._state.update(line)
+
+    def _update_macd_diff(self, price):
+        self.value = self.inputs[0].value - self.inputs[1].value
+
+    def _update_bollinger_high(self, price):
+        self.value = self.inputs[0].value + self.node[2] * self.inputs[1].value
+
+    def _update_bollinger_low(self, price):
+        self.value = self.inputs[0].value - self.node[2] * self.inputs[1].value
+
+    def state(self):
+        state = {'value': self.value}
+        if self._state is not None:
+            state['state'] = self._state.state()
+        return state
+
+    def restore(self, state):
+        self.value = state['value']
+        if self._state is not None:
+            self._state.restore(state['state'])
+
+
+# Base class of scoring strategies. A strategy names the indicator nodes it
+# reads in `inputs` (alias -> node) and turns them into a score with
+# score(values), where values maps each alias to an array: one product over
+# time in backtests, or many products at one time live. Scores follow the
+# bot's convention: above 0.5 buys, below 0.5 sells. Subclasses must define
+# both, or creating them raises TypeError.
+class Strategy(ABC):
+    name = None
+    # Bars before the strategy's indicators are meaningful
+    warmup = 26
+
+    def __init__(self, name=None):
+        if name is not None:
+            self.name = name
+
+    @property
+    @abstractmethod
+    def inputs(self):
+        pass
+
+    @abstractmethod
+    def score(self, values):
+        pass
+
+
+# The four-vote RSI/MACD/Bollinger/SMA score of base_bot2 and the backtests
+class ClassicStrategy(Strategy):
+    name = 'classic'
+
+    def __init__(self, rsi_low=30, rsi_high=70, sma_window=20, rsi_window=14, bollinger_window=20,
+                 bollinger_dev=2, name=None):
+        super().__init__(name)
+        self.rsi_low = rsi_low
+        self.rsi_high = rsi_high
+        self._inputs = {
+            'price': price(),
+            'RSI': rsi(rsi_window),
+            'MACD_Diff': macd_diff(),
+            'Bollinger_Low': bollinger_low(bollinger_window, bollinger_dev),
+            'Bollinger_High': bollinger_high(bollinger_window, bollinger_dev),
+            'SMA': sma(sma_window),
+        }
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    def score(self, values):
+        return score_signals(values['price'], values['RSI'], values['MACD_Diff'], values['Bollinger_Low'],
+                             values['Bollinger_High'], values['SMA'], self.rsi_low, self.rsi_high)
+
+
+# base_bot.py's 0-2 score: one point each for RSI below 30 and a positive
+# MACD histogram, buying only on both and never selling on the score
+class RsiMacdStrategy(Strategy):
+    name = 'rsi_macd'
+
+    def __init__(self, rsi_low=30, rsi_window=14, name=None):
+        super().__init__(name)
+        self.rsi_low = rsi_low
+        self._inputs = {'RSI': rsi(rsi_window), 'MACD_Diff': macd_diff()}
+
+    @property
+    def inputs(self):
+        return self._inputs
+
+    def score(self, values):
+        points = (np.asarray(values['RSI']) < self.rsi_low).astype(np.int64) + (np.asarray(values['MACD_Diff']) > 0)
+        return np.where(points == 2, 1.0, 0.5)
+
+
+# Strategies by name, for configuration strings
+STRATEGIES = {
+    'classic': lambda: ClassicStrategy(),
+    'classic_40_60': lambda: ClassicStrategy(rsi_low=40, rsi_high=60, name='classic_40_60'),
+    'rsi_macd': lambda: RsiMacdStrategy(),
+}
+
+
+def create_strategies(names):
+    strategies = []
+    for name in names:
+        if name not in STRATEGIES:
+            raise ValueError(f"Unknown strategy: {name} (choose from {', '.join(STRATEGIES)})")
+        strategies.append(STRATEGIES[name]())
+    return strategies
+
+
+# The deduplicated indicator graph of several strategies. Every node any
+# strategy needs, directly or through another node, appears once in `nodes`
+# in dependency order; compute() and stream() evaluate each once per series
+# or bar and every strategy scores from the shared values. `nodes` adds
+# indicators to evaluate that no strategy reads.
+class SignalGraph:
+    def __init__(self, strategies, nodes=()):
+        self.strategies = list(strategies)
+        names = [strategy.name for strategy in self.strategies]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Strategy names must be unique: {names}")
+        self.nodes = []
+        seen = set()
+
+        def visit(node):
+            if node in seen:
+                return
+            seen.add(node)
+            for dependency in dependencies(node):
+                visit(dependency)
+            self.nodes.append(node)
+
+        for strategy in self.strategies:
+            for node in strategy.inputs.values():
+                visit(node)
+        for node in nodes:
+            visit(node)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.names = [node_name(node) for node in self.nodes]
+        self.warmup = max((strategy.warmup for strategy in self.strategies), default=0)
+
+    # Every node over a whole price series, as node -> array
+    def compute(self, prices):
+        import pandas as pd
+
+        close = pd.Series(np.asarray(prices, dtype=np.float64))
+        series = {}
+        for node in self.nodes:
+            series[node] = _compute(node, close, [series[dependency] for dependency in dependencies(node)])
+        return {node: values.to_numpy() for node, values in series.items()}
+
+    # strategy name -> score array from node values (node -> array)
+    def score_values(self, values):
+        return {strategy.name: np.asarray(strategy.score({alias: values[node]
+                                                          for alias, node in strategy.inputs.items()}),
+                                          dtype=np.float64)
+                for strategy in self.strategies}
+
+    # strategy name -> score per bar of a price series
+    def scores(self, prices):
+        return self.score_values(self.compute(prices))
+
+    # strategy name -> score per row of a (products x nodes) matrix of
+    # streamed values, columns in `nodes` order
+    def score_rows(self, rows):
+        rows = np.asarray(rows, dtype=np.float64)
+        return self.score_values({node: rows[:, i] for i, node in enumerate(self.nodes)})
+
+    def stream(self):
+        return StreamingSignals(self)
+
+
+# Per-product streaming state of a SignalGraph, updated once per closed bar
+class StreamingSignals:
+    def __init__(self, graph):
+        self.graph = graph
+        objects = {}
+        for node in graph.nodes:
+            objects[node] = _StreamingNode(node, [objects[dependency] for dependency in dependencies(node)])
+        self._nodes = [objects[node] for node in graph.nodes]
+        self._updates = [node.update for node in self._nodes]
+        self.count = 0
+        self.price = float('nan')
+
+    def update(self, price):
+        self.price = price
+        for update in self._updates:
+            update(price)
+        self.count += 1
+
+    # Current node values in graph.nodes order
+    def values(self):
+        return [node.value for node in self._nodes]
+
+    def scores(self):
+        return {name: float(scores[0]) for name, scores in self.graph.score_rows([self.values()]).items()}
+
+    def state(self):
+        return {'nodes': [node_name(node) for node in self.graph.nodes], 'count': self.count, 'price': self.price,
+                'values': [node.state() for node in self._nodes]}
+
+    # Restore a state saved by a graph with the same nodes
+    def restore(self, state):
+        if state.get('nodes') != self.graph.names:
+            raise ValueError("Saved signal state was taken with different indicators")
+        for node, node_state in zip(self._nodes, state['values']):
+            node.restore(node_state)
+        self.count = state['count']
+        self.price = state['price']
+
+
+# apply_technical_indicators' columns as graph nodes
+TA_COLUMNS = {
+    'price': price(),
+    'SMA': sma(20),
+    'RSI': rsi(14),
+    'MACD': macd(),
+    'MACD_Signal': macd_signal(),
+    'MACD_Diff': macd_diff(),
+    'Bollinger_High': bollinger_high(),
+    'Bollinger_Low': bollinger_low(),
+}
+
+
+# Stream a price series through a SignalGraph and return the largest relative
+# difference from the `ta` library for every column of TA_COLUMNS
+def compare_with_ta(prices):
+    import pandas as pd
+
+    prices = pd.Series(prices, dtype='float64').reset_index(drop=True)
+    expected = pd.DataFrame(indicator_arrays(prices.to_numpy()))
+
+    graph = SignalGraph([], TA_COLUMNS.values())
+    signals = graph.stream()
+    rows = []
+    for value in prices:
+        signals.update(value)
+        rows.append(signals.values())
+    rows = np.asarray(rows)
+    actual = pd.DataFrame({column: rows[:, graph.index[node]] for column, node in TA_COLUMNS.items()})
+
+    errors = {}
+    for column in TA_COLUMNS:
+        scale = 100.0 if column == 'RSI' else prices.abs().clip(lower=1.0)
+        if not (expected[column].isna() == actual[column].isna()).all():
+            errors[column] = float('inf')
+        else:
+            errors[column] = float(((expected[column] - actual[column]).abs() / scale).max())
+    return errors
+
@@ -0,0 +1,290 @@
+import itertools
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import simulate_equity
+from columnar_store import load_historical_bars
+from indicators import indicator_arrays
+from metrics import compute_metrics, curve_metrics
+from scoring import score_columns
+from strategies import STRATEGIES, SignalGraph, create_strategies
+
+# Default configuration, matching the single run in test_using_csv.py
+DEFAULT_PARAMS = {
+    'sma_window': 20,
+    'rsi_window': 14,
+    'rsi_low': 30,
+    'rsi_high': 70,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_sign': 9,
+    'bollinger_window': 20,
+    'bollinger_dev': 2,
+    'buy_threshold': 0.5,
+    'sell_threshold': 0.5,
+    'portion': 0.3,
+    'take_profit_threshold': 0.1,
+    'stop_loss': None,
+    'take_profit': None,
+}
+
+INDICATOR_PARAMS = ['sma_window', 'rsi_window', 'macd_fast', 'macd_slow', 'macd_sign',
+                    'bollinger_window', 'bollinger_dev']
+
+
+# (bar times as epoch ns, close prices) of a symbol's daily bars
+def load_close_prices(symbol, start_date='2021-01-01'):
+    bars = load_historical_bars(symbol, start_date)
+    return bars.index.values.astype('datetime64[ns]').astype(np.int64), bars['close'].to_numpy(dtype=np.float64)
+
+
+# Every combination of the given parameter lists, on top of DEFAULT_PARAMS
+def grid(**space):
+    keys = list(space)
+    return [dict(DEFAULT_PARAMS, **dict(zip(keys, values)))
+            for values in itertools.product(*(space[key] for key in keys))]
+
+
+# n configurations drawn uniformly from the given parameter lists
+def random_sample(n, seed=None, **space):
+    rng = random.Random(seed)
+    return [dict(DEFAULT_PARAMS, **{key: rng.choice(values) for key, values in space.items()})
+            for _ in range(n)]
+
+
+# Indicator columns for a configuration, computed over the whole price array
+# once and cached by their window parameters
+def indicator_columns(prices, params, indicator_cache=None):
+    key = tuple(params[name] for name in INDICATOR_PARAMS)
+    columns = indicator_cache.get(key) if indicator_cache is not None else None
+    if columns is None:
+        columns = indicator_arrays(prices, **{name: params[name] for name in INDICATOR_PARAMS})
+        if indicator_cache is not None:
+            indicator_cache[key] = columns
+    return columns
+
+
+# Simulate one configuration over prices[bounds[0]:bounds[1]] (all of them by
+# default). Indicators come from the full series, so a slice starts warm and
+# only waits out the warm-up bars it actually contains.
+def simulate_config(prices, params, initial_balance=50000, max_precision=8, indicator_cache=None,
+                    bounds=None):
+    columns = indicator_columns(prices, params, indicator_cache)
+    scores = score_columns(columns, params['rsi_low'], params['rsi_high'])
+    first, last = bounds or (0, len(prices))
+    return simulate_equity(
+        prices[first:last], scores[first:last], initial_balance,
+        take_profit_threshold=params['take_profit_threshold'], portion=params['portion'],
+        max_precision=max_precision, buy_threshold=params['buy_threshold'],
+        sell_threshold=params['sell_threshold'], stop_loss=params['stop_loss'],
+        take_profit=params['take_profit'], start=max(0, max(26, params['macd_slow']) - first))
+
+
+# Run one configuration against a price array and return its metrics
+def run_config(prices, params, initial_balance=50000, max_precision=8, indicator_cache=None, times=None,
+               bounds=None):
+    curves, trades = simulate_config(prices, params, initial_balance, max_precision, indicator_cache, bounds)
+    if times is not None and bounds is not None:
+        times = times[bounds[0]:bounds[1]]
+    result = dict(params)
+    result.update(curve_metrics(curves, times))
+    result['trades'] = trades
+    return result
+
+
+# Worker state: views on the parent's shared price and time arrays plus a cache of
+# indicator columns so configurations sharing windows compute them once
+_worker_prices = None
+_worker_times = None
+_worker_memory = None
+_worker_cache = {}
+_worker_options = {}
+
+
+def _init_worker(memory_name, length, has_times, options):
+    global _worker_prices, _worker_times, _worker_memory, _worker_options
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_prices = np.ndarray((length,), dtype=np.float64, buffer=_worker_memory.buf)
+    if has_times:
+        _worker_times = np.ndarray((length,), dtype=np.int64, buffer=_worker_memory.buf, offset=length * 8)
+    _worker_options = options
+
+
+def _run_worker_config(params):
+    return run_config(_worker_prices, params, indicator_cache=_worker_cache, times=_worker_times,
+                      **_worker_options)
+
+
+# Map `function` over `tasks` in a process pool whose workers share one copy
+# of the prices (and bar times, which make the metrics time-correct)
+def _map_shared(function, tasks, prices, times, options, workers, chunksize):
+    has_times = times is not None
+    memory = shared_memory.SharedMemory(create=True, size=max(prices.nbytes * (2 if has_times else 1), 1))
+    try:
+        np.ndarray(prices.shape, dtype=np.float64, buffer=memory.buf)[:] = prices
+        if has_times:
+            np.ndarray(prices.shape, dtype=np.int64, buffer=memory.buf, offset=prices.nbytes)[:] = \
+                np.asarray(times, dtype='datetime64[ns]').astype(np.int64)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(memory.name, len(prices), has_times, options)) as executor:
+            return list(executor.map(function, tasks, chunksize=chunksize))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# Fan configurations out across a process pool and return a results table
+# ranked by `rank_by`
+def sweep(prices, configs, initial_balance=50000, max_precision=8, workers=None,
+          rank_by='sharpe_ratio', chunksize=None, times=None):
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    options = {'initial_balance': initial_balance, 'max_precision': max_precision}
+    # Keep configurations sharing indicator windows on the same worker
+    configs = sorted(configs, key=lambda params: tuple(params[name] for name in INDICATOR_PARAMS))
+    if chunksize is None:
+        chunksize = max(1, len(configs) // (workers * 4))
+
+    results = _map_shared(_run_worker_config, configs, prices, times, options, workers, chunksize)
+    table = pd.DataFrame(results)
+    table = table.sort_values(rank_by, ascending=False, ignore_index=True)
+    table.index.name = 'rank'
+    return table
+
+
+# Rolling (train_start, train_end, test_end) bar ranges: each test slice
+# follows its training slice and the windows advance by `step` bars (the
+# test length by default). The last test slice may be shorter. A step longer
+# than the test slice would leave bars no window trades, so it is rejected.
+def walk_forward_windows(n_bars, train_bars, test_bars, step=None):
+    step = step or test_bars
+    if step > test_bars:
+        raise ValueError(f"step ({step}) must not exceed test_bars ({test_bars}): the test slices would leave gaps")
+    windows = []
+    train_start = 0
+    while train_start + train_bars < n_bars:
+        train_end = train_start + train_bars
+        windows.append((train_start, train_end, min(train_end + test_bars, n_bars)))
+        train_start += step
+    return windows
+
+
+# Pick the best configuration on a window's training slice and run it on the
+# following test slice
+def run_window(prices, window, configs, initial_balance=50000, max_precision=8, indicator_cache=None,
+               times=None, rank_by='sharpe_ratio'):
+    train_start, train_end, test_end = window
+    best = None
+    for params in configs:
+        result = run_config(prices, params, initial_balance, max_precision, indicator_cache, times,
+                            (train_start, train_end))
+        if best is None or result[rank_by] > best[rank_by]:
+            best = result
+    params = {name: best[name] for name in configs[0]}
+    curves, trades = simulate_config(prices, params, initial_balance, max_precision, indicator_cache,
+                                     (train_end, test_end))
+    test = curve_metrics(curves, None if times is None else times[train_end:test_end])
+    test['trades'] = trades
+    return params, best, test, curves['equity'] / initial_balance
+
+
+# The (start, end) bars each window contributes to the stitched out-of-sample
+# curve: its test slice up to where the next window's begins, so overlapping
+# slices (step < test_bars) are counted once and the bars stay in time order
+def walk_forward_segments(windows):
+    ends = [train_end for _, train_end, _ in windows[1:]] + [windows[-1][2]] if windows else []
+    return [(train_end, end) for (_, train_end, _), end in zip(windows, ends)]
+
+
+def _run_worker_window(task):
+    window, configs, rank_by = task
+    return run_window(_worker_prices, window, configs, indicator_cache=_worker_cache, times=_worker_times,
+                      rank_by=rank_by, **_worker_options)
+
+
+# Walk-forward optimization: tune the configurations on each rolling training
+# slice, trade the winner on the next unseen slice and chain the test slices,
+# trimmed by walk_forward_segments, into one out-of-sample equity curve. Windows run in parallel; each worker
+# computes indicators once over the full series and reuses them for every
+# window it evaluates. Returns (per-window table, stitched equity, metrics of
+# the stitched curve).
+def walk_forward(prices, configs, train_bars=120, test_bars=30, step=None, initial_balance=50000,
+                 max_precision=8, workers=None, rank_by='sharpe_ratio', times=None):
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    workers = workers or os.cpu_count() or 1
+    options = {'initial_balance': initial_balance, 'max_precision': max_precision}
+    windows = walk_forward_windows(len(prices), train_bars, test_bars, step)
+    tasks = [(window, configs, rank_by) for window in windows]
+    results = _map_shared(_run_worker_window, tasks, prices, times, options, workers, 1)
+
+    rows = []
+    segments = []
+    time_segments = []
+    scale = initial_balance
+    for (train_start, train_end, test_end), (start, end), (params, train, test, equity) in zip(
+            windows, walk_forward_segments(windows), results):
+        row = {'train_start': train_start, 'train_end': train_end, 'test_end': test_end}
+        row.update({name: params[name] for name in configs[0] if name not in INDICATOR_PARAMS})
+        row.update({f'train_{name}': train[name] for name in (rank_by, 'total_return', 'max_drawdown')})
+        row.update({f'test_{name}': value for name, value in test.items()})
+        rows.append(row)
+        # Each test slice starts flat with the capital the previous one ended on
+        segments.append(equity[:end - start] * scale)
+        scale = segments[-1][-1]
+        if times is not None:
+            time_segments.append(np.asarray(times)[start:end])
+
+    equity = np.concatenate(segments) if segments else np.empty(0)
+    stitched_times = np.concatenate(time_segments) if time_segments else None
+    table = pd.DataFrame(rows)
+    table.index.name = 'window'
+    return table, equity, compute_metrics(equity, stitched_times)
+
+
+# Backtest strategies side by side on one price series: the shared signal
+# graph computes each indicator once and every strategy's scores go through
+# the same single-asset simulation. Returns metrics indexed by strategy.
+def compare_strategies(prices, strategies, times=None, initial_balance=50000, max_precision=8, **options):
+    graph = SignalGraph(strategies)
+    rows = []
+    for name, scores in graph.scores(prices).items():
+        curves, trades = simulate_equity(prices, scores, initial_balance, max_precision=max_precision,
+                                         start=graph.warmup, **options)
+        result = {'strategy': name}
+        result.update(curve_metrics(curves, times))
+        result['trades'] = trades
+        rows.append(result)
+    return pd.DataFrame(rows).set_index('strategy')
+
+
+if __name__ == '__main__':
+    times, prices = load_close_prices('BTC')
+    configs = grid(
+        rsi_low=[25, 30, 35, 40],
+        rsi_high=[60, 65, 70, 75],
+        portion=[0.1, 0.2, 0.3, 0.5],
+        stop_loss=[None, 0.05, 0.1],
+        take_profit=[None, 0.1, 0.2],
+    )
+    if sys.argv[1:] == ['walk-forward']:
+        configs = grid(
+            rsi_low=[25, 30, 35],
+            rsi_high=[65, 70, 75],
+            buy_threshold=[0.5, 0.625],
+            sell_threshold=[0.375, 0.5],
+            portion=[0.1, 0.2, 0.3, 0.5],
+        )
+        table, equity, metrics = walk_forward(prices, configs, times=times)
+        print(table.to_string())
+        print(f"Out-of-sample: {metrics}")
+    elif sys.argv[1:] == ['strategies']:
+        print(compare_strategies(prices, create_strategies(STRATEGIES), times=times).to_string())
+    else:
+        results = sweep(prices, configs, times=times)
+        print(results.head(10).to_string())
@@ -0,0 +1,74 @@
+import numpy as np
+
+from backtest_engine import run_portfolio
+
+
+# Row-by-row version of run_portfolio's rules, one trade at a time as the
+# Backtester does: take-profit liquidation, then sells, then buys in product
+# order, each buy filled only if the cash left covers it
+def _reference_portfolio(prices, scores, cash, take_profit_threshold, portion=0.3, max_precision=8, start=26):
+    n_bars, n_products = prices.shape
+    held = [0.0] * n_products
+    marks = [float('nan')] * n_products
+    seen = [0] * n_products
+    max_value = cash
+    rows = []
+    for i in range(n_bars):
+        tradable = []
+        for j in range(n_products):
+            if not np.isnan(prices[i, j]):
+                marks[j] = prices[i, j]
+                seen[j] += 1
+            tradable.append(not np.isnan(prices[i, j]) and seen[j] > start and not np.isnan(scores[i, j]))
+        value = cash + sum(amount * mark for amount, mark in zip(held, marks) if amount)
+        max_value = max(max_value, value)
+        if value < max_value * (1 - take_profit_threshold) and any(held):
+            for j in range(n_products):
+                if held[j]:
+                    cash += held[j] * marks[j]
+                    rows.append((i, j, 'sell', held[j], cash, 0.0))
+                    held[j] = 0.0
+        amounts = [round(portion * scores[i, j], max_precision) if tradable[j] else 0.0 for j in range(n_products)]
+        for j in range(n_products):
+            if tradable[j] and scores[i, j] < 0.5 and amounts[j] > 0 and held[j] != 0:
+                if held[j] >= amounts[j]:
+                    cash += amounts[j] * prices[i, j]
+                    held[j] -= amounts[j]
+                rows.append((i, j, 'sell', amounts[j], cash, held[j]))
+        for j in range(n_products):
+            if tradable[j] and scores[i, j] > 0.5 and amounts[j] > 0:
+                filled = amounts[j] * prices[i, j] <= cash
+                if filled:
+                    cash -= amounts[j] * prices[i, j]
+                    held[j] += amounts[j]
+                rows.append((i, j, 'buy', amounts[j], cash, held[j], filled))
+    return cash, rows
+
+
+# An expensive product first in line must not starve the cheaper ones after it
+def test_run_portfolio_matches_row_by_row_with_several_wallets():
+    rng = np.random.default_rng(3)
+    n_bars = 300
+    levels = np.array([20000.0, 50.0, 3.0, 900.0])
+    prices = levels * np.exp(np.cumsum(rng.normal(0, 0.03, (n_bars, len(levels))), axis=0))
+    prices[rng.random(prices.shape) < 0.05] = np.nan
+    scores = rng.choice([0.25, 0.375, 0.5, 0.625, 0.75, 0.875], size=prices.shape)
+    product_ids = ['BTC-GBP', 'SOL-GBP', 'ADA-GBP', 'ETH-GBP']
+    times = np.arange(n_bars)
+
+    positions = {}
+    cash, _, curves, history = run_portfolio(times, product_ids, prices, scores, 2000.0, positions, 2000.0, 0.1)
+    expected_cash, rows = _reference_portfolio(prices, scores, 2000.0, 0.1)
+
+    assert len(history['decision']) == len(rows)
+    assert [product_ids.index(p) for p in history['product_id']] == [row[1] for row in rows]
+    assert list(history['decision']) == [row[2] for row in rows]
+    np.testing.assert_allclose(history['trade_amount'], [row[3] for row in rows])
+    np.testing.assert_allclose(history['cash'], [row[4] for row in rows], rtol=1e-12)
+    np.testing.assert_allclose(history['position'], [row[5] for row in rows], rtol=1e-12, atol=1e-12)
+    assert cash == expected_cash
+
+    # Some bar skipped an unaffordable buy and still funded a later product
+    buys = [(row[0], row[6]) for row in rows if row[2] == 'buy']
+    assert any(i == later and not filled and later_filled
+               for (i, filled), (later, later_filled) in zip(buys, buys[1:]))
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+import base_bot2
+from bench import IMPORT_BUDGET, LAZY_MODULES, SUBSCRIBE_BUDGET, import_time, time_to_subscribe
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historical_data_BTC.csv')
+
+
+# Builds bots against the simulator in a scratch directory, closing their
+# executors afterwards
+@pytest.fixture
+def sim_bot(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name, value in {'exchange': 'sim', 'bar_interval': '1d', 'SIM_CSV': CSV_FILE, 'SIM_LATENCY': '0'}.items():
+        monkeypatch.setenv(name, value)
+    bots = []
+
+    def build():
+        bots.append(base_bot2.TradingBot())
+        return bots[-1]
+    yield build
+    for bot in bots:
+        bot.order_executor.close()
+        if bot.state_journal:
+            bot.state_journal.close()
+
+
+# Importing the bot stays within its budget and must not load the heavy
+# optional dependencies; they are imported where they are used. Best of a
+# few runs, so a cold disk cache doesn't fail it.
+def test_import_within_budget():
+    imports = [import_time('base_bot2') for _ in range(3)]
+    seconds, loaded = min(imports)
+    assert loaded == [], f"import base_bot2 loaded {loaded}, expected none of {LAZY_MODULES}"
+    assert seconds <= IMPORT_BUDGET, f"import took {seconds:.3f}s, budget {IMPORT_BUDGET}s"
+
+
+# The entry point builds a bot and subscribes against the simulator within
+# its budget, caching product metadata in a scratch directory
+def test_subscribes_within_budget(tmp_path):
+    subscribes = [time_to_subscribe(cwd=tmp_path) for _ in range(3)]
+    assert None not in subscribes
+    assert min(subscribes) <= SUBSCRIBE_BUDGET, f"first subscription took {min(subscribes):.3f}s"
+    assert os.path.exists(tmp_path / 'data' / 'products-sim.json')
+
+
+# A stop-loss tick sells the whole position even before the indicators have
+# warmed up enough to score
+def test_stop_loss_fires_during_warm_up(sim_bot):
+    bot = sim_bot()
+    bot.exchange.balances['BTC'] = 0.5
+    bot.exchange.last_prices['BTC-GBP'] = 90.0
+    bot.entry_prices['BTC-GBP'] = 100.0
+    bot.on_ticks([(0, 'BTC-GBP', time.time_ns(), 90.0)])
+    assert bot.score_products(['BTC-GBP']) == [None]
+
+    due = bot.dispatcher.take_due()
+    assert due == ['BTC-GBP']
+    bot.order_executor.wait_all(bot.evaluate_dirty_products(due))
+    [order] = bot.exchange.orders.values()
+    assert order['success'] and order['success_response']['side'] == 'SELL'
+    assert order['order_configuration']['market_market_ioc']['base_size'] == '0.5'
+
+
+# A restarted bot replays its entry prices from the journal and, though its
+# indicator snapshot is too old to restore, still stops out the position
+def test_restored_position_keeps_its_stop_loss(sim_bot, monkeypatch, tmp_path):
+    monkeypatch.setenv('state_path', str(tmp_path / 'state.db'))
+    bot = sim_bot()
+    bot.exchange.last_prices['BTC-GBP'] = 100.0
+    bot.on_ticks([(0, 'BTC-GBP', time.time_ns(), 100.0)])
+    bot.order_executor.wait_all([bot.execute_trade('buy', 'BTC-GBP', 50)])
+    deadline = time.monotonic() + 5
+    while bot.entry_prices['BTC-GBP'] is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    entry_price = bot.entry_prices['BTC-GBP']
+    assert entry_price
+    stale = time.time_ns() - 30 * 24 * 3600 * 10 ** 9
+    bot.state_journal.save_snapshots([('BTC-GBP', '1d', stale, bot.indicator_engines['BTC-GBP'].state())])
+    held = bot.exchange.balances['BTC']
+
+    resumed = sim_bot()
+    assert resumed.entry_prices['BTC-GBP'] == entry_price
+    assert resumed.indicator_engines['BTC-GBP'].count == 0
+    resumed.exchange.balances['BTC'] = held
+    price = entry_price * 0.9
+    resumed.exchange.last_prices['BTC-GBP'] = price
+    resumed.on_ticks([(0, 'BTC-GBP', time.time_ns(), price)])
+    resumed.order_executor.wait_all(resumed.evaluate_dirty_products(resumed.dispatcher.take_due()))
+    [order] = resumed.exchange.orders.values()
+    assert order['success'] and order['success_response']['side'] == 'SELL'
+
+
+# Order responses carry no price: a buy's entry price is the last traded
+# price until its fill reports the average price, whichever arrives first
+def test_entry_price_comes_from_the_fill(sim_bot):
+    bot = sim_bot()
+    bot.on_ticks([(0, 'BTC-GBP', time.time_ns(), 100.0)])
+
+    bot.handle_order_result('buy', 'BTC-GBP', 50, {'success': True, 'order_id': 'a'})
+    assert bot.entry_prices['BTC-GBP'] == 100.0
+    bot.apply_fill_price({'order_id': 'a', 'order_side': 'BUY', 'status': 'FILLED', 'avg_price': '100.5'})
+    assert bot.entry_prices['BTC-GBP'] == 100.5
+
+    bot.apply_fill_price({'order_id': 'b', 'order_side': 'BUY', 'status': 'FILLED', 'avg_price': '101.5'})
+    assert bot.entry_prices['BTC-GBP'] == 100.5
+    bot.handle_order_result('buy', 'BTC-GBP', 50, {'success': True, 'order_id': 'b'})
+    assert bot.entry_prices['BTC-GBP'] == 101.5
+    assert not bot.fill_prices and not bot.provisional_entries
+
+
+# At full replay speed the simulator waits for each tick's evaluation, so
+# every replayed daily bar is scored instead of being merged into one batch
+def test_full_speed_replay_evaluates_every_bar(sim_bot, monkeypatch):
+    monkeypatch.setattr(base_bot2, 'EVALUATION_INTERVAL', 0.05)
+    bot = sim_bot()
+    evaluated = []
+    evaluate = bot.dispatcher.evaluate
+
+    def counting_evaluate(product_ids):
+        evaluated.append(bot.indicator_engines['BTC-GBP'].count)
+        return evaluate(product_ids)
+
+    bot.dispatcher.evaluate = counting_evaluate
+    asyncio.run(asyncio.wait_for(base_bot2.run(bot), 60))
+    # One bar closes per replayed day
+    bars = bot.indicator_engines['BTC-GBP'].count
+    assert bot.exchange.finished.is_set() and bars >= 360
+    assert sorted(set(evaluated)) == list(range(1, bars + 1))
+    assert bot.dispatcher.evaluations == len(evaluated)
+
+
+# A sell signal on a coin the account doesn't hold (or holds less than one
+# order of) sends nothing rather than a minimum-size order to be rejected
+def test_sell_signal_without_a_position_sends_nothing(sim_bot):
+    bot = sim_bot()
+    bot.on_ticks([(0, 'BTC-GBP', time.time_ns(), 100.0)])
+    minimum = bot.product_catalog.min_base_size('BTC-GBP')
+    for balance in (0, minimum / 2):
+        assert bot.place_trade('BTC-GBP', 'sell', 'score', 0.2, {'GBP': 1000, 'BTC': balance}) is None
+    assert bot.place_trade('BTC-GBP', 'buy', 'score', 0.8, {'GBP': 0.5}) is None
+    assert bot.order_executor.submitted == 0
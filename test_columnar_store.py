@@ -0,0 +1,43 @@
+import threading
+
+import numpy as np
+
+from columnar_store import ColumnarStore, TickRecorder
+
+
+# Full batches are written by the recorder's writer thread, never by the
+# thread recording ticks, and flush() leaves every tick on disk in order
+def test_tick_recorder_writes_batches_off_the_recording_thread(tmp_path):
+    store = ColumnarStore(str(tmp_path))
+    writers = set()
+    append = store.append
+
+    def recording_append(*args):
+        writers.add(threading.get_ident())
+        append(*args)
+
+    store.append = recording_append
+    recorder = TickRecorder(store, flush_size=100)
+    start = np.datetime64('2024-01-01', 'ns').astype(np.int64)
+    times = start + np.arange(1050) * 1_000_000_000
+    for n, time_ns in enumerate(times.tolist()):
+        recorder.record('BTC-GBP', time_ns, float(n))
+    recorder.flush()
+
+    assert writers and threading.get_ident() not in writers
+    frame = store.load_frame('BTC-GBP', 'ticks')
+    np.testing.assert_array_equal(frame['price'].to_numpy(), np.arange(1050, dtype=np.float64))
+
+
+# CSVs with Alpha Vantage headers ('1. open' ... '5. volume') import as
+# plain bar columns
+def test_import_csv_renames_alpha_vantage_columns(tmp_path):
+    path = tmp_path / 'historical_data_ETH.csv'
+    path.write_text('date,1. open,2. high,3. low,4. close,5. volume\n'
+                    '2021-01-02,11,13,10,12,200\n'
+                    '2021-01-01,10,12,9,11,100\n')
+    store = ColumnarStore(str(tmp_path / 'store'))
+    store.import_csv('ETH', str(path))
+    frame = store.load_frame('ETH', 'bars')
+    np.testing.assert_array_equal(frame['close'].to_numpy(), [11.0, 12.0])
+    np.testing.assert_array_equal(frame['volume'].to_numpy(), [100.0, 200.0])
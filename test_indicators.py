@@ -0,0 +1,16 @@
+import os
+
+import pandas as pd
+
+from indicators import TA_TOLERANCE
+from strategies import TA_COLUMNS, compare_with_ta
+
+CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'historical_data_BTC.csv')
+
+
+# Streaming indicators must match the `ta` library on the recorded BTC
+# history, column by column, within TA_TOLERANCE
+def test_streaming_indicators_match_ta():
+    errors = compare_with_ta(pd.read_csv(CSV_FILE)['close'])
+    assert set(errors) == set(TA_COLUMNS)
+    assert all(error <= TA_TOLERANCE for error in errors.values()), errors
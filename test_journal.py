@@ -0,0 +1,30 @@
+import sqlite3
+import threading
+
+from journal import StateJournal
+
+
+# Fills are queued by the WebSocket thread and written by the journal's
+# writer thread, and close() writes whatever is still queued
+def test_fills_are_written_off_the_calling_thread(tmp_path):
+    path = str(tmp_path / 'state.db')
+    journal = StateJournal(path)
+    writers = set()
+    write = journal._write
+
+    def recording_write(*args):
+        writers.add(threading.get_ident())
+        write(*args)
+
+    journal._write = recording_write
+    for n in range(100):
+        journal.fill({'order_id': f'order-{n}', 'product_id': 'BTC-GBP', 'status': 'FILLED'})
+    journal.flush()
+    assert journal.records == 100
+    assert writers and threading.get_ident() not in writers
+
+    journal.fill({'order_id': 'last', 'product_id': 'BTC-GBP', 'status': 'FILLED'})
+    journal.close()
+    with sqlite3.connect(path) as connection:
+        count, = connection.execute("SELECT COUNT(*) FROM journal WHERE kind = 'fill'").fetchone()
+    assert count == 101
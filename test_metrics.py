@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from metrics import NS_PER_YEAR, compute_metrics
+
+
+def _days(n, step_hours=24):
+    return np.datetime64('2021-01-01', 'ns') + np.arange(n) * np.timedelta64(step_hours, 'h')
+
+
+# The drawdown is measured from the peak before each trough: the later,
+# higher peak does not count against the earlier low
+def test_drawdown_uses_the_peak_before_the_trough():
+    metrics = compute_metrics([100, 50, 200, 180])
+    assert metrics['max_drawdown'] == pytest.approx(50)
+
+
+# Duration is the longest time spent below a previous peak: in bars without
+# times, in days with them, however the bars are spaced
+def test_drawdown_duration():
+    equity = [100, 90, 95, 101, 100, 99, 98, 102]
+    assert compute_metrics(equity)['max_drawdown_duration'] == 3
+    assert compute_metrics(equity, _days(len(equity)))['max_drawdown_duration'] == 3
+    assert compute_metrics(equity, _days(len(equity), step_hours=12))['max_drawdown_duration'] == 1.5
+
+
+# With times, returns are taken on daily closes and annualized by the
+# calendar, so hourly bars of the same daily curve give the same Sharpe
+def test_sharpe_is_annualized_by_time():
+    rng = np.random.default_rng(0)
+    daily = 100 * np.exp(np.cumsum(rng.normal(0.001, 0.02, 200)))
+    returns = np.diff(daily) / daily[:-1]
+    expected = returns.mean() / returns.std(ddof=1)
+
+    assert compute_metrics(daily)['sharpe_ratio'] == pytest.approx(expected * np.sqrt(365))
+    days_per_year = NS_PER_YEAR / (24 * 3600 * 10 ** 9)
+    assert compute_metrics(daily, _days(len(daily)))['sharpe_ratio'] == pytest.approx(expected * np.sqrt(days_per_year))
+
+    hourly = np.repeat(daily, 24) * np.tile(np.append(1 + rng.normal(0, 0.01, 23), 1.0), len(daily))
+    assert compute_metrics(hourly, _days(len(hourly), step_hours=1))['sharpe_ratio'] == \
+        pytest.approx(expected * np.sqrt(days_per_year))
+
+
+# A curve that ends with no equity left still reports a finite exposure
+def test_exposure_with_zero_equity():
+    metrics = compute_metrics([100, 50, 0], invested=[50, 25, 0])
+    assert metrics['exposure'] == pytest.approx(100 / 3)
@@ -0,0 +1,70 @@
+import pytest
+
+from order_executor import OrderExecutor
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type('Response', (), {'status_code': status_code})()
+
+
+def _attempts(error, retries=3):
+    executor = OrderExecutor(retries=retries, retry_backoff=0.001)
+    calls = []
+
+    def place(client_order_id):
+        calls.append(client_order_id)
+        raise error
+
+    try:
+        with pytest.raises(type(error)):
+            executor.submit('BTC-GBP', 'order-1', place).result(timeout=5)
+    finally:
+        executor.close()
+    return len(calls), executor.retried
+
+
+# Rejections fail on the first attempt without using retries
+@pytest.mark.parametrize('error', [HTTPError(400), HTTPError(403), HTTPError(404), ValueError('invalid product')])
+def test_rejections_are_not_retried(error):
+    assert _attempts(error) == (1, 0)
+
+
+@pytest.mark.parametrize('error', [HTTPError(429), HTTPError(503), TimeoutError(), ConnectionResetError()])
+def test_transient_errors_are_retried(error):
+    assert _attempts(error) == (4, 3)
+
+
+def test_a_retried_order_returns_its_response():
+    executor = OrderExecutor(retry_backoff=0.001)
+    failures = [HTTPError(502), TimeoutError()]
+
+    def place(client_order_id):
+        if failures:
+            raise failures.pop(0)
+        return {'success': True, 'client_order_id': client_order_id}
+
+    try:
+        assert executor.submit('BTC-GBP', 'order-1', place).result(timeout=5)['success']
+        assert executor.retried == 2
+    finally:
+        executor.close()
+
+
+# SDK response objects have no .get(); the executor hands back plain dicts
+def test_sdk_responses_are_returned_as_dicts():
+    from coinbase.rest.types.orders_types import CreateOrderResponse
+
+    executor = OrderExecutor()
+
+    def place(client_order_id):
+        return CreateOrderResponse({'success': True, 'order_id': 'abc', 'success_response': {
+            'order_id': 'abc', 'product_id': 'BTC-GBP', 'side': 'BUY', 'client_order_id': client_order_id}})
+
+    try:
+        order = executor.submit('BTC-GBP', 'order-1', place).result(timeout=5)
+    finally:
+        executor.close()
+    assert order.get('success')
+    assert (order.get('success_response') or {}).get('order_id') == 'abc'
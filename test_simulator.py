@@ -0,0 +1,47 @@
+import json
+import threading
+import time
+
+from simulator import SimulatedExchange
+
+
+# Orders placed from other threads while the replay runs: every message,
+# fills included, must come from one thread with strictly increasing sequence
+# numbers and no overlapping callbacks
+def test_fills_are_delivered_on_the_replay_thread():
+    exchange = SimulatedExchange(csv_files=['historical_data_BTC.csv'], speed=3e7, latency=0.002)
+    received = []
+    active = []
+
+    def on_message(message):
+        active.append(1)
+        assert len(active) == 1, "callbacks overlapped"
+        time.sleep(0.0005)
+        received.append((threading.get_ident(), json.loads(message)))
+        active.pop()
+
+    client = exchange.ws_client_factory(on_message=on_message)
+    client.open()
+    client.subscribe(exchange.product_ids, ['ticker', 'heartbeats', 'user'])
+    while not exchange.last_prices:
+        time.sleep(0.001)
+
+    def trade(worker):
+        for n in range(10):
+            exchange.rest_client.market_order_buy(f'order_{worker}_{n}', exchange.product_ids[0], '1')
+
+    traders = [threading.Thread(target=trade, args=(worker,)) for worker in range(3)]
+    for trader in traders:
+        trader.start()
+    for trader in traders:
+        trader.join()
+    assert exchange.finished.wait(10)
+    deadline = time.time() + 5
+    while sum(message['channel'] == 'user' for _, message in received) < 30 and time.time() < deadline:
+        time.sleep(0.01)
+    client.close()
+
+    assert len({thread for thread, _ in received}) == 1
+    assert [message['sequence_num'] for _, message in received] == list(range(len(received)))
+    assert sum(message['channel'] == 'user' for _, message in received) == 30
+    assert sum(message['channel'] == 'ticker' for _, message in received) == exchange.ticks_emitted
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from strategies import ClassicStrategy, RsiMacdStrategy, SignalGraph, Strategy
+
+
+def _prices(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+# A strategy missing inputs or score fails when it is created, not on its
+# first bar
+def test_incomplete_strategy_fails_on_creation():
+    class NoScore(Strategy):
+        @property
+        def inputs(self):
+            return {}
+
+    class NoInputs(Strategy):
+        def score(self, values):
+            return 0.5
+
+    for strategy in (Strategy, NoScore, NoInputs):
+        with pytest.raises(TypeError):
+            strategy()
+
+
+# Streaming the graph bar by bar scores every strategy as the whole-series
+# computation does
+def test_streaming_matches_series():
+    prices = _prices()
+    graph = SignalGraph([ClassicStrategy(), RsiMacdStrategy()])
+    expected = graph.scores(prices)
+    signals = graph.stream()
+    for i, price in enumerate(prices):
+        signals.update(price)
+        for name, score in signals.scores().items():
+            assert score == pytest.approx(expected[name][i], abs=1e-12)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from sweep import grid, run_window, walk_forward, walk_forward_segments, walk_forward_windows
+
+
+def _prices(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+def _times(n):
+    return np.datetime64('2021-01-01', 'ns') + np.arange(n) * np.timedelta64(1, 'D')
+
+
+# Overlapping windows (step < test_bars) stitch each bar once, in time order
+@pytest.mark.parametrize('step', [None, 10])
+def test_walk_forward_times_match_equity(step):
+    prices = _prices()
+    times = _times(len(prices))
+    configs = grid(rsi_low=[25, 30], rsi_high=[70])
+    table, equity, metrics = walk_forward(prices, configs, train_bars=120, test_bars=30, step=step, workers=2,
+                                          times=times)
+    windows = walk_forward_windows(len(prices), 120, 30, step)
+    segments = walk_forward_segments(windows)
+    stitched_times = np.concatenate([times[start:end] for start, end in segments])
+    assert len(table) == len(windows)
+    assert len(equity) == len(stitched_times) == len(prices) - 120
+    assert np.all(np.diff(stitched_times) > np.timedelta64(0))
+    assert np.isfinite(metrics['total_return'])
+
+
+# The stitched curve chains each window's own test equity, and trimming
+# overlapping slices gives the same curve as windows that never overlapped
+def test_walk_forward_equity_values():
+    prices = _prices()
+    configs = grid(rsi_low=[25, 30], rsi_high=[65, 70])
+    _, equity, _ = walk_forward(prices, configs, train_bars=120, test_bars=10, workers=2)
+
+    expected = []
+    scale = 50000
+    for window in walk_forward_windows(len(prices), 120, 10):
+        curve = run_window(prices, window, configs)[3] * scale
+        expected.append(curve)
+        scale = curve[-1]
+    np.testing.assert_allclose(equity, np.concatenate(expected), rtol=1e-12)
+
+    _, overlapping, _ = walk_forward(prices, configs, train_bars=120, test_bars=30, step=10, workers=2)
+    np.testing.assert_allclose(overlapping, equity, rtol=1e-12)
+
+
+# A step past the test slice would leave bars out of the curve
+def test_walk_forward_rejects_gaps():
+    with pytest.raises(ValueError):
+        walk_forward_windows(400, 120, 30, step=50)
@@ -1,3 +1,4 @@
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 import ta
@@ -6,18 +7,20 @@ import numpy as np
 import ta.momentum
 import ta.trend
 import ta.volatility
+from backtest_engine import align_frames, concat_histories, run_portfolio, run_single_asset
+from columnar_store import ColumnarStore, load_historical_bars, load_tick_bars
+from metrics import curve_metrics
+from scoring import score_frame, score_signals
 
 def fetch_historical_data_from_csv(symbol, start_date='2021-01-01'):
-    file_path = f'historical_data_{symbol}.csv'
-    data = pd.read_csv(file_path, index_col='date', parse_dates=True)
-    data = data[start_date:]
-    data.rename(columns={
-        '1. open': 'open',
-        '2. high': 'high',
-        '3. low': 'low',
-        '4. close': 'close',
-        '5. volume': 'volume'
-    }, inplace=True)
+    # Memory-mapped from the columnar store; the CSV is only parsed on first use
+    data = load_historical_bars(symbol, start_date)
+    data['price'] = data['close']
+    return data
+
+# Bars built from ticks the live bot recorded, e.g. fetch_recorded_data('BTC-GBP', '1h')
+def fetch_recorded_data(product_id, freq='1D', start_date='2021-01-01'):
+    data = load_tick_bars(product_id, freq, start_date)
     data['price'] = data['close']
     return data
 
@@ -29,12 +32,18 @@ class Backtester:
         'XTZ': 6
     }
 
-    def __init__(self, initial_balance, take_profit_threshold=0.5):
+    def __init__(self, initial_balance, take_profit_threshold=0.5, vectorized=False):
         self.initial_balance = initial_balance
         self.cash = initial_balance
         self.positions = {}
-        self.history = []
+        # Vectorized mode records history as a dict of column arrays
+        self.vectorized = vectorized
+        self.history = None if vectorized else []
         self.max_portfolio_value = initial_balance
+        # Per-bar portfolio value, set by backtest_portfolio
+        self.equity = None
+        # Per-bar equity, invested and traded value arrays, set by backtest_portfolio
+        self.curves = None
         self.take_profit_threshold = take_profit_threshold
         print(f"Initialized Backtester with balance: {self.cash}")
 
@@ -50,26 +59,10 @@ class Backtester:
         df['Bollinger_Low'] = bollinger.bollinger_lband()
         return df
 
+    # Same kernel as the vectorized backtests and the live bot, on one row
     def calculate_performance_score(self, row):
-        score = 0
-        if row['RSI'] < 30:
-            score += 1
-        elif row['RSI'] > 70:
-            score -= 1
-        if row['MACD_Diff'] > 0:
-            score += 1
-        elif row['MACD_Diff'] < 0:
-            score -= 1
-        if row['price'] < row['Bollinger_Low']:
-            score += 1
-        elif row['price'] > row['Bollinger_High']:
-            score -= 1
-        if row['price'] > row['SMA']:
-            score += 1
-        elif row['price'] < row['SMA']:
-            score -= 1
-        normalized_score = (score + 4) / 8
-        return normalized_score
+        return float(score_signals(row['price'], row['RSI'], row['MACD_Diff'],
+                                   row['Bollinger_Low'], row['Bollinger_High'], row['SMA']))
 
     def determine_trade_amount(self, performance_score, balance, product_id, max_precision=8, portion=0.3):
         allocated_balance = balance * portion
@@ -106,6 +99,9 @@ class Backtester:
         return self.cash + positions_value
 
     def backtest(self, df, product_id):
+        if self.vectorized:
+            return self.backtest_vectorized(df, product_id)
+
         df = self.apply_technical_indicators(df)
         if len(df) < 26:
             return self.history
@@ -133,37 +129,67 @@ class Backtester:
 
         return self.history
 
-# Example usage
-available_wallets = ['BTC']
-historical_data = {product_id: fetch_historical_data_from_csv(product_id) for product_id in available_wallets}
-
-backtester = Backtester(initial_balance=50000, take_profit_threshold=0.1)
-backtest_results = {}
-for product_id, df in historical_data.items():
-    history = backtester.backtest(df, product_id)
-    backtest_results[product_id] = history
-
-# Aggregate results and plot
-all_histories = [item for sublist in backtest_results.values() for item in sublist]
-history_df = pd.DataFrame(all_histories)
-
-if 'cash' not in history_df.columns:
-    raise KeyError("'cash' column not found in history DataFrame.")
-
-history_df['portfolio_value'] = history_df.apply(lambda row: sum([amount * row['price'] for amount in row['positions'].values()]) + row['cash'], axis=1)
-
-total_return = (history_df['portfolio_value'].iloc[-1] - history_df['portfolio_value'].iloc[0]) / history_df['portfolio_value'].iloc[0] * 100
-max_drawdown = (history_df['portfolio_value'].max() - history_df['portfolio_value'].min()) / history_df['portfolio_value'].max() * 100
+    # Same trading rules as backtest, with the score column computed for the
+    # whole frame at once and the trade loop run over plain arrays
+    def backtest_vectorized(self, df, product_id):
+        df = self.apply_technical_indicators(df)
+        if len(df) < 26:
+            return self.history
 
-daily_returns = history_df['portfolio_value'].pct_change().dropna()
-mean_daily_return = daily_returns.mean()
-std_daily_return = daily_returns.std()
+        base_currency = product_id.split('-')[0]
+        self.cash, self.max_portfolio_value, history = run_single_asset(
+            df.index.to_numpy(), df['price'].to_numpy(dtype=np.float64), score_frame(df),
+            product_id, self.cash, self.positions, self.max_portfolio_value,
+            self.take_profit_threshold, portion=0.3,
+            max_precision=self.max_precisions.get(base_currency, 6))
+        self.history = concat_histories(self.history, history)
+        return self.history
 
-sharpe_ratio = (mean_daily_return / std_daily_return) * np.sqrt(252) if std_daily_return != 0 else 0
+    # Backtest every product together on one aligned time axis against a
+    # shared cash ledger, marking each position to its own price
+    def backtest_portfolio(self, historical_data):
+        frames = {}
+        for product_id, df in historical_data.items():
+            df = self.apply_technical_indicators(df)
+            df['score'] = score_frame(df)
+            frames[product_id] = df
+        times, product_ids, prices = align_frames(frames)
+        _, _, scores = align_frames(frames, 'score')
+        precisions = [self.max_precisions.get(product_id.split('-')[0], 6) for product_id in product_ids]
+
+        self.cash, self.max_portfolio_value, self.curves, history = run_portfolio(
+            times, product_ids, prices, scores, self.cash, self.positions, self.max_portfolio_value,
+            self.take_profit_threshold, portion=0.3, max_precision=precisions)
+        self.equity = pd.Series(self.curves['equity'], index=times, name='portfolio_value')
+        self.history = concat_histories(self.history if self.vectorized else None, history)
+        return self.history
 
-print(f"Total Return: {total_return:.2f}%")
-print(f"Max Drawdown: {max_drawdown:.2f}%")
-print(f"Sharpe Ratio: {sharpe_ratio:.2f}")
+# Example usage
+available_wallets = [
+    'BTC', 'ETH', 'LTC', 'BCH', 'ADA', 'LINK', 'DOT', 'DOGE',
+    'UNI', 'SOL', 'SHIB', 'AAVE', 'ALGO', 'ATOM', 'FIL', 'XTZ'
+]
+# Only products with a historical_data_{symbol}.csv (or already imported) are backtested
+store = ColumnarStore()
+historical_data = {product_id: fetch_historical_data_from_csv(product_id) for product_id in available_wallets
+                   if store.has(product_id, 'bars') or os.path.exists(f'historical_data_{product_id}.csv')}
+
+backtester = Backtester(initial_balance=50000, take_profit_threshold=0.1, vectorized=True)
+backtester.backtest_portfolio(historical_data)
+
+# Aggregate results and plot; metrics use the per-bar portfolio value, which
+# marks every position to its own price
+trades_df = pd.DataFrame(backtester.history)
+history_df = backtester.equity.rename_axis('time').reset_index()
+
+metrics = curve_metrics(backtester.curves, backtester.equity.index)
+
+print(f"Total Return: {metrics['total_return']:.2f}%")
+print(f"Max Drawdown: {metrics['max_drawdown']:.2f}% over {metrics['max_drawdown_duration']:.0f} days")
+print(f"Sharpe Ratio: {metrics['sharpe_ratio']:.2f}")
+print(f"Sortino Ratio: {metrics['sortino_ratio']:.2f}")
+print(f"Calmar Ratio: {metrics['calmar_ratio']:.2f}")
+print(f"Exposure: {metrics['exposure']:.2f}%, Turnover: {metrics['turnover']:.2f}x per year")
 
 history_df.plot(x='time', y='portfolio_value', title='Portfolio Value Over Time')
 plt.show()
\ No newline at end of file
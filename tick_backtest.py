@@ -0,0 +1,439 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from bars import INTERVALS
+from dispatcher import DecisionDebouncer
+from metrics import curve_metrics
+from products import ProductCatalog
+from simulator import DEFAULT_FEE_RATE, load_ticks
+from strategies import STRATEGIES, SignalGraph, create_strategies
+
+# The live bot's rules (base_bot2.py)
+STOP_LOSS_PERCENTAGE = 0.05
+TAKE_PROFIT_PERCENTAGE = 0.1
+PORTION = 0.3
+
+# Full bid/ask spread as a fraction of the ticker price
+DEFAULT_SPREAD = 0.001
+
+# Columns of the order log, in order. Sizes are in quote currency for buys
+# and base currency for sells, as execute_trade sends them.
+ORDER_COLUMNS = ['time', 'product_id', 'side', 'reason', 'size', 'filled', 'quantity', 'price', 'fees', 'status']
+
+# Initial capacity of an EventQueue; it doubles when full
+QUEUE_CAPACITY = 1024
+
+# Ticks scanned per step when looking for a stop-loss/take-profit crossing
+SCAN_CHUNK = 65536
+
+NO_EVENT = np.iinfo(np.int64).max
+
+
+# FIFO of (time_ns, ref) events in preallocated arrays, ref indexing the
+# caller's own event records. Events are pushed in time order, which holds for
+# order fills and acknowledgements since every order has the same latency,
+# so a cursor replaces a heap.
+class EventQueue:
+    def __init__(self, capacity=QUEUE_CAPACITY):
+        self.times = np.empty(capacity, np.int64)
+        self.refs = np.empty(capacity, np.int64)
+        self.head = 0
+        self.tail = 0
+
+    # A queue holding already sorted events
+    @classmethod
+    def of(cls, times, refs):
+        queue = cls(0)
+        queue.times = np.asarray(times, dtype=np.int64)
+        queue.refs = np.asarray(refs, dtype=np.int64)
+        queue.tail = len(queue.times)
+        return queue
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def push(self, time_ns, ref):
+        if self.tail == len(self.times):
+            self._grow()
+        self.times[self.tail] = time_ns
+        self.refs[self.tail] = ref
+        self.tail += 1
+
+    def _grow(self):
+        size = self.tail - self.head
+        times = np.empty(max(2 * size, QUEUE_CAPACITY), np.int64)
+        refs = np.empty(len(times), np.int64)
+        times[:size] = self.times[self.head:self.tail]
+        refs[:size] = self.refs[self.head:self.tail]
+        self.times, self.refs, self.head, self.tail = times, refs, 0, size
+
+    # Time of the next event, or NO_EVENT when empty
+    def peek(self):
+        return int(self.times[self.head]) if self.head < self.tail else NO_EVENT
+
+    def pop(self):
+        ref = int(self.refs[self.head])
+        self.head += 1
+        return ref
+
+
+# Event-driven replay of the live bot over recorded ticks (the prices
+# on_message receives), for one quote currency. Ticks close bars of
+# `interval` as BarAggregator does, and each closed bar is scored by the
+# strategy and evaluated like evaluate_dirty_products: decide_trades rules,
+# the same DecisionDebouncer, and the live buy/sell sizing. Orders reach the
+# exchange latency/2 after the decision and are acknowledged latency/2
+# later, when the entry price is set. Market orders fill at the last tick
+# plus half the spread and slippage, pay the taker fee, and with `depth`
+# (quote currency available at the touch) fill at most that much, the rest
+# cancelled as an IOC order would be. Stop-loss and take-profit are checked
+# on every tick of a product with an entry price.
+#
+# Only events run in Python: bars, orders, and ticks that cross an exit
+# threshold. Bars are built and scored up front with NumPy, and the ticks in
+# between are scanned for crossings in vectorized chunks.
+class TickBacktester:
+    def __init__(self, product_ids, times, slots, prices, strategy='classic', interval='1m', quote_currency='GBP',
+                 quote_balance=1000, fee_rate=DEFAULT_FEE_RATE, spread=DEFAULT_SPREAD, slippage=0.0,
+                 latency=0.05, depth=None, stop_loss=STOP_LOSS_PERCENTAGE, take_profit=TAKE_PROFIT_PERCENTAGE,
+                 portion=PORTION, cooldown=60, min_interval=5, catalog=None):
+        self.product_ids = list(product_ids)
+        self.times = np.asarray(times, dtype=np.int64)
+        slots = np.asarray(slots)
+        prices = np.asarray(prices, dtype=np.float64)
+        self.strategy = create_strategies([strategy])[0] if isinstance(strategy, str) else strategy
+        self.interval_ns = INTERVALS[interval]
+        self.quote_currency = quote_currency
+        self.initial_balance = float(quote_balance)
+        self.fee_rate = fee_rate
+        self.spread = spread
+        self.slippage = slippage
+        self.latency_ns = int(latency * 1e9)
+        self.depth = depth
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.portion = portion
+        self.catalog = catalog or ProductCatalog({})
+        self.debouncer = DecisionDebouncer(cooldown, min_interval)
+
+        # Each product's ticks as contiguous views of one slot-sorted copy
+        order = np.argsort(slots, kind='stable')
+        bounds = np.searchsorted(slots[order], np.arange(len(self.product_ids) + 1))
+        product_times, product_prices = self.times[order], prices[order]
+        self.product_times = [product_times[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        self.product_prices = [product_prices[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+    @classmethod
+    def from_files(cls, csv_files=(), recorded_products=(), quote_currency='GBP', start_date=None, end_date=None,
+                   store=None, **options):
+        product_ids, times, slots, prices = load_ticks(csv_files, recorded_products, quote_currency,
+                                                       start_date, end_date, store)
+        return cls(product_ids, times, slots, prices, quote_currency=quote_currency, **options)
+
+    # Closed bars of one product as BarAggregator emits them (empty intervals
+    # as flat bars at the last close), as (bar closes, index of the merged
+    # tick that closes each bar, or len(times) if none does)
+    def _bars(self, slot):
+        times, prices = self.product_times[slot], self.product_prices[slot]
+        ids = times // self.interval_ns
+        last = np.flatnonzero(np.append(ids[1:] != ids[:-1], True))
+        first = ids[0]
+        closes = np.full(ids[-1] - first + 1, np.nan)
+        closes[ids[last] - first] = prices[last]
+        filled = np.where(np.isnan(closes), 0, np.arange(len(closes)))
+        closes = closes[np.maximum.accumulate(filled)]
+        ends = (first + 1 + np.arange(len(closes))) * self.interval_ns
+        return closes, np.searchsorted(self.times, ends)
+
+    # Bar evaluations of every product in time order, as (times, slots,
+    # scores). A tick closing several bars of a product triggers one
+    # evaluation on the latest, as the dispatcher coalesces them, and
+    # nothing is evaluated before the strategy's warm-up.
+    def _bar_evaluations(self):
+        graph = SignalGraph([self.strategy])
+        times, slots, scores = [], [], []
+        for slot in range(len(self.product_ids)):
+            if not len(self.product_times[slot]):
+                continue
+            closes, closed_by = self._bars(slot)
+            keep = np.append(closed_by[1:] != closed_by[:-1], True)
+            keep &= (closed_by < len(self.times)) & (np.arange(1, len(closes) + 1) >= graph.warmup)
+            times.append(self.times[closed_by[keep]])
+            slots.append(np.full(np.count_nonzero(keep), slot))
+            scores.append(graph.scores(closes)[self.strategy.name][keep])
+        if not times:
+            return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+        times, slots, scores = np.concatenate(times), np.concatenate(slots), np.concatenate(scores)
+        order = np.lexsort((slots, times))
+        return times[order], slots[order], scores[order]
+
+    def _last_price(self, slot, time_ns):
+        index = self.product_times[slot].searchsorted(time_ns, side='right') - 1
+        return float(self.product_prices[slot][index]) if index >= 0 else None
+
+    def _thresholds(self, entry):
+        low = entry * (1 - self.stop_loss) if self.stop_loss is not None else -math.inf
+        high = entry * (1 + self.take_profit) if self.take_profit is not None else math.inf
+        return low, high
+
+    # Index of the first tick of `slot` at or before `horizon` that crosses
+    # its exit thresholds, or -1 after moving the cursor past them all. A hit
+    # is kept until the cursor, resume point or entry price changes.
+    def _crossing(self, slot, horizon):
+        times = self.product_times[slot]
+        hit = self._hits[slot]
+        if hit is not None:
+            return hit if times[hit] <= horizon else -1
+        start = max(self._cursor[slot], self._resume[slot])
+        stop = int(times.searchsorted(horizon, side='right'))
+        low, high = self._thresholds(self._entry[slot])
+        prices = self.product_prices[slot]
+        for chunk in range(start, stop, SCAN_CHUNK):
+            window = prices[chunk:min(chunk + SCAN_CHUNK, stop)]
+            hits = np.flatnonzero((window <= low) | (window >= high))
+            if len(hits):
+                self._hits[slot] = chunk + int(hits[0])
+                return self._hits[slot]
+        self._cursor[slot] = max(start, stop)
+        return -1
+
+    # decide_trades + DecisionDebouncer + place_trade for one product
+    def _evaluate(self, slot, now, price, score):
+        self._evaluations += 1
+        product_id = self.product_ids[slot]
+        seconds = now / 1e9
+        decisions = []
+        entry = self._entry.get(slot)
+        if entry:
+            low, high = self._thresholds(entry)
+            if price <= low:
+                decisions.append(('sell', 'stop-loss'))
+            elif price >= high:
+                decisions.append(('sell', 'take-profit'))
+        if score > 0.5:
+            decisions.append(('buy', 'score'))
+        elif score < 0.5:
+            decisions.append(('sell', 'score'))
+
+        fired = [(side, reason) for side, reason in decisions
+                 if self.debouncer.allow(product_id, side, reason, now=seconds)]
+        # Sized from one balance snapshot, as evaluate_dirty_products does
+        quote_balance, held = self._cash, self._held[slot]
+        for side, reason in fired:
+            if side == 'buy':
+                size = round(quote_balance * self.portion * score, self.catalog.buy_precision(product_id))
+                size = max(size, self.catalog.min_quote_size(product_id))
+            else:
+                size = round(held * self.portion * score, self.catalog.sell_precision(product_id))
+                size = max(size, self.catalog.min_base_size(product_id))
+            if size > 0:
+                self._submit(slot, side, reason, size, now)
+
+        # No exit can fire again before the debouncer releases it, so the
+        # tick scan resumes there
+        self._hits[slot] = None
+        if entry:
+            reasons = [reason for reason, level in (('stop-loss', self.stop_loss), ('take-profit', self.take_profit))
+                       if level is not None]
+            releases = [self.debouncer.release_time(product_id, 'sell', reason) for reason in reasons]
+            if score != 0.5:
+                releases.append(self.debouncer.release_time(product_id, 'buy' if score > 0.5 else 'sell'))
+            resume = math.ceil(max(min(releases), seconds) * 1e9) if releases else NO_EVENT
+            self._resume[slot] = int(self.product_times[slot].searchsorted(resume))
+
+    def _submit(self, slot, side, reason, size, now):
+        ref = len(self._orders)
+        self._orders.append([now, slot, side, reason, size, 0.0, 0.0, math.nan, 0.0, 'PENDING'])
+        self._fills.push(now + self.latency_ns // 2, ref)
+        self._acks.push(now + self.latency_ns, ref)
+
+    # The exchange side of a market order, as SimulatedExchange._fill
+    def _fill(self, ref, now):
+        order = self._orders[ref]
+        slot, side, size = order[1], order[2], order[4]
+        price = self._last_price(slot, now)
+        if price is None:
+            order[9] = 'UNKNOWN_PRODUCT_PRICE'
+            return
+        half_spread = self.spread / 2
+        if side == 'buy':
+            if size > self._cash:
+                order[9] = 'INSUFFICIENT_FUND'
+                return
+            fill_price = price * (1 + half_spread) * (1 + self.slippage)
+            filled = size if self.depth is None else min(size, self.depth)
+            fees = filled * self.fee_rate
+            quantity = (filled - fees) / fill_price
+            value = filled
+            self._cash -= filled
+            self._held[slot] += quantity
+        else:
+            if size > self._held[slot]:
+                order[9] = 'INSUFFICIENT_FUND'
+                return
+            fill_price = price * (1 - half_spread) * (1 - self.slippage)
+            filled = quantity = size if self.depth is None else min(size, self.depth / fill_price)
+            value = quantity * fill_price
+            fees = value * self.fee_rate
+            self._cash += value - fees
+            self._held[slot] -= quantity
+        order[5:10] = [filled, quantity, fill_price, fees, 'FILLED' if filled == size else 'PARTIALLY_FILLED']
+        self._balance_log.append((now, slot, self._cash, self._held[slot], value))
+
+    # The bot learns the result, as handle_order_result
+    def _ack(self, ref, now):
+        _, slot, side, _, _, filled, _, fill_price, _, _ = self._orders[ref]
+        if not filled:
+            return
+        if side == 'buy':
+            self._entry[slot] = fill_price
+            # Exits are checked on ticks arriving from now on
+            self._cursor[slot] = int(self.product_times[slot].searchsorted(now, side='right'))
+            self._hits[slot] = None
+        else:
+            self._entry.pop(slot, None)
+
+    def run(self):
+        started = time.perf_counter()
+        n_products = len(self.product_ids)
+        self._cash = self.initial_balance
+        self._held = [0.0] * n_products
+        self._entry = {}
+        self._cursor = [0] * n_products
+        self._resume = [0] * n_products
+        self._hits = [None] * n_products
+        self._score = [math.nan] * n_products
+        self._evaluated = [None] * n_products
+        self._orders = []
+        self._balance_log = []
+        self._evaluations = 0
+        self._fills = EventQueue()
+        self._acks = EventQueue()
+        bar_times, bar_slots, bar_scores = self._bar_evaluations()
+        bars = EventQueue.of(bar_times, np.arange(len(bar_times)))
+        bar_slots, bar_scores = bar_slots.tolist(), bar_scores.tolist()
+
+        while True:
+            fill_time, ack_time, bar_time = self._fills.peek(), self._acks.peek(), bars.peek()
+            horizon = min(fill_time, ack_time, bar_time)
+            exit_time, exit_slot, exit_index = NO_EVENT, None, None
+            for slot in list(self._entry):
+                index = self._crossing(slot, horizon)
+                if index >= 0 and self.product_times[slot][index] < exit_time:
+                    exit_time, exit_slot, exit_index = int(self.product_times[slot][index]), slot, index
+            if horizon == NO_EVENT and exit_slot is None:
+                break
+
+            # Same-time events: fills, then acknowledgements, then bars, then exits
+            if fill_time == horizon and fill_time <= exit_time:
+                self._fill(self._fills.pop(), fill_time)
+            elif ack_time == horizon and ack_time <= exit_time:
+                self._ack(self._acks.pop(), ack_time)
+            elif bar_time == horizon and bar_time <= exit_time:
+                ref = bars.pop()
+                slot = bar_slots[ref]
+                self._score[slot] = bar_scores[ref]
+                self._evaluated[slot] = bar_time
+                self._evaluate(slot, bar_time, self._last_price(slot, bar_time), bar_scores[ref])
+            else:
+                self._cursor[exit_slot] = exit_index + 1
+                self._hits[exit_slot] = None
+                # A bar closed by the same tick already ran this evaluation
+                if self._evaluated[exit_slot] != exit_time:
+                    self._evaluated[exit_slot] = exit_time
+                    self._evaluate(exit_slot, exit_time, float(self.product_prices[exit_slot][exit_index]),
+                                   self._score[exit_slot])
+
+        seconds = time.perf_counter() - started
+        return self._results(seconds, len(bar_times))
+
+    # Portfolio value, value held in assets and value traded at every bar
+    # boundary, from the balances after each fill
+    def _curves(self):
+        start = (self.times[0] // self.interval_ns + 1) * self.interval_ns
+        sample_times = np.arange(start, self.times[-1] + self.interval_ns, self.interval_ns)
+        fill_times, fill_slots, cash_after, held_after, values = (
+            np.array(column, dtype=dtype) for column, dtype in zip(zip(*self._balance_log) if self._balance_log
+                                                                   else ([],) * 5,
+                                                                   (np.int64, np.int64, float, float, float)))
+        after = np.searchsorted(fill_times, sample_times, side='right')
+        cash = np.append(self.initial_balance, cash_after)[after]
+        invested = np.zeros(len(sample_times))
+        for slot in range(len(self.product_ids)):
+            if not len(self.product_times[slot]):
+                continue
+            mine = fill_slots == slot
+            held = np.append(0.0, held_after[mine])[np.searchsorted(fill_times[mine], sample_times, side='right')]
+            marks = np.searchsorted(self.product_times[slot], sample_times, side='right') - 1
+            invested += np.where(marks >= 0, held * self.product_prices[slot][np.maximum(marks, 0)], 0.0)
+        value = np.cumsum(np.append(0.0, values))
+        traded = np.diff(np.append(0.0, value[after]))
+        return sample_times, {'equity': cash + invested, 'invested': invested, 'traded': traded}
+
+    def _results(self, seconds, bars):
+        orders = self._orders
+        history = {column: [order[i] for order in orders] for i, column in enumerate(ORDER_COLUMNS)}
+        history['time'] = np.asarray(history['time'], dtype=np.int64)
+        history['product_id'] = np.asarray([self.product_ids[slot] for slot in history['product_id']], dtype=object)
+        for column in ('side', 'reason', 'status'):
+            history[column] = np.asarray(history[column], dtype=object)
+        for column in ('size', 'filled', 'quantity', 'price', 'fees'):
+            history[column] = np.asarray(history[column], dtype=np.float64)
+
+        times, curves = self._curves() if len(self.times) else (np.empty(0, np.int64), None)
+        balances = {self.quote_currency: self._cash}
+        for product_id, held in zip(self.product_ids, self._held):
+            balances[product_id.split('-')[0]] = held
+        status = history['status']
+        stats = {
+            'ticks': len(self.times),
+            'bars': bars,
+            'evaluations': self._evaluations,
+            'suppressed': self.debouncer.suppressed,
+            'orders': len(orders),
+            'filled': int(np.count_nonzero(status == 'FILLED')),
+            'partially_filled': int(np.count_nonzero(status == 'PARTIALLY_FILLED')),
+            'rejected': int(np.count_nonzero((status != 'FILLED') & (status != 'PARTIALLY_FILLED'))),
+            'fees': float(history['fees'].sum()),
+            'seconds': seconds,
+            'ticks_per_second': len(self.times) / seconds if seconds else None,
+        }
+        return {
+            'orders': history,
+            'times': times,
+            'curves': curves,
+            'metrics': curve_metrics(curves, times) if curves is not None else {},
+            'balances': balances,
+            'stats': stats,
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded ticks through the live trading rules')
+    parser.add_argument('csv_files', nargs='*', help='historical_data_<SYMBOL>.csv files to replay')
+    parser.add_argument('--products', nargs='*', default=(), help='product ids recorded in the columnar store')
+    parser.add_argument('--quote-currency', default='GBP')
+    parser.add_argument('--interval', default='1m', choices=list(INTERVALS))
+    parser.add_argument('--strategy', default='classic', choices=list(STRATEGIES))
+    parser.add_argument('--balance', type=float, default=1000)
+    parser.add_argument('--fee-rate', type=float, default=DEFAULT_FEE_RATE)
+    parser.add_argument('--spread', type=float, default=DEFAULT_SPREAD)
+    parser.add_argument('--slippage', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.05, help='order acknowledgement latency in seconds')
+    parser.add_argument('--depth', type=float, default=None, help='quote currency fillable per order')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    args = parser.parse_args()
+
+    backtester = TickBacktester.from_files(
+        args.csv_files or ([] if args.products else ['historical_data_BTC.csv']), args.products,
+        args.quote_currency, args.start, args.end, strategy=args.strategy, interval=args.interval,
+        quote_balance=args.balance, fee_rate=args.fee_rate, spread=args.spread, slippage=args.slippage,
+        latency=args.latency, depth=args.depth)
+    results = backtester.run()
+    print(f"Stats: {results['stats']}")
+    print(f"Metrics: {results['metrics']}")
+    print(f"Balances: {results['balances']}")
@@ -0,0 +1,74 @@
+import numpy as np
+
+# Default number of ticks kept per product
+DEFAULT_CAPACITY = 4096
+
+
+# Fixed-capacity circular buffer of (time, price) ticks backed by NumPy arrays.
+# Every sample is written twice (at slot i and i + capacity) so the latest N
+# samples are always a contiguous slice and can be returned without copying.
+class TickBuffer:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.int64)
+        self._prices = np.zeros(2 * capacity, dtype=np.float64)
+        self._count = 0
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self):
+        # Number of ticks ever appended, including overwritten ones
+        return self._count
+
+    def append(self, time_ns, price):
+        slot = self._count % self.capacity
+        self._times[slot] = time_ns
+        self._times[slot + self.capacity] = time_ns
+        self._prices[slot] = price
+        self._prices[slot + self.capacity] = price
+        self._count += 1
+
+    def _bounds(self, n):
+        size = len(self)
+        if n is None or n > size:
+            n = size
+        if n <= 0:
+            return 0, 0
+        end = (self._count - 1) % self.capacity + self.capacity + 1
+        return end - n, end
+
+    # Zero-copy views of the latest n samples (all buffered samples if n is None)
+    def times(self, n=None):
+        start, end = self._bounds(n)
+        return self._times[start:end]
+
+    def prices(self, n=None):
+        start, end = self._bounds(n)
+        return self._prices[start:end]
+
+    def latest(self):
+        if self._count == 0:
+            return None
+        slot = (self._count - 1) % self.capacity
+        return int(self._times[slot]), float(self._prices[slot])
+
+    def to_frame(self, n=None):
+        import pandas as pd
+
+        return pd.DataFrame({
+            'time': pd.to_datetime(self.times(n), utc=True),
+            'price': self.prices(n),
+        })
+
+    def clear(self):
+        self._count = 0
+
+
+def to_epoch_ns(timestamp):
+    import pandas as pd
+
+    return pd.Timestamp(timestamp).value
@@ -0,0 +1,35 @@
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+# Environment variable telling a worker which partition of the products it owns
+WORKER_INDEX_VARIABLE = 'worker_index'
+
+log = logging.getLogger(__name__)
+
+
+# Run `count` copies of this script, each with its worker index set, and wait
+# for them. SIGINT/SIGTERM are forwarded so the workers shut down cleanly.
+# Returns the first non-zero exit code, or 0.
+def run_workers(count, argv=None, variable=WORKER_INDEX_VARIABLE):
+    argv = argv or [sys.executable] + sys.argv
+    processes = []
+    for index in range(count):
+        env = dict(os.environ, **{variable: str(index)})
+        processes.append(subprocess.Popen(argv, env=env))
+    log.info(f"Started {count} workers: {[process.pid for process in processes]}")
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.poll() is None:
+                process.send_signal(signum)
+
+    previous = {signum: signal.signal(signum, forward) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        codes = [process.wait() for process in processes]
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    return next((code for code in codes if code), 0)